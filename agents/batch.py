@@ -0,0 +1,284 @@
+"""Batch insight refresh: stream JSONL users through a pool of warm pipelines."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from agents.behavior.signals import attach_ops_signals
+from agents.common.stats import percentile
+from agents.pipeline import WebankAgentPipeline
+
+logger = logging.getLogger(__name__)
+
+PipelineFactory = Callable[[Callable[[str, float], None]], WebankAgentPipeline]
+RefreshFn = Callable[[WebankAgentPipeline, str, Dict[str, Any]], Dict[str, Any]]
+PersistFn = Callable[[str, Dict[str, Any]], Any]
+
+
+def run_only(pipeline: WebankAgentPipeline, user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Default refresh step: run the pipeline without persisting anything."""
+
+    return pipeline.run(payload)
+
+
+def iter_batch_records(path: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(user_id, payload)`` pairs from a JSONL file, skipping blank lines."""
+
+    with path.open("r", encoding="utf-8") as handle:
+        for line_no, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            user_id = record.get("user_id")
+            payload = record.get("payload")
+            if not user_id or not isinstance(payload, dict):
+                raise ValueError(f"{path}:{line_no} must contain user_id and an object payload")
+            yield str(user_id), payload
+
+
+def with_precomputed_signals(
+    records: Iterable[Tuple[str, Dict[str, Any]]],
+    chunk_size: int = 1000,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Attach vectorized ``ops_signals`` to records, one chunk of users at a time."""
+
+    chunk: List[Tuple[str, Dict[str, Any]]] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from _enrich_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _enrich_chunk(chunk)
+
+
+def _enrich_chunk(chunk: List[Tuple[str, Dict[str, Any]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    payloads = attach_ops_signals([payload for _, payload in chunk])
+    for (user_id, _), payload in zip(chunk, payloads):
+        yield user_id, payload
+
+
+def load_checkpoint(path: Optional[Path]) -> Set[str]:
+    """Return user ids already completed by a previous run."""
+
+    if path is None or not path.exists():
+        return set()
+    done: Set[str] = set()
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            user_id = line.strip()
+            if user_id:
+                done.add(user_id)
+    return done
+
+
+def prune_output(path: Path, completed: Set[str]) -> int:
+    """Drop output lines of users missing from the checkpoint before a resumed run.
+
+    Those users (failures, or successes interrupted before their checkpoint
+    line) are refreshed again and get a fresh line, so the old one would be
+    a stale duplicate. Returns the number of lines removed.
+    """
+
+    if not path.exists():
+        return 0
+    kept: List[str] = []
+    removed = 0
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # a line cut short by a crash
+                removed += 1
+                continue
+            if record.get("user_id") in completed and "error" not in record:
+                kept.append(line if line.endswith("\n") else line + "\n")
+            else:
+                removed += 1
+    if removed:
+        staging = path.with_name(path.name + ".tmp")
+        staging.write_text("".join(kept), encoding="utf-8")
+        os.replace(staging, path)
+    return removed
+
+
+@dataclass
+class BatchReport:
+    """Aggregated counters and latencies for a batch refresh."""
+
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    stage_latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_stage(self, stage: str, elapsed: float) -> None:
+        with self._lock:
+            self.stage_latencies[stage].append(elapsed)
+
+    @property
+    def users_per_minute(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.succeeded + self.failed) / self.elapsed * 60
+
+    def render(self) -> str:
+        lines = [
+            f"[batch] succeeded={self.succeeded} failed={self.failed} skipped={self.skipped} "
+            f"elapsed={self.elapsed:.1f}s throughput={self.users_per_minute:.1f} users/min",
+        ]
+        for stage, samples in sorted(self.stage_latencies.items()):
+            lines.append(
+                f"[batch]   {stage:<10} n={len(samples):<6} "
+                f"p50={percentile(samples, 50) * 1000:.0f}ms "
+                f"p95={percentile(samples, 95) * 1000:.0f}ms"
+            )
+        return "\n".join(lines)
+
+
+class BatchRefreshRunner:
+    """Run many users through a bounded pool of reusable pipelines.
+
+    Records are read lazily and at most ``workers * 2`` are in flight, so memory
+    stays flat regardless of input size. Completed user ids are appended to the
+    checkpoint file only after their output line is written; a crashed run can
+    be restarted with the same arguments and will skip those users (see
+    :func:`prune_output` for the lines of users it retries). A user id seen
+    again later in the same input is skipped too.
+
+    With ``group_size > 1`` each worker takes that many users at once and runs
+    them through :meth:`WebankAgentPipeline.run_many`, so stage requests carry
+    several users; ``persist`` is then called per successful user instead of
+    ``refresh``.
+    """
+
+    def __init__(
+        self,
+        pipeline_factory: PipelineFactory,
+        workers: int = 4,
+        refresh: RefreshFn = run_only,
+        group_size: int = 1,
+        persist: Optional[PersistFn] = None,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if group_size < 1:
+            raise ValueError("group_size must be >= 1")
+        self.workers = workers
+        self.refresh = refresh
+        self.group_size = group_size
+        self.persist = persist
+        self.report = BatchReport()
+        self._pipelines: "queue.Queue[WebankAgentPipeline]" = queue.Queue()
+        for _ in range(workers):
+            self._pipelines.put(pipeline_factory(self.report.record_stage))
+
+    def _process(self, group: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Any]]:
+        pipeline = self._pipelines.get()
+        started = time.perf_counter()
+        try:
+            if self.group_size == 1:
+                (user_id, payload), = group
+                try:
+                    outcomes = [(user_id, self.refresh(pipeline, user_id, payload))]
+                except Exception as exc:
+                    outcomes = [(user_id, exc)]
+            else:
+                try:
+                    results = pipeline.run_many(dict(group))
+                except Exception as exc:
+                    results = {user_id: exc for user_id, _ in group}
+                outcomes = [self._persist(user_id, outcome) for user_id, outcome in results.items()]
+        finally:
+            self._pipelines.put(pipeline)
+        elapsed = time.perf_counter() - started
+        for _ in group:
+            self.report.record_stage("total", elapsed / len(group))
+        return outcomes
+
+    def _persist(self, user_id: str, outcome: Any) -> Tuple[str, Any]:
+        if self.persist is None or isinstance(outcome, Exception):
+            return user_id, outcome
+        try:
+            self.persist(user_id, outcome)
+        except Exception as exc:
+            return user_id, exc
+        return user_id, outcome
+
+    def run(
+        self,
+        records: Iterator[Tuple[str, Dict[str, Any]]],
+        output: TextIO,
+        checkpoint: Optional[TextIO] = None,
+        completed: Optional[Set[str]] = None,
+    ) -> BatchReport:
+        # Each user is refreshed at most once per run; this also keeps user ids
+        # unique within a micro-batch group, which run_many keys by user id.
+        seen = set(completed or ())
+        max_in_flight = self.workers * 2
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="webank-batch",
+        ) as executor:
+            pending: Set[Future] = set()
+            group: List[Tuple[str, Dict[str, Any]]] = []
+            for user_id, payload in records:
+                if user_id in seen:
+                    self.report.skipped += 1
+                    continue
+                seen.add(user_id)
+                group.append((user_id, payload))
+                if len(group) < self.group_size:
+                    continue
+                if len(pending) >= max_in_flight:
+                    self._drain(pending, output, checkpoint)
+                pending.add(executor.submit(self._process, group))
+                group = []
+            if group:
+                pending.add(executor.submit(self._process, group))
+            while pending:
+                self._drain(pending, output, checkpoint)
+
+        self.report.elapsed = time.perf_counter() - started
+        return self.report
+
+    def _drain(
+        self,
+        pending: Set[Future],
+        output: TextIO,
+        checkpoint: Optional[TextIO],
+    ) -> None:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            for user_id, outcome in future.result():
+                if isinstance(outcome, Exception):
+                    logger.warning("Batch refresh failed for user %s: %s", user_id, outcome)
+                    self.report.failed += 1
+                    record = {"user_id": user_id, "error": str(outcome)}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                    continue
+
+                self.report.succeeded += 1
+                record = {"user_id": user_id, "result": outcome}
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if checkpoint is not None:
+                    checkpoint.write(user_id + "\n")
+                    checkpoint.flush()
@@ -11,6 +11,8 @@ from typing import Any
 from agno.agent import Agent
 from agno.models.base import Model
 
+from agents.behavior.compaction import compact_behavior_payload
+from agents.behavior.signals import PRECOMPUTED_KEY
 from agents.models import build_model_factory
 
 PROMPTS_DIR = Path(__file__).resolve().parents[2] / "prompts"
@@ -33,12 +35,21 @@ def build_behavior_agent(model: Model | None = None) -> Agent:
 
 
 def format_behavior_prompt(payload: dict[str, Any]) -> str:
-    """Render the prompt passed to the BehaviorAgent."""
-    example = json.dumps(payload, ensure_ascii=False, indent=2)
+    """Render the prompt passed to the BehaviorAgent.
+
+    Long event histories are compacted first so the prompt size stays bounded.
+    """
+    example = json.dumps(compact_behavior_payload(payload), ensure_ascii=False, indent=2)
+    precomputed_hint = ""
+    if payload.get(PRECOMPUTED_KEY):
+        precomputed_hint = (
+            f"\n        ops_signals 的 activeness/session_length/churn_risk 已由规则引擎预先计算（见 {PRECOMPUTED_KEY}），"
+            "请原样沿用，仅推理 intents 与 risk_event。"
+        )
     return dedent(
         f"""
         请基于以下交互与市场数据生成意图标签与运营信号，务必让 user_tip
-        结合最近一次关键事件或基金名称，提供明确的下一步建议，禁止输出笼统提醒。
+        结合最近一次关键事件或基金名称，提供明确的下一步建议，禁止输出笼统提醒。{precomputed_hint}
 
         输入JSON:
         ```json
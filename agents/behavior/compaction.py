@@ -0,0 +1,216 @@
+"""Deterministic compaction of raw behavior events before prompting."""
+
+from __future__ import annotations
+
+import json
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAX_RAW_EVENTS = 20
+# Best-effort target for the serialized payload; see compact_behavior_payload.
+MAX_PROMPT_CHARS = 6000
+TOP_K = 10
+DWELL_THRESHOLD_SECONDS = 30
+
+_DWELL_KEYS = ("dwellSeconds", "dwell_seconds", "dwell", "duration")
+_KEYWORD_KEYS = ("keyword", "query", "searchKeyword")
+_FUND_KEYS = ("fundCode", "fund_code", "productCode")
+_SESSION_KEYS = ("sessionId", "session_id")
+_TAB_KEYS = ("tab", "page")
+
+
+def _first(event: Dict[str, Any], keys: Iterable[str]) -> Any:
+    for key in keys:
+        value = event.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _dwell_seconds(event: Dict[str, Any]) -> float:
+    value = _first(event, _DWELL_KEYS)
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _event_type(event: Dict[str, Any]) -> str:
+    # Clients report both "search" and "Search"; match event types case-insensitively.
+    return str(event.get("type", "")).lower()
+
+
+def _is_search(event: Dict[str, Any]) -> bool:
+    return "search" in _event_type(event) or _first(event, _KEYWORD_KEYS) is not None
+
+
+def _is_redemption(event: Dict[str, Any]) -> bool:
+    event_type = _event_type(event)
+    return "redeem" in event_type or "redemption" in event_type
+
+
+def _is_key_event(event: Dict[str, Any]) -> bool:
+    return (
+        _is_redemption(event)
+        or _is_search(event)
+        or _dwell_seconds(event) > DWELL_THRESHOLD_SECONDS
+    )
+
+
+def _dedupe(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    seen = set()
+    unique: List[Dict[str, Any]] = []
+    for event in events:
+        marker = json.dumps(event, ensure_ascii=False, sort_keys=True, default=str)
+        if marker in seen:
+            continue
+        seen.add(marker)
+        unique.append(event)
+    return unique
+
+
+def _sort_key(event: Dict[str, Any]) -> Tuple[str, str]:
+    return (str(event.get("timestamp", "")), json.dumps(event, sort_keys=True, default=str))
+
+
+def _summarize(events: List[Dict[str, Any]], top_k: int) -> Dict[str, Any]:
+    by_type = Counter(_event_type(event) or "unknown" for event in events)
+
+    funds: Dict[str, Dict[str, Any]] = defaultdict(
+        lambda: {"views": 0, "dwell_seconds": 0.0, "max_dwell_seconds": 0.0, "tabs": set()}
+    )
+    keywords: Counter = Counter()
+    redemptions: List[Dict[str, Any]] = []
+    sessions: Dict[str, List[datetime]] = defaultdict(list)
+
+    for event in events:
+        fund = _first(event, _FUND_KEYS)
+        if fund is not None:
+            stats = funds[str(fund)]
+            stats["views"] += 1
+            dwell = _dwell_seconds(event)
+            stats["dwell_seconds"] += dwell
+            stats["max_dwell_seconds"] = max(stats["max_dwell_seconds"], dwell)
+            tab = _first(event, _TAB_KEYS)
+            if tab is not None:
+                stats["tabs"].add(str(tab))
+            stats["last_at"] = max(str(event.get("timestamp", "")), stats.get("last_at", ""))
+        keyword = _first(event, _KEYWORD_KEYS)
+        if keyword is not None:
+            keywords[str(keyword)] += 1
+        if _is_redemption(event):
+            redemptions.append({"fundCode": fund, "timestamp": event.get("timestamp")})
+        session = _first(event, _SESSION_KEYS)
+        timestamp = _parse_ts(event.get("timestamp"))
+        if session is not None and timestamp is not None:
+            sessions[str(session)].append(timestamp)
+
+    ranked_funds = sorted(
+        funds.items(),
+        key=lambda item: (-item[1]["max_dwell_seconds"], -item[1]["views"], item[0]),
+    )[:top_k]
+    session_minutes = [
+        (max(stamps) - min(stamps)).total_seconds() / 60 for stamps in sessions.values()
+    ]
+    timestamps = sorted(str(event["timestamp"]) for event in events if event.get("timestamp"))
+
+    summary: Dict[str, Any] = {
+        "total_events": len(events),
+        "first_event_at": timestamps[0] if timestamps else None,
+        "last_event_at": timestamps[-1] if timestamps else None,
+        "by_type": dict(sorted(by_type.items(), key=lambda item: (-item[1], item[0]))),
+        "funds": [
+            {
+                "fundCode": code,
+                "views": stats["views"],
+                "dwell_seconds": round(stats["dwell_seconds"], 1),
+                "max_dwell_seconds": round(stats["max_dwell_seconds"], 1),
+                "deep_tabs": sorted(stats["tabs"]),
+                "last_at": stats.get("last_at") or None,
+            }
+            for code, stats in ranked_funds
+        ],
+        "search_keywords": [
+            {"keyword": keyword, "count": count}
+            for keyword, count in sorted(keywords.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        ],
+        "redemption_entries": sorted(redemptions, key=lambda item: str(item["timestamp"]))[-top_k:],
+    }
+    if session_minutes:
+        summary["sessions"] = {
+            "count": len(session_minutes),
+            "avg_minutes": round(sum(session_minutes) / len(session_minutes), 1),
+            "max_minutes": round(max(session_minutes), 1),
+        }
+    return summary
+
+
+def _select_raw_events(events: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Keep the most recent key evidence first, then fill with the latest events."""
+
+    if limit <= 0:
+        return []
+    ordered = sorted(events, key=_sort_key)
+    keep = {idx for idx, event in enumerate(ordered) if _is_key_event(event)}
+    keep = set(sorted(keep)[-limit:])
+    fillers = [idx for idx in range(len(ordered)) if idx not in keep]
+    spare = limit - len(keep)
+    if spare > 0:
+        keep.update(fillers[-spare:])
+    return [ordered[idx] for idx in sorted(keep)]
+
+
+def compact_behavior_payload(
+    payload: Dict[str, Any],
+    max_raw_events: int = MAX_RAW_EVENTS,
+    max_chars: int = MAX_PROMPT_CHARS,
+    top_k: int = TOP_K,
+) -> Dict[str, Any]:
+    """Return ``payload`` with ``events`` deduped, aggregated and size-capped.
+
+    Payloads with at most ``max_raw_events`` unique events are returned
+    unchanged (apart from dedupe). Larger histories keep a bounded sample of
+    raw events, favouring the evidence BehaviorAgent's rules rely on (dwell
+    > 30s, searches, redemption entries), plus an ``event_summary`` with
+    per-type counts, per-fund dwell, search keywords and session lengths.
+
+    ``max_chars`` is best-effort: the raw sample and then the summary's top-k
+    lists are halved deterministically until the serialized result fits, but
+    fields outside ``events`` are never touched and the smallest form (no raw
+    events, top-1 lists) is returned even if it is still larger.
+    """
+
+    events = payload.get("events")
+    if not isinstance(events, list):
+        return payload
+    unique = _dedupe([event for event in events if isinstance(event, dict)])
+    if len(unique) <= max_raw_events:
+        return payload if len(unique) == len(events) else {**payload, "events": unique}
+
+    raw_limit, k = max_raw_events, top_k
+    summary = _summarize(unique, k)
+    while True:
+        compacted = {
+            **payload,
+            "events": _select_raw_events(unique, raw_limit),
+            "event_summary": summary,
+        }
+        # Measure exactly what format_behavior_prompt will embed.
+        size = len(json.dumps(compacted, ensure_ascii=False, indent=2, default=str))
+        if size <= max_chars or (raw_limit == 0 and k <= 1):
+            return compacted
+        if raw_limit > 0:
+            raw_limit //= 2
+        else:
+            k //= 2
+            summary = _summarize(unique, k)
@@ -0,0 +1,253 @@
+"""Columnar computation of BehaviorAgent ``ops_signals`` for many users at once.
+
+The activeness / session_length / churn_risk thresholds in
+``prompts/behavior_system_prompt.md`` are deterministic, so they are derived
+here from raw events instead of asking the model. All users in a batch are
+flattened into one set of columns and reduced with NumPy; a pure-Python path
+is used when NumPy is not installed.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+try:  # pragma: no cover - optional dependency guard
+    import numpy as np
+
+    _NUMPY_AVAILABLE = True
+except Exception:  # pragma: no cover - keep runtime lenient
+    np = None  # type: ignore
+    _NUMPY_AVAILABLE = False
+
+SESSION_GAP_SECONDS = 30 * 60
+DORMANT_DAYS = 30
+CHURNED_DAYS = 90
+HIGH_SESSION_MINUTES = 30
+LOW_SESSION_MINUTES = 5
+PRECOMPUTED_KEY = "precomputed_ops_signals"
+# Only the threshold outputs enter the payload: the raw day/minute figures move
+# with ``as_of`` and would change the prompt, stage cache key and fingerprint
+# on every run.
+PROMPT_SIGNAL_FIELDS = ("activeness", "session_length", "churn_risk")
+
+_SESSION_KEYS = ("sessionId", "session_id")
+
+
+def _to_epoch(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _activeness(days_since: float) -> str:
+    if days_since >= CHURNED_DAYS:
+        return "流失"
+    if days_since >= DORMANT_DAYS:
+        return "沉睡"
+    if days_since <= 1:
+        return "日活"
+    if days_since <= 7:
+        return "周活"
+    return "月活"
+
+
+def _session_length(avg_minutes: float) -> str:
+    if avg_minutes > HIGH_SESSION_MINUTES:
+        return "高频"
+    if avg_minutes >= LOW_SESSION_MINUTES:
+        return "中频"
+    return "低频"
+
+
+def _churn_risk(days_since: float, avg_minutes: float) -> str:
+    if days_since >= DORMANT_DAYS:
+        return "高"
+    if days_since > 7 or avg_minutes < LOW_SESSION_MINUTES:
+        return "中"
+    return "低"
+
+
+def _flatten(
+    behaviors: Sequence[Mapping[str, Any]],
+) -> tuple[List[int], List[float], List[str], List[Optional[float]]]:
+    users: List[int] = []
+    stamps: List[float] = []
+    sessions: List[str] = []
+    last_login: List[Optional[float]] = []
+    for idx, behavior in enumerate(behaviors):
+        last_login.append(_to_epoch(behavior.get("last_login_at") or behavior.get("lastLoginAt")))
+        for event in behavior.get("events") or []:
+            if not isinstance(event, dict):
+                continue
+            stamp = _to_epoch(event.get("timestamp"))
+            if stamp is None:
+                continue
+            users.append(idx)
+            stamps.append(stamp)
+            session = next((event[key] for key in _SESSION_KEYS if event.get(key)), "")
+            sessions.append(str(session))
+    return users, stamps, sessions, last_login
+
+
+def _reduce_numpy(
+    n_users: int, users: List[int], stamps: List[float], sessions: List[str]
+) -> tuple[List[float], List[float]]:
+    """Return per-user ``(last_event_epoch, avg_session_minutes)`` columns."""
+
+    avg_minutes = np.zeros(n_users)
+    if not users:
+        return [float("nan")] * n_users, avg_minutes.tolist()
+
+    user_col = np.asarray(users, dtype=np.int64)
+    ts_col = np.asarray(stamps, dtype=np.float64)
+    session_values = np.asarray(sessions, dtype=object)
+    _, session_col = np.unique(session_values, return_inverse=True)
+    anonymous = session_values == ""
+
+    order = np.lexsort((ts_col, session_col, user_col))
+    user_col, ts_col = user_col[order], ts_col[order]
+    session_col, anonymous = session_col[order], anonymous[order]
+
+    # Sessions split on user or session id changes; events without an id are
+    # sessionized by inactivity gaps instead.
+    boundary = np.ones(len(ts_col), dtype=bool)
+    boundary[1:] = (
+        (user_col[1:] != user_col[:-1])
+        | (session_col[1:] != session_col[:-1])
+        | (anonymous[1:] & (np.diff(ts_col) > SESSION_GAP_SECONDS))
+    )
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(ts_col)) - 1
+    durations = (ts_col[ends] - ts_col[starts]) / 60.0
+    session_user = user_col[starts]
+
+    counts = np.bincount(session_user, minlength=n_users)
+    totals = np.bincount(session_user, weights=durations, minlength=n_users)
+    np.divide(totals, counts, out=avg_minutes, where=counts > 0)
+
+    last_seen = np.full(n_users, -np.inf)
+    np.maximum.at(last_seen, user_col, ts_col)
+    last_seen[np.isneginf(last_seen)] = np.nan
+    return last_seen.tolist(), avg_minutes.tolist()
+
+
+def _reduce_python(
+    n_users: int, users: List[int], stamps: List[float], sessions: List[str]
+) -> tuple[List[float], List[float]]:
+    rows = sorted(zip(users, sessions, stamps))
+    last_seen = [float("nan")] * n_users
+    durations: List[List[float]] = [[] for _ in range(n_users)]
+    start = 0.0
+    prev: Optional[tuple[int, str, float]] = None
+    for user, session, stamp in rows:
+        new_session = (
+            prev is None
+            or user != prev[0]
+            or session != prev[1]
+            or (not session and stamp - prev[2] > SESSION_GAP_SECONDS)
+        )
+        if new_session:
+            if prev is not None:
+                durations[prev[0]].append((prev[2] - start) / 60.0)
+            start = stamp
+        prev = (user, session, stamp)
+        if math.isnan(last_seen[user]) or stamp > last_seen[user]:
+            last_seen[user] = stamp
+    if prev is not None:
+        durations[prev[0]].append((prev[2] - start) / 60.0)
+    avg = [sum(items) / len(items) if items else 0.0 for items in durations]
+    return last_seen, avg
+
+
+def compute_ops_signals(
+    behaviors: Sequence[Mapping[str, Any]],
+    as_of: Optional[datetime] = None,
+) -> List[Optional[Dict[str, Any]]]:
+    """Compute ``ops_signals`` for each behavior payload in one pass.
+
+    Returns one entry per input; users without any timestamped activity get
+    ``None`` so the model keeps deriving their signals.
+    """
+
+    now = _to_epoch(as_of) if as_of is not None else datetime.now(timezone.utc).timestamp()
+    users, stamps, sessions, last_login = _flatten(behaviors)
+    reducer = _reduce_numpy if _NUMPY_AVAILABLE else _reduce_python
+    last_seen, avg_minutes = reducer(len(behaviors), users, stamps, sessions)
+
+    signals: List[Optional[Dict[str, Any]]] = []
+    for idx in range(len(behaviors)):
+        candidates = [
+            value
+            for value in (last_seen[idx], last_login[idx])
+            if value is not None and not math.isnan(value)
+        ]
+        if not candidates:
+            signals.append(None)
+            continue
+        days_since = max(0.0, (now - max(candidates)) / 86400)
+        minutes = avg_minutes[idx]
+        signals.append(
+            {
+                "activeness": _activeness(days_since),
+                "session_length": _session_length(minutes),
+                "churn_risk": _churn_risk(days_since, minutes),
+                "days_since_last_active": round(days_since, 1),
+                "avg_session_minutes": round(minutes, 1),
+            }
+        )
+    return signals
+
+
+def attach_ops_signals(
+    payloads: Sequence[Dict[str, Any]],
+    as_of: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Return copies of pipeline payloads with ``behavior.precomputed_ops_signals`` set.
+
+    Only :data:`PROMPT_SIGNAL_FIELDS` are attached, so the payload stays
+    identical between runs until a user actually crosses a threshold.
+    """
+
+    behaviors = [payload.get("behavior") or {} for payload in payloads]
+    enriched: List[Dict[str, Any]] = []
+    for payload, behavior, signals in zip(payloads, behaviors, compute_ops_signals(behaviors, as_of)):
+        if signals is None:
+            enriched.append(payload)
+            continue
+        prompt_signals = {field: signals[field] for field in PROMPT_SIGNAL_FIELDS}
+        enriched.append({**payload, "behavior": {**behavior, PRECOMPUTED_KEY: prompt_signals}})
+    return enriched
+
+
+def apply_precomputed_signals(
+    result: Dict[str, Any],
+    behavior_input: Mapping[str, Any],
+) -> Dict[str, Any]:
+    """Force the deterministic signals into BehaviorAgent output.
+
+    Model-provided extras such as ``risk_event`` are kept; the threshold-based
+    fields always come from the precomputed values.
+    """
+
+    precomputed = behavior_input.get(PRECOMPUTED_KEY)
+    if not isinstance(precomputed, dict):
+        return result
+    merged = copy.deepcopy(result)
+    model_signals = merged.get("ops_signals")
+    base = model_signals if isinstance(model_signals, dict) else {}
+    merged["ops_signals"] = {**base, **precomputed}
+    return merged
@@ -0,0 +1,189 @@
+"""Micro-benchmarks for the framework code around the agents (no model calls).
+
+Each case is parametrized by payload size so regressions that only show up on
+large inputs (long event logs, big model outputs, long chat history) are
+caught. Run via ``python -m agents.cli bench``.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from agents.asset.builder import format_asset_prompt
+from agents.behavior.builder import format_behavior_prompt
+from agents.common.bench import BenchCase
+from agents.conversation.builder import format_conversation_prompt
+from agents.conversation.retriever import _normalize_row
+from agents.pipeline import (
+    WebankAgentPipeline,
+    _annotate_agent_input,
+    _annotate_agent_structured_output,
+    _extract_json_payload,
+    _safe_json_loads,
+)
+from agents.socio_role.builder import format_socio_role_prompt
+from agents.summary.builder import format_summary_prompt
+
+SIZES: Dict[str, int] = {"small": 10, "medium": 200, "large": 2000}
+
+_EVENT_TYPES = ("浏览基金详情", "申购", "赎回", "查看账单", "搜索理财")
+
+
+def make_pipeline_payload(size: int) -> Dict[str, Any]:
+    """Pipeline input with ``size`` behavior events and as many asset positions."""
+
+    start = datetime(2024, 5, 1)
+    return {
+        "socio_role": {"age": 32, "profession": "软件工程师", "familyStatus": "已婚", "city": "深圳"},
+        "asset": {
+            "total_assets": 1_200_000,
+            "liabilities": 300_000,
+            "risk_profile": "稳健",
+            "monthly_cashflow": 18_000,
+            "positions": [
+                {"product_code": f"{index:06d}", "product_name": f"基金{index}", "current_value": 1000.0 + index}
+                for index in range(size)
+            ],
+        },
+        "behavior": {
+            "events": [
+                {
+                    "type": _EVENT_TYPES[index % len(_EVENT_TYPES)],
+                    "fund_code": f"{index % 50:06d}",
+                    "timestamp": (start + timedelta(minutes=index)).isoformat(),
+                    "duration_seconds": 30 + index % 90,
+                }
+                for index in range(size)
+            ]
+        },
+        "context": {"channel": "app", "campaign": "spring-rebalance"},
+    }
+
+
+def make_stage_output(size: int) -> Dict[str, Any]:
+    return {
+        "intents": [{"label": f"意图{index}", "score": round((index % 100) / 100, 2)} for index in range(size)],
+        "ops_signals": {"activeness": "high", "churn_risk": "low", "session_length": 42},
+        "user_tip": "建议关注近期定投的基金表现。",
+    }
+
+
+def make_model_text(size: int) -> str:
+    """Model reply as it usually arrives: prose, then a fenced JSON block."""
+
+    body = json.dumps(make_stage_output(size), ensure_ascii=False, indent=2)
+    return f"好的，以下是分析结果：\n```json\n{body}\n```\n如需更多信息请告诉我。"
+
+
+def make_history(size: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "sender": "user" if index % 2 == 0 else "assistant",
+            "message": f"第{index}轮：我想了解近期基金表现以及是否需要调仓。",
+            "created_at": f"2024-05-10T02:{index % 60:02d}:00Z",
+        }
+        for index in range(size)
+    ]
+
+
+def make_insight_row(size: int) -> Dict[str, Any]:
+    """Raw ``user_behavior_insights`` row with JSON text columns, as MySQL returns it."""
+
+    output = make_stage_output(size)
+    return {
+        "intent_labels": json.dumps(output["intents"], ensure_ascii=False),
+        "operational_signals": json.dumps(output["ops_signals"], ensure_ascii=False),
+        "source_logs": json.dumps(make_pipeline_payload(size)["behavior"]["events"], ensure_ascii=False),
+        "snapshot_at": datetime(2024, 5, 10, 2, 0),
+        "created_at": datetime(2024, 5, 10, 2, 1),
+    }
+
+
+class _StubAgent:
+    """Returns a canned output, like the ``_DummyAgent`` used in tests."""
+
+    def __init__(self, name: str, output: Any) -> None:
+        self.name = name
+        self.output = output
+
+    def run(self, prompt: str, **kwargs: Any) -> Any:
+        return self.output
+
+
+class _RecordingSpan:
+    def __init__(self) -> None:
+        self.attributes: Dict[str, Any] = {}
+
+    def is_recording(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+def _prompt_case(formatter: Callable[[Dict[str, Any]], str], stage: str, size: int) -> Callable[[], Any]:
+    payload = make_pipeline_payload(size)
+    stage_input = payload if stage == "summary" else payload[stage]
+    return lambda: formatter(stage_input)
+
+
+def _pipeline_case(size: int) -> Callable[[], Any]:
+    payload = make_pipeline_payload(size)
+    text = make_model_text(size)
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_StubAgent("SocioRoleAgent", {"role": {"label": "白领"}}),
+        asset_agent=_StubAgent("AssetAgent", '{"asset_level": "中", "risk_level": "R3"}'),
+        behavior_agent=_StubAgent("BehaviorAgent", text),
+        summary_agent=_StubAgent("SummaryAgent", {"highlights": [], "recommendations": []}),
+    )
+    return lambda: pipeline.run(payload)
+
+
+def _annotate_case(size: int) -> Callable[[], Any]:
+    payload = make_pipeline_payload(size)
+    prompt = format_behavior_prompt(payload["behavior"])
+    output = make_stage_output(size)
+
+    def run() -> None:
+        span = _RecordingSpan()
+        _annotate_agent_input(span, prompt, payload)
+        _annotate_agent_structured_output(span, output)
+
+    return run
+
+
+def _cases_for(label: str, size: int) -> List[BenchCase]:
+    text = make_model_text(size)
+    history = make_history(size)
+    insights = {"behavior": make_stage_output(size), "asset": {"risk_level": "R3"}}
+    row = make_insight_row(size)
+    cases = [
+        BenchCase(f"prompt.{stage}[{label}]", lambda f=formatter, s=stage: _prompt_case(f, s, size))
+        for stage, formatter in (
+            ("socio_role", format_socio_role_prompt),
+            ("asset", format_asset_prompt),
+            ("behavior", format_behavior_prompt),
+            ("summary", format_summary_prompt),
+        )
+    ]
+    cases += [
+        BenchCase(f"json.extract_payload[{label}]", lambda: lambda: _extract_json_payload(text)),
+        BenchCase(f"json.safe_loads[{label}]", lambda: lambda: _safe_json_loads(text)),
+        BenchCase(f"span.annotate[{label}]", lambda: _annotate_case(size)),
+        BenchCase(
+            f"conversation.prompt[{label}]",
+            lambda: lambda: format_conversation_prompt("是否需要增加债券配置？", insights, history, {"pageType": "fund"}),
+        ),
+        BenchCase(f"retriever.normalize_row[{label}]", lambda: lambda: _normalize_row(row)),
+        BenchCase(f"pipeline.run_stub_agents[{label}]", lambda: _pipeline_case(size)),
+    ]
+    return cases
+
+
+def default_cases() -> List[BenchCase]:
+    cases: List[BenchCase] = []
+    for label, size in SIZES.items():
+        cases.extend(_cases_for(label, size))
+    return cases
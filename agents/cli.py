@@ -3,13 +3,64 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
+from agents.batch import (
+    BatchRefreshRunner,
+    RefreshFn,
+    iter_batch_records,
+    load_checkpoint,
+    prune_output,
+    run_only,
+    with_precomputed_signals,
+)
+from agents.behavior.signals import attach_ops_signals
+from agents.benchmarks import default_cases
+from agents.common.bench import (
+    compare,
+    load_baseline,
+    render_comparison,
+    render_results,
+    run_cases,
+    save_baseline,
+)
+from agents.common.cascade import ModelCascade
+from agents.common.hedging import DeadlinePolicy
+from agents.common.microbatch import MicroBatchPolicy
+from agents.common.profiling import summarize_profiles
+from agents.common.stub_llm import LatencyDistribution, StubChatServer
+from agents.common.result_cache import StageResultCache
+from agents.common.span_report import (
+    group_traces,
+    render_serialization_costs,
+    render_span_stats,
+    render_waterfall,
+)
+from agents.common.telemetry import (
+    build_sampler,
+    dump_metrics,
+    install_local_spans,
+    reset_serialization_costs,
+    serialization_costs,
+    serve_metrics,
+    trace_agent_span,
+)
+from agents.socio_role.cohort import CohortRules, SocioRoleCohorts
 from agents.pipeline import WebankAgentPipeline, build_default_pipeline
 from agents.conversation import ConversationService
+from agents.conversation.memory import close_message_writer
+from agents.conversation.retention import compact_snapshots, rebuild_latest_pointers, render_compaction
+from agents.models import ModelBackend, set_model_backend
+from agents.loadtest import (
+    ConversationLoadTest,
+    build_stub_service,
+    configure_store,
+    init_sqlite_store,
+)
 
 
 def _load_payload(path: Path) -> Dict[str, Any]:
@@ -24,15 +75,167 @@ def _write_output(path: Path, payload: Dict[str, Any]) -> None:
     path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
 
 
+def _build_cache(args: argparse.Namespace) -> StageResultCache | None:
+    if not args.cache_path:
+        return None
+    return StageResultCache.from_path(
+        args.cache_path,
+        ttl_seconds=args.cache_ttl,
+        max_entries=args.cache_max_entries,
+    )
+
+
+def _parse_stage_timeout(raw: str) -> tuple[str, float]:
+    stage, _, seconds = raw.partition("=")
+    if not stage or not seconds:
+        raise argparse.ArgumentTypeError("expected STAGE=SECONDS, e.g. asset=20")
+    return stage.strip(), float(seconds)
+
+
+def _build_deadlines(args: argparse.Namespace) -> DeadlinePolicy | None:
+    if args.budget is None and not args.stage_timeout and args.hedge_percentile is None:
+        return None
+    return DeadlinePolicy(
+        budget_seconds=args.budget,
+        stage_timeouts=dict(args.stage_timeout or []),
+        hedge_percentile=args.hedge_percentile,
+    )
+
+
+def _build_cohorts(args: argparse.Namespace) -> SocioRoleCohorts | None:
+    if args.socio_cohorts is None:
+        return None
+    rules = CohortRules.from_file(args.socio_cohorts) if args.socio_cohorts else CohortRules()
+    return SocioRoleCohorts(rules=rules)
+
+
+def _build_cascade(args: argparse.Namespace) -> ModelCascade | None:
+    if args.cascade is None:
+        return None
+    return ModelCascade(model_id=args.cascade)
+
+
+def _add_execution_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics-dump",
+        help="Write stage latency/token/parse-failure metrics as Prometheus text when done.",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve the same metrics at http://127.0.0.1:PORT/metrics while running.",
+    )
+    parser.add_argument(
+        "--model-backend",
+        choices=("live", "record", "replay"),
+        help="live: call DashScope; record: call it and save responses to --cassette; "
+        "replay: answer from --cassette offline (default WEBANK_MODEL_BACKEND or live).",
+    )
+    parser.add_argument(
+        "--cassette",
+        default=os.getenv("WEBANK_CASSETTE", "cassettes/models.jsonl"),
+        help="Cassette JSONL used by the record/replay backends.",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=float(os.getenv("WEBANK_REPLAY_LATENCY", "0")),
+        metavar="SCALE",
+        help="In replay, sleep SCALE x the recorded latency per call (1.0 = realistic, 0 = none).",
+    )
+    parser.add_argument(
+        "--cascade",
+        nargs="?",
+        const=os.getenv("WEBANK_CASCADE_MODEL_ID", "qwen-turbo"),
+        metavar="MODEL_ID",
+        help="Answer each stage with a cheaper model first (default qwen-turbo) and escalate "
+        "to the stage model only when the output fails JSON or schema checks.",
+    )
+    parser.add_argument(
+        "--socio-cohorts",
+        nargs="?",
+        const="",
+        metavar="RULES_JSON",
+        help="Share SocioRoleAgent results across users in the same age/profession/city-tier "
+        "cohort; optionally load bucketing rules from a JSON file.",
+    )
+    parser.add_argument(
+        "--precompute-signals",
+        action="store_true",
+        help="Derive behavior ops_signals with the rule engine so the model only infers intents.",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        help="Overall seconds allowed per pipeline run; stage deadlines are derived from it.",
+    )
+    parser.add_argument(
+        "--stage-timeout",
+        type=_parse_stage_timeout,
+        action="append",
+        metavar="STAGE=SECONDS",
+        help="Cap a single stage (repeatable); the summary cap is reserved out of --budget.",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        help="Fire a duplicate request once a stage runs past this latency percentile (e.g. 95).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream stage output and stop each model call once its JSON object is complete.",
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=os.getenv("WEBANK_STAGE_CACHE_PATH"),
+        help="SQLite file caching stage results by prompt hash (or set WEBANK_STAGE_CACHE_PATH).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(os.getenv("WEBANK_STAGE_CACHE_TTL", "86400")),
+        help="Seconds before a cached stage result expires (default: 86400).",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=100_000,
+        help="Maximum rows kept in the SQLite cache before LRU eviction.",
+    )
+
+
 def run_pipeline(args: argparse.Namespace) -> None:
     payload = _load_payload(Path(args.input))
-    pipeline = build_default_pipeline(model_id=args.model)
+    if args.precompute_signals:
+        payload = attach_ops_signals([payload])[0]
+    cascade = _build_cascade(args)
+    pipeline = build_default_pipeline(
+        model_id=args.model,
+        parallel=args.parallel,
+        cache=_build_cache(args),
+        stream=args.stream,
+        deadlines=_build_deadlines(args),
+        socio_cohorts=_build_cohorts(args),
+        cascade=cascade,
+    )
+    should_skip_db = _should_skip_db(args)
+    if args.incremental and args.user_id and not should_skip_db:
+        service = ConversationService()
+        result = service.refresh_user_insights(args.user_id, payload, pipeline)
+        if args.output:
+            _write_output(Path(args.output), result)
+        if cascade is not None:
+            print(cascade.render_report())
+        return
+
     result = pipeline.run(payload)
+    if cascade is not None:
+        print(cascade.render_report())
 
     if args.output:
         _write_output(Path(args.output), result)
 
-    should_skip_db = args.skip_db or os.getenv("WEBANK_SKIP_DB", "false").lower() == "true"
     if args.user_id and not should_skip_db:
         service = ConversationService()
         service.persist_pipeline_output(args.user_id, result)
@@ -40,6 +243,237 @@ def run_pipeline(args: argparse.Namespace) -> None:
         print("[cli] WEBANK_SKIP_DB 启用，跳过数据库持久化。")
 
 
+def _should_skip_db(args: argparse.Namespace) -> bool:
+    return args.skip_db or os.getenv("WEBANK_SKIP_DB", "false").lower() == "true"
+
+
+def _build_batch_refresh(args: argparse.Namespace) -> RefreshFn:
+    if _should_skip_db(args):
+        print("[cli] WEBANK_SKIP_DB 启用，跳过数据库持久化。")
+        return run_only
+
+    service = ConversationService()
+    if args.incremental:
+        return lambda pipeline, user_id, payload: service.refresh_user_insights(
+            user_id, payload, pipeline
+        )
+
+    def run_and_persist(
+        pipeline: WebankAgentPipeline, user_id: str, payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        result = pipeline.run(payload)
+        service.persist_pipeline_output(user_id, result)
+        return result
+
+    return run_and_persist
+
+
+def run_pipeline_batch(args: argparse.Namespace) -> None:
+    input_path = Path(args.input)
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input JSONL not found: {input_path}")
+    output_path = Path(args.output)
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else output_path.with_suffix(
+        output_path.suffix + ".ckpt"
+    )
+
+    micro_batch = None
+    persist = None
+    if args.micro_batch > 1:
+        if args.incremental:
+            raise SystemExit("--micro-batch cannot be combined with --incremental")
+        micro_batch = MicroBatchPolicy(
+            max_batch_size=args.micro_batch,
+            max_prompt_chars=args.micro_batch_max_chars,
+        )
+        if _should_skip_db(args):
+            print("[cli] WEBANK_SKIP_DB 启用，跳过数据库持久化。")
+        else:
+            persist = ConversationService().persist_pipeline_output
+    refresh = _build_batch_refresh(args) if micro_batch is None else run_only
+
+    completed = load_checkpoint(checkpoint_path)
+    if completed:
+        print(f"[cli] 从检查点恢复，跳过 {len(completed)} 个已完成用户。")
+    pruned = prune_output(output_path, completed)
+    if pruned:
+        print(f"[cli] 移除输出中 {pruned} 行将重跑用户的旧记录（失败或未写入检查点）。")
+
+    cache = _build_cache(args)
+    # One policy for the whole pool so hedge thresholds learn from every worker.
+    deadlines = _build_deadlines(args)
+    cohorts = _build_cohorts(args)
+    cascade = _build_cascade(args)
+    runner = BatchRefreshRunner(
+        lambda observer: build_default_pipeline(
+            model_id=args.model,
+            parallel=args.parallel,
+            stage_observer=observer,
+            cache=cache,
+            stream=args.stream,
+            deadlines=deadlines,
+            socio_cohorts=cohorts,
+            micro_batch=micro_batch,
+            cascade=cascade,
+        ),
+        workers=args.workers,
+        refresh=refresh,
+        group_size=args.micro_batch if micro_batch is not None else 1,
+        persist=persist,
+    )
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("a", encoding="utf-8") as output, checkpoint_path.open(
+        "a", encoding="utf-8"
+    ) as checkpoint:
+        records = iter_batch_records(input_path)
+        if args.precompute_signals:
+            records = with_precomputed_signals(records)
+        report = runner.run(records, output, checkpoint, completed)
+    print(report.render())
+    if cache is not None:
+        print(f"[batch] stage cache hits={cache.hits} misses={cache.misses}")
+    if cohorts is not None:
+        print(cohorts.render_report())
+    if cascade is not None:
+        print(cascade.render_report())
+
+
+def _profile_action(args: argparse.Namespace, fixture: Dict[str, Any]) -> Callable[[], Any]:
+    if args.target == "conversation":
+        service = ConversationService()
+        return lambda: service.generate_reply(
+            fixture["user_id"],
+            fixture["message"],
+            session_id=fixture.get("session_id"),
+            context=fixture.get("context"),
+            channel=fixture.get("channel", "app"),
+        )
+
+    if args.precompute_signals:
+        fixture = attach_ops_signals([fixture])[0]
+    pipeline = build_default_pipeline(
+        model_id=args.model,
+        parallel=args.parallel,
+        cache=_build_cache(args),
+        stream=args.stream,
+        deadlines=_build_deadlines(args),
+        socio_cohorts=_build_cohorts(args),
+        cascade=_build_cascade(args),
+    )
+    return lambda: pipeline.run(fixture)
+
+
+def run_profile(args: argparse.Namespace) -> None:
+    spans_file = Path(args.spans_file) if args.spans_file else None
+    # Profiling wants every iteration recorded, whatever the production sampling.
+    buffer = install_local_spans(
+        capacity=args.capacity,
+        path=spans_file,
+        sampler=build_sampler({}, 1.0),
+    )
+    if buffer is None:
+        raise SystemExit("profile 需要 opentelemetry-sdk，且不能已安装非 SDK 的 TracerProvider。")
+
+    action = _profile_action(args, _load_payload(Path(args.fixture)))
+    buffer.clear()
+    reset_serialization_costs()
+    for iteration in range(args.iterations):
+        with trace_agent_span("profile.iteration", {"profile.iteration": iteration}):
+            action()
+
+    traces = group_traces(buffer.spans())
+    if not traces:
+        print("[profile] 未采集到 span，请检查采样配置。")
+        return
+    last = max(traces.values(), key=lambda trace: trace[0]["start"])
+    print(f"[profile] target={args.target} iterations={args.iterations} traces={len(traces)}")
+    print("\n[profile] 最后一次迭代瀑布图")
+    print(render_waterfall(last))
+    print("\n[profile] 各 span 耗时分布")
+    print(render_span_stats(traces))
+    print("\n[profile] 序列化开销 Top")
+    print(render_serialization_costs(serialization_costs(), top=args.top))
+
+
+def run_loadtest(args: argparse.Namespace) -> None:
+    stub = None
+    base_url = args.base_url
+    if base_url is None:
+        stub = StubChatServer(
+            latency=LatencyDistribution.parse(args.latency),
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ).start()
+        base_url = stub.base_url
+    try:
+        loadtest = ConversationLoadTest(
+            service=build_stub_service(base_url, model_id=args.model or "qwen-plus"),
+            users=args.users,
+            turns=args.turns,
+            think_time=args.think_time,
+            ramp_seconds=args.ramp,
+            seed=args.seed,
+        )
+        sqlite_file = Path(args.sqlite_path) if args.store == "sqlite" else None
+        if sqlite_file is not None:
+            init_sqlite_store(sqlite_file, loadtest.user_ids())
+        configure_store(args.store, sqlite_file)
+        if args.write_behind:
+            os.environ["WEBANK_MESSAGE_WRITE_BEHIND"] = "true"
+
+        buffer = install_local_spans(
+            capacity=args.users * args.turns * 16,
+            sampler=build_sampler({}, 1.0),
+        )
+        if buffer is None:
+            print("[loadtest] 未安装 opentelemetry-sdk，报告不含 DB/LLM 耗时拆分。")
+        else:
+            buffer.clear()
+        report = asyncio.run(loadtest.arun()) if args.use_async else loadtest.run()
+        if args.write_behind and not close_message_writer():
+            print("[loadtest] write-behind 队列未能在超时内排空，部分消息未落库。")
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if buffer is not None:
+        report.attach_breakdown(buffer.spans())
+    print(report.render())
+    if stub is not None:
+        print(f"[loadtest] stub requests={stub.requests} injected_errors={stub.errors} latency={args.latency}")
+
+
+def run_bench(args: argparse.Namespace) -> None:
+    results = run_cases(default_cases(), pattern=args.filter, min_time=args.min_time, repeat=args.repeat)
+    print(render_results(results))
+    if args.save:
+        save_baseline(results, Path(args.save))
+        print(f"[bench] 基线已写入 {args.save}")
+    if not args.compare:
+        return
+    comparisons = compare(results, load_baseline(Path(args.compare)), threshold=args.threshold)
+    print(f"\n[bench] 对比基线 {args.compare}（阈值 +{args.threshold:.0%}）")
+    print(render_comparison(comparisons))
+    regressions = [item.name for item in comparisons if item.regressed]
+    if regressions:
+        raise SystemExit(f"[bench] {len(regressions)} 个用例性能回退: {', '.join(regressions)}")
+
+
+def run_profile_summary(args: argparse.Namespace) -> None:
+    print(summarize_profiles(Path(args.dir), top=args.top, sort=args.sort))
+
+
+def run_compact_insights(args: argparse.Namespace) -> None:
+    if args.rebuild_pointers and args.dry_run:
+        print("[compact] --dry-run 不写入数据库，跳过重建最新指针")
+    elif args.rebuild_pointers:
+        for stage, count in rebuild_latest_pointers().items():
+            print(f"[compact] 重建最新指针 {stage}: {count}")
+    results = compact_snapshots(daily_days=args.daily_days, dry_run=args.dry_run)
+    print(render_compaction(results, dry_run=args.dry_run))
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Utilities for Webank multi-agent pipeline and persistence.",
@@ -67,20 +501,276 @@ def build_parser() -> argparse.ArgumentParser:
         "--model",
         help="Override the default model identifier configured via env vars.",
     )
+    run_parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Run the socio_role/asset/behavior stages concurrently before summary.",
+    )
     run_parser.add_argument(
         "--skip-db",
         action="store_true",
         help="Skip persistence to MySQL even if user_id is provided (or set WEBANK_SKIP_DB=true).",
     )
+    run_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the last persisted result of stages whose input slice is unchanged (needs DB).",
+    )
+    _add_execution_arguments(run_parser)
     run_parser.set_defaults(func=run_pipeline)
 
+    batch_parser = subparsers.add_parser(
+        "refresh-insights-batch",
+        help="Refresh insights for a JSONL file of {user_id, payload} records with a worker pool.",
+    )
+    batch_parser.add_argument(
+        "--input",
+        required=True,
+        help="Path to the JSONL input, one {\"user_id\", \"payload\"} object per line.",
+    )
+    batch_parser.add_argument(
+        "--output",
+        required=True,
+        help="Path to the JSONL output; appended to so resumed runs keep earlier results.",
+    )
+    batch_parser.add_argument(
+        "--checkpoint",
+        help="Checkpoint file listing completed user ids (defaults to <output>.ckpt).",
+    )
+    batch_parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of warm pipelines processing users concurrently.",
+    )
+    batch_parser.add_argument(
+        "--micro-batch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Pack up to N users into each stage request; failed users fall back to single calls.",
+    )
+    batch_parser.add_argument(
+        "--micro-batch-max-chars",
+        type=int,
+        default=24_000,
+        help="Upper bound on the combined prompt length of one micro-batch request.",
+    )
+    batch_parser.add_argument(
+        "--model",
+        help="Override the default model identifier configured via env vars.",
+    )
+    batch_parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Also run the upstream stages of each user concurrently.",
+    )
+    batch_parser.add_argument(
+        "--skip-db",
+        action="store_true",
+        help="Skip persistence to MySQL (or set WEBANK_SKIP_DB=true).",
+    )
+    batch_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the last persisted result of stages whose input slice is unchanged (needs DB).",
+    )
+    _add_execution_arguments(batch_parser)
+    batch_parser.set_defaults(func=run_pipeline_batch)
+
+    profile_parser = subparsers.add_parser(
+        "profile",
+        help="Run the pipeline or a conversation turn repeatedly and print a span latency report.",
+    )
+    profile_parser.add_argument(
+        "--target",
+        choices=("pipeline", "conversation"),
+        default="pipeline",
+        help="What to profile: a pipeline run or one ConversationService turn.",
+    )
+    profile_parser.add_argument(
+        "--fixture",
+        required=True,
+        help="Pipeline payload JSON, or {user_id, message, session_id?, context?} for conversation.",
+    )
+    profile_parser.add_argument("--iterations", type=int, default=5, help="Number of runs.")
+    profile_parser.add_argument(
+        "--model",
+        help="Override the default model identifier configured via env vars.",
+    )
+    profile_parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Run the upstream pipeline stages concurrently.",
+    )
+    profile_parser.add_argument(
+        "--capacity",
+        type=int,
+        default=4096,
+        help="Finished spans kept in the in-memory ring buffer.",
+    )
+    profile_parser.add_argument(
+        "--spans-file",
+        help="Also append every finished span to this JSONL file.",
+    )
+    profile_parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of span attributes listed in the serialization cost table.",
+    )
+    _add_execution_arguments(profile_parser)
+    profile_parser.set_defaults(func=run_profile)
+
+    summary_parser = subparsers.add_parser(
+        "profile-summary",
+        help="Merge cProfile/tracemalloc captures written under WEBANK_PROFILE_DIR into a top-N report.",
+    )
+    summary_parser.add_argument(
+        "--dir",
+        default=os.getenv("WEBANK_PROFILE_DIR", "profiles"),
+        help="Profile directory (defaults to WEBANK_PROFILE_DIR or ./profiles).",
+    )
+    summary_parser.add_argument("--top", type=int, default=20, help="Rows per table.")
+    summary_parser.add_argument(
+        "--sort",
+        default="tottime",
+        choices=("tottime", "cumulative", "ncalls"),
+        help="pstats sort key for the hot-function table.",
+    )
+    summary_parser.set_defaults(func=run_profile_summary)
+
+    loadtest_parser = subparsers.add_parser(
+        "loadtest-conversation",
+        help="Drive concurrent multi-turn sessions through ConversationService against a local model stub.",
+    )
+    loadtest_parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users.")
+    loadtest_parser.add_argument("--turns", type=int, default=5, help="Messages per user session.")
+    loadtest_parser.add_argument(
+        "--think-time",
+        type=float,
+        default=1.0,
+        help="Mean seconds a user waits between turns (jittered ±50%%).",
+    )
+    loadtest_parser.add_argument(
+        "--ramp",
+        type=float,
+        default=0.0,
+        help="Spread user start times uniformly over this many seconds.",
+    )
+    loadtest_parser.add_argument(
+        "--latency",
+        default="lognormal:-0.5,0.4",
+        help="Stub model latency: fixed:S | uniform:A,B | normal:MU,SD | lognormal:MU,SIGMA | exp:MEAN.",
+    )
+    loadtest_parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of stub requests answered with HTTP 500.",
+    )
+    loadtest_parser.add_argument(
+        "--base-url",
+        help="Use an existing OpenAI-compatible endpoint instead of starting the stub.",
+    )
+    loadtest_parser.add_argument("--model", help="Model id sent to the endpoint (default qwen-plus).")
+    loadtest_parser.add_argument(
+        "--store",
+        choices=("memory", "sqlite"),
+        default="memory",
+        help="Conversation storage: in-process memory or a SQLite file.",
+    )
+    loadtest_parser.add_argument(
+        "--sqlite-path",
+        default="loadtest.sqlite3",
+        help="SQLite file created and seeded with insights when --store sqlite.",
+    )
+    loadtest_parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Use agenerate_reply on one event loop instead of one thread per user.",
+    )
+    loadtest_parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Queue session messages and insert them in batches (WEBANK_MESSAGE_WRITE_BEHIND=true).",
+    )
+    loadtest_parser.add_argument("--seed", type=int, help="Seed for latency, errors and think times.")
+    loadtest_parser.add_argument(
+        "--metrics-dump",
+        help="Write agent and DB pool metrics as Prometheus text when done.",
+    )
+    loadtest_parser.set_defaults(func=run_loadtest)
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="Micro-benchmark prompt formatting, JSON parsing, span annotation and row normalization.",
+    )
+    bench_parser.add_argument("--filter", help="Only run cases whose name contains this substring.")
+    bench_parser.add_argument("--save", help="Write the results as a JSON baseline to this path.")
+    bench_parser.add_argument(
+        "--compare",
+        help="Compare against a saved baseline; exits non-zero when any case regressed.",
+    )
+    bench_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Allowed slowdown of the best (minimum) round before a case counts as a regression (0.15 = +15%%).",
+    )
+    bench_parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Approximate seconds spent timing each case.",
+    )
+    bench_parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case.")
+    bench_parser.set_defaults(func=run_bench)
+
+    compact_parser = subparsers.add_parser(
+        "compact-insights",
+        help="Thin old insight snapshots to one per user per day, then one per month.",
+    )
+    compact_parser.add_argument(
+        "--daily-days",
+        type=int,
+        default=30,
+        help="Keep one snapshot per user per day within this many days; monthly before that.",
+    )
+    compact_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many rows would be deleted; nothing is written.",
+    )
+    compact_parser.add_argument(
+        "--rebuild-pointers",
+        action="store_true",
+        help="Backfill user_insight_latest from the snapshot tables first (skipped with --dry-run).",
+    )
+    compact_parser.set_defaults(func=run_compact_insights)
+
     return parser
 
 
 def main(argv: list[str] | None = None) -> None:
     parser = build_parser()
     args = parser.parse_args(argv)
-    args.func(args)
+    if getattr(args, "model_backend", None):
+        set_model_backend(
+            ModelBackend(
+                mode=args.model_backend,
+                cassette_path=args.cassette,
+                latency_scale=args.replay_latency,
+            )
+        )
+    if getattr(args, "metrics_port", None):
+        serve_metrics(args.metrics_port)
+    try:
+        args.func(args)
+    finally:
+        if getattr(args, "metrics_dump", None):
+            dump_metrics(Path(args.metrics_dump))
 
 
 if __name__ == "__main__":
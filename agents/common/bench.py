@@ -0,0 +1,159 @@
+"""Tiny micro-benchmark runner with JSON baselines and regression comparison."""
+
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# A case's setup builds its inputs once and returns the callable being timed.
+Setup = Callable[[], Callable[[], Any]]
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    name: str
+    setup: Setup
+
+
+@dataclass
+class BenchResult:
+    """Per-call timings in microseconds over ``repeat`` rounds of ``loops`` calls."""
+
+    name: str
+    loops: int
+    median_us: float
+    min_us: float
+    stdev_us: float
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline_us: Optional[float]
+    current_us: float
+    threshold: float
+
+    @property
+    def ratio(self) -> Optional[float]:
+        if not self.baseline_us:
+            return None
+        return self.current_us / self.baseline_us
+
+    @property
+    def regressed(self) -> bool:
+        ratio = self.ratio
+        return ratio is not None and ratio > 1 + self.threshold
+
+
+def measure(case: BenchCase, min_time: float = 0.2, repeat: int = 5) -> BenchResult:
+    """Time ``case`` with loops calibrated so every round lasts ~``min_time / repeat``."""
+
+    func = case.setup()
+    func()  # warm caches and lazy imports outside the timed rounds
+    target = min_time / repeat
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(target / elapsed) + 1))
+
+    rounds: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        rounds.append((time.perf_counter() - started) / loops * 1e6)
+    return BenchResult(
+        name=case.name,
+        loops=loops,
+        median_us=statistics.median(rounds),
+        min_us=min(rounds),
+        stdev_us=statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+    )
+
+
+def run_cases(
+    cases: Iterable[BenchCase],
+    pattern: Optional[str] = None,
+    min_time: float = 0.2,
+    repeat: int = 5,
+) -> List[BenchResult]:
+    return [
+        measure(case, min_time=min_time, repeat=repeat)
+        for case in cases
+        if pattern is None or pattern in case.name
+    ]
+
+
+def save_baseline(results: Iterable[BenchResult], path: Path) -> None:
+    document = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "results": {result.name: asdict(result) for result in results},
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8")).get("results", {})
+
+
+def compare(
+    results: Iterable[BenchResult],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = 0.15,
+) -> List[Comparison]:
+    """Pair results with the baseline; ``regressed`` when slower by more than ``threshold``.
+
+    Compares the fastest round rather than the median: on shared machines the
+    minimum is far less sensitive to scheduler noise than any average.
+    """
+
+    return [
+        Comparison(
+            name=result.name,
+            baseline_us=(baseline.get(result.name) or {}).get("min_us"),
+            current_us=result.min_us,
+            threshold=threshold,
+        )
+        for result in results
+    ]
+
+
+def render_results(results: Iterable[BenchResult]) -> str:
+    lines = [f"{'case':<44} {'median':>12} {'min':>12} {'stdev':>10} {'loops':>8}"]
+    for result in results:
+        lines.append(
+            f"{result.name:<44} {result.median_us:>10.1f}us {result.min_us:>10.1f}us "
+            f"{result.stdev_us:>8.1f}us {result.loops:>8}"
+        )
+    return "\n".join(lines)
+
+
+def render_comparison(comparisons: Iterable[Comparison]) -> str:
+    lines = [f"{'case (best round)':<44} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for item in comparisons:
+        if item.ratio is None:
+            lines.append(f"{item.name:<44} {'-':>12} {item.current_us:>10.1f}us {'new':>9}")
+            continue
+        flag = "  REGRESSION" if item.regressed else ""
+        lines.append(
+            f"{item.name:<44} {item.baseline_us:>10.1f}us {item.current_us:>10.1f}us "
+            f"{item.ratio - 1:>+8.1%}{flag}"
+        )
+    return "\n".join(lines)
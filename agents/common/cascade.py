@@ -0,0 +1,103 @@
+"""Cheap-first model cascade: accept a fast model's answer unless it looks wrong."""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+DEFAULT_CASCADE_MODEL_ID = "qwen-turbo"
+
+# Fields a stage result must carry, with the expected JSON type.
+STAGE_REQUIRED_FIELDS: Dict[str, Tuple[Tuple[str, type], ...]] = {
+    "socio_role": (("role", dict),),
+    "asset": (("asset_level", str), ("risk_level", str)),
+    "behavior": (("intents", list), ("ops_signals", dict)),
+    "summary": (("highlights", list), ("recommendations", list)),
+}
+
+_RISK_LEVEL_RE = re.compile(r"^R[1-5]$")
+
+
+def _check_asset(result: Mapping[str, Any]) -> Optional[str]:
+    if not _RISK_LEVEL_RE.match(result["risk_level"].strip()):
+        return "risk_level_out_of_range"
+    return None
+
+
+def _check_behavior(result: Mapping[str, Any]) -> Optional[str]:
+    for intent in result["intents"]:
+        if not isinstance(intent, Mapping) or not intent.get("label"):
+            return "intent_without_label"
+        score = intent.get("score")
+        if not isinstance(score, (int, float)) or not 0 <= score <= 1:
+            return "intent_score_out_of_range"
+    return None
+
+
+_STAGE_CONSISTENCY_CHECKS: Dict[str, Callable[[Mapping[str, Any]], Optional[str]]] = {
+    "asset": _check_asset,
+    "behavior": _check_behavior,
+}
+
+
+def check_stage_output(stage: str, result: Any) -> Optional[str]:
+    """Return why ``result`` is unacceptable for ``stage``, or None if it passes."""
+
+    if not isinstance(result, Mapping):
+        return "not_an_object"
+    for name, expected in STAGE_REQUIRED_FIELDS.get(stage, ()):
+        if name not in result:
+            return f"missing_{name}"
+        if not isinstance(result[name], expected):
+            return f"invalid_{name}"
+    check = _STAGE_CONSISTENCY_CHECKS.get(stage)
+    return check(result) if check is not None else None
+
+
+@dataclass
+class ModelCascade:
+    """Cascade settings plus thread-safe escalation counters, shared across pipelines.
+
+    Each stage in ``stages`` is first answered by ``model_id``; the configured
+    stage model only runs when that answer fails to parse or fails
+    :func:`check_stage_output`.
+    """
+
+    model_id: str = DEFAULT_CASCADE_MODEL_ID
+    stages: Tuple[str, ...] = ("socio_role", "asset", "behavior", "summary")
+    attempts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    escalations: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    reasons: Dict[str, Dict[str, int]] = field(
+        default_factory=lambda: defaultdict(lambda: defaultdict(int))
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, stage: str, reason: Optional[str]) -> None:
+        with self._lock:
+            self.attempts[stage] += 1
+            if reason is not None:
+                self.escalations[stage] += 1
+                self.reasons[stage][reason] += 1
+
+    def escalation_rate(self, stage: str) -> float:
+        with self._lock:
+            attempts = self.attempts.get(stage, 0)
+            return self.escalations.get(stage, 0) / attempts if attempts else 0.0
+
+    def render_report(self) -> str:
+        lines = [f"[cascade] cheap model={self.model_id}"]
+        for stage in self.stages:
+            attempts = self.attempts.get(stage, 0)
+            if not attempts:
+                continue
+            top = sorted(self.reasons.get(stage, {}).items(), key=lambda item: -item[1])[:3]
+            reasons = ", ".join(f"{reason}={count}" for reason, count in top) or "-"
+            lines.append(
+                f"[cascade]   {stage:<10} n={attempts:<6} "
+                f"escalated={self.escalations.get(stage, 0)} "
+                f"rate={self.escalation_rate(stage):.1%} reasons: {reasons}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,231 @@
+"""Record/replay of OpenAI-compatible chat completions for offline runs."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no recording matches a request."""
+
+
+def request_key(model_id: str, messages: List[Dict[str, Any]], stream: bool) -> Tuple[str, str, str]:
+    """Return ``(key, system_sha256, prompt)`` for a chat completion request.
+
+    System messages are hashed rather than stored so prompt edits invalidate
+    recordings without bloating the cassette; the remaining turns are kept
+    verbatim so a miss can be inspected.
+    """
+
+    system = "\n".join(
+        str(message.get("content") or "")
+        for message in messages
+        if message.get("role") in ("system", "developer")
+    )
+    prompt = json.dumps(
+        [message for message in messages if message.get("role") not in ("system", "developer")],
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    system_sha = hashlib.sha256(system.encode("utf-8")).hexdigest()
+    digest = hashlib.sha256()
+    for part in (model_id, system_sha, prompt, "stream" if stream else "complete"):
+        encoded = part.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest(), system_sha, prompt
+
+
+@dataclass
+class Cassette:
+    """JSONL file of recorded interactions, appended to in record mode.
+
+    Each line holds the request key, the real latency and either the
+    ``ChatCompletion`` or the streamed chunks with their arrival offsets.
+    Repeated recordings of one key are replayed in order, wrapping around.
+    """
+
+    path: Path
+    _entries: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict, repr=False)
+    _cursor: Dict[str, int] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        self.path = Path(self.path)
+        if not self.path.exists():
+            return
+        with self.path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[index % len(entries)]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._entries.setdefault(entry["key"], []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+
+
+class _Completions:
+    def __init__(self, owner: "CassetteClient") -> None:
+        self._owner = owner
+
+    def create(self, **kwargs: Any) -> Any:
+        return self._owner.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, owner: "CassetteClient") -> None:
+        self.completions = _Completions(owner)
+
+
+class CassetteClient:
+    """Stand-in for ``OpenAI`` / ``AsyncOpenAI`` exposing ``chat.completions.create``.
+
+    ``record`` forwards to ``inner`` and appends what came back; ``replay``
+    never touches the network and sleeps ``latency_scale`` times the recorded
+    latency (0 disables the emulation).
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: str,
+        inner: Any = None,
+        latency_scale: float = 0.0,
+        is_async: bool = False,
+    ) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode: {mode}")
+        if mode == RECORD and inner is None:
+            raise ValueError("record mode needs a live client")
+        self.cassette = cassette
+        self.mode = mode
+        self.inner = inner
+        self.latency_scale = latency_scale
+        self.is_async = is_async
+        self.chat = _Chat(self)
+
+    def create(self, **kwargs: Any) -> Any:
+        stream = bool(kwargs.get("stream"))
+        key, system_sha, prompt = request_key(kwargs.get("model", ""), kwargs.get("messages", []), stream)
+        if self.mode == REPLAY:
+            entry = self.cassette.lookup(key)
+            if entry is None:
+                raise CassetteMiss(
+                    f"no recording for model={kwargs.get('model')} system={system_sha[:12]} "
+                    f"in {self.cassette.path}; re-record with WEBANK_MODEL_BACKEND=record"
+                )
+            if self.is_async:
+                return self._areplay(entry, stream)
+            return self._replay_stream(entry) if stream else self._replay(entry)
+
+        meta = {"key": key, "model": kwargs.get("model"), "system_sha256": system_sha, "prompt": prompt}
+        if self.is_async:
+            return self._arecord(meta, kwargs, stream)
+        started = time.perf_counter()
+        response = self.inner.chat.completions.create(**kwargs)
+        if stream:
+            return self._record_stream(meta, response, started)
+        self.cassette.append(
+            {**meta, "latency": time.perf_counter() - started, "response": response.model_dump(mode="json")}
+        )
+        return response
+
+    # -- replay ---------------------------------------------------------
+
+    def _replay(self, entry: Dict[str, Any]) -> ChatCompletion:
+        self._sleep(entry["latency"])
+        return ChatCompletion.model_validate(entry["response"])
+
+    def _replay_stream(self, entry: Dict[str, Any]) -> Iterator[ChatCompletionChunk]:
+        previous = 0.0
+        for chunk in entry["chunks"]:
+            self._sleep(chunk["offset"] - previous)
+            previous = chunk["offset"]
+            yield ChatCompletionChunk.model_validate(chunk["data"])
+
+    async def _areplay(self, entry: Dict[str, Any], stream: bool) -> Any:
+        if not stream:
+            await self._asleep(entry["latency"])
+            return ChatCompletion.model_validate(entry["response"])
+        return self._areplay_stream(entry)
+
+    async def _areplay_stream(self, entry: Dict[str, Any]) -> AsyncIterator[ChatCompletionChunk]:
+        previous = 0.0
+        for chunk in entry["chunks"]:
+            await self._asleep(chunk["offset"] - previous)
+            previous = chunk["offset"]
+            yield ChatCompletionChunk.model_validate(chunk["data"])
+
+    def _sleep(self, seconds: float) -> None:
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    async def _asleep(self, seconds: float) -> None:
+        if self.latency_scale > 0 and seconds > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    # -- record ---------------------------------------------------------
+
+    def _record_stream(
+        self, meta: Dict[str, Any], response: Any, started: float
+    ) -> Iterator[ChatCompletionChunk]:
+        # Recorded in ``finally`` so a consumer that stops early or closes the
+        # stream still leaves the chunks it received on the cassette.
+        chunks: List[Dict[str, Any]] = []
+        try:
+            for chunk in response:
+                chunks.append({"offset": time.perf_counter() - started, "data": chunk.model_dump(mode="json")})
+                yield chunk
+        finally:
+            self.cassette.append({**meta, "latency": time.perf_counter() - started, "chunks": chunks})
+
+    async def _arecord(self, meta: Dict[str, Any], kwargs: Dict[str, Any], stream: bool) -> Any:
+        started = time.perf_counter()
+        response = await self.inner.chat.completions.create(**kwargs)
+        if stream:
+            return self._arecord_stream(meta, response, started)
+        self.cassette.append(
+            {**meta, "latency": time.perf_counter() - started, "response": response.model_dump(mode="json")}
+        )
+        return response
+
+    async def _arecord_stream(
+        self, meta: Dict[str, Any], response: Any, started: float
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        chunks: List[Dict[str, Any]] = []
+        try:
+            async for chunk in response:
+                chunks.append({"offset": time.perf_counter() - started, "data": chunk.model_dump(mode="json")})
+                yield chunk
+        finally:
+            self.cassette.append({**meta, "latency": time.perf_counter() - started, "chunks": chunks})
@@ -0,0 +1,177 @@
+"""Deadline enforcement and hedged (duplicate) requests for agent calls."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from agents.common.stats import percentile
+
+PRIMARY_ATTEMPT = 0
+HEDGE_ATTEMPT = 1
+
+
+class StageTimeoutError(TimeoutError):
+    """Raised when an agent call exceeds its stage deadline."""
+
+
+@dataclass
+class DeadlinePolicy:
+    """Per-stage deadlines derived from an overall pipeline budget, plus hedging.
+
+    ``budget_seconds`` bounds a whole pipeline run. ``stage_timeouts`` caps
+    individual stages; the summary cap is reserved out of the budget so the
+    upstream stages cannot starve it. When ``hedge_percentile`` is set and a
+    stage has at least ``min_samples`` recorded latencies, a duplicate request
+    is fired once the primary call runs past that percentile. Latencies are
+    kept per ``(stage, model)`` so a cheap cascade model does not skew the
+    stage model's window; timed-out calls count at their deadline.
+    """
+
+    budget_seconds: Optional[float] = None
+    stage_timeouts: Dict[str, float] = field(default_factory=dict)
+    hedge_percentile: Optional[float] = None
+    min_samples: int = 20
+    window: int = 200
+    _latencies: Dict[Tuple[str, str], Deque[float]] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def start(self) -> Optional[float]:
+        """Return the absolute (monotonic) deadline for a run starting now."""
+
+        if self.budget_seconds is None:
+            return None
+        return time.monotonic() + self.budget_seconds
+
+    def stage_timeout(self, stage: str, deadline: Optional[float]) -> Optional[float]:
+        timeout = self.stage_timeouts.get(stage)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if stage != "summary":
+                remaining -= self.stage_timeouts.get("summary", 0.0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        if timeout is not None and timeout <= 0:
+            raise StageTimeoutError(f"Pipeline budget exhausted before stage {stage}")
+        return timeout
+
+    def hedge_delay(self, stage: str, model: str = "") -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            samples = list(self._latencies.get((stage, model), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return percentile(samples, self.hedge_percentile)
+
+    def record(self, stage: str, seconds: float, model: str = "") -> None:
+        with self._lock:
+            bucket = self._latencies.get((stage, model))
+            if bucket is None:
+                bucket = self._latencies[(stage, model)] = deque(maxlen=self.window)
+            bucket.append(seconds)
+
+
+def call_with_deadline(
+    attempt: Callable[[], Any],
+    timeout: Optional[float],
+    hedge_delay: Optional[float] = None,
+    hedge: Optional[Callable[[], Any]] = None,
+) -> Tuple[Any, int]:
+    """Run ``attempt`` on a worker thread, hedging and enforcing ``timeout``.
+
+    The duplicate request runs ``hedge`` (default: ``attempt`` again); pass a
+    separate callable when ``attempt`` is not safe to run concurrently with
+    itself. Returns ``(result, attempt_index)``. The first attempt that returns wins;
+    an attempt that raises (e.g. invalid JSON) lets the other one finish. Calls
+    still running when we return are abandoned, not interrupted.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="webank-hedge")
+    started = time.monotonic()
+    futures: Dict[Future, int] = {
+        executor.submit(contextvars.copy_context().run, attempt): PRIMARY_ATTEMPT
+    }
+    hedged = False
+    last_error: Optional[BaseException] = None
+    try:
+        while futures:
+            elapsed = time.monotonic() - started
+            wait_for = None if timeout is None else timeout - elapsed
+            can_hedge = hedge_delay is not None and not hedged
+            if can_hedge:
+                until_hedge = max(hedge_delay - elapsed, 0.0)
+                wait_for = until_hedge if wait_for is None else min(wait_for, until_hedge)
+            if wait_for is not None and wait_for <= 0 and not can_hedge:
+                raise StageTimeoutError(f"Agent call exceeded {timeout:.1f}s deadline")
+            done, _ = wait(
+                list(futures),
+                timeout=None if wait_for is None else max(wait_for, 0.0),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                index = futures.pop(future)
+                try:
+                    return future.result(), index
+                except Exception as exc:  # noqa: BLE001 - surfaced if no attempt succeeds
+                    last_error = exc
+            if not done and can_hedge and time.monotonic() - started >= hedge_delay:
+                futures[executor.submit(contextvars.copy_context().run, hedge or attempt)] = HEDGE_ATTEMPT
+                hedged = True
+            elif not done and timeout is not None and time.monotonic() - started >= timeout:
+                raise StageTimeoutError(f"Agent call exceeded {timeout:.1f}s deadline")
+        assert last_error is not None
+        raise last_error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def acall_with_deadline(
+    attempt: Callable[[], Awaitable[Any]],
+    timeout: Optional[float],
+    hedge_delay: Optional[float] = None,
+    hedge: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> Tuple[Any, int]:
+    """Asyncio counterpart of :func:`call_with_deadline`; losers are cancelled."""
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks: Dict[asyncio.Task, int] = {asyncio.ensure_future(attempt()): PRIMARY_ATTEMPT}
+    hedged = False
+    last_error: Optional[BaseException] = None
+    try:
+        while tasks:
+            elapsed = loop.time() - started
+            wait_for = None if timeout is None else timeout - elapsed
+            can_hedge = hedge_delay is not None and not hedged
+            if can_hedge:
+                until_hedge = max(hedge_delay - elapsed, 0.0)
+                wait_for = until_hedge if wait_for is None else min(wait_for, until_hedge)
+            if wait_for is not None and wait_for <= 0 and not can_hedge:
+                raise StageTimeoutError(f"Agent call exceeded {timeout:.1f}s deadline")
+            done, _ = await asyncio.wait(
+                list(tasks),
+                timeout=None if wait_for is None else max(wait_for, 0.0),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                index = tasks.pop(task)
+                try:
+                    return task.result(), index
+                except Exception as exc:  # noqa: BLE001 - surfaced if no attempt succeeds
+                    last_error = exc
+            if not done and can_hedge and loop.time() - started >= hedge_delay:
+                tasks[asyncio.ensure_future((hedge or attempt)())] = HEDGE_ATTEMPT
+                hedged = True
+            elif not done and timeout is not None and loop.time() - started >= timeout:
+                raise StageTimeoutError(f"Agent call exceeded {timeout:.1f}s deadline")
+        assert last_error is not None
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,107 @@
+"""Best-effort repair of malformed or truncated model JSON."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Truncation is near the end, so only the last few cut points are worth trying.
+_MAX_CUT_ATTEMPTS = 8
+
+
+def loads_repaired(text: str) -> Any:
+    """Decode ``text`` after fixing the usual LLM JSON defects.
+
+    Handles single-quoted strings, trailing commas, raw newlines inside
+    strings, strings cut off mid-way and unbalanced braces/brackets. When the
+    output was truncated inside a value, the last incomplete member is dropped
+    rather than guessed. Raises ``ValueError`` if no repaired form decodes.
+    """
+
+    out, stack, cut_points = _normalise(text)
+    candidates = [_close("".join(out), stack)] + [
+        _close("".join(out[:position]), cut_stack) for position, cut_stack in reversed(cut_points[-_MAX_CUT_ATTEMPTS:])
+    ]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("JSON could not be repaired")
+
+
+def _normalise(text: str) -> Tuple[List[str], Tuple[str, ...], List[Tuple[int, Tuple[str, ...]]]]:
+    """Rewrite ``text`` as double-quoted JSON tokens plus the still-open brackets.
+
+    Also returns the token positions right before each member separator (and
+    right after each opening bracket), with the bracket stack at that point;
+    cutting there always leaves complete members only.
+    """
+
+    out: List[str] = []
+    stack: List[str] = []
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+    quote = ""
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        index += 1
+        if quote:
+            if char == "\\" and index < length:
+                escaped = text[index]
+                index += 1
+                # \' is not a valid JSON escape; the quote needs none in "..." strings.
+                out.append("'" if escaped == "'" else "\\" + escaped)
+            elif char == quote:
+                quote = ""
+                out.append('"')
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            elif char != "\\":
+                out.append(char)
+            continue
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+            out.append(char)
+            cut_points.append((len(out), tuple(stack)))
+        elif char in "}]":
+            if char not in stack:
+                continue  # stray closer
+            _strip_trailing_comma(out)
+            while stack[-1] != char:
+                out.append(stack.pop())
+            out.append(stack.pop())
+            if not stack:
+                break  # ignore anything after the root value
+        elif char == ",":
+            _strip_trailing_comma(out)
+            cut_points.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    if quote:
+        out.append('"')
+    return out, tuple(stack), cut_points
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    position = len(out) - 1
+    while position >= 0 and out[position].isspace():
+        position -= 1
+    if position >= 0 and out[position] == ",":
+        del out[position]
+
+
+def _close(text: str, stack: Tuple[str, ...]) -> str:
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join(reversed(stack))
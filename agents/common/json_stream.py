@@ -0,0 +1,94 @@
+"""Incremental JSON object extraction for streamed model output."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional
+
+
+class IncrementalJSONParser:
+    """Find the first complete top-level JSON object in a stream of text chunks.
+
+    Each character is scanned once: leading prose and Markdown fences are
+    skipped until the first ``{``, then braces are counted outside of string
+    literals. As soon as the depth returns to zero the object is decoded and
+    returned from :meth:`feed`, so callers can stop the stream and ignore any
+    trailing commentary the model appends.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[str] = []
+        self._length = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result: Optional[Any] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def text(self) -> str:
+        """Everything received so far (up to the closing brace once done)."""
+
+        return self._joined()
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """Consume ``chunk``; return the decoded object once it is complete."""
+
+        if self.done or not chunk:
+            return self.result
+        base = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        return self._scan(chunk, base)
+
+    def _joined(self) -> str:
+        # Chunks are only joined when an object closes (or for ``text``), not per feed.
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def _scan(self, text: str, base: int) -> Optional[Any]:
+        """Scan ``text``, which holds the stream from offset ``base`` to the end."""
+
+        pos = 0
+        while pos < len(text):
+            char = text[pos]
+            if self._start < 0:
+                if char == "{":
+                    self._start = base + pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    end = base + pos + 1
+                    received = self._joined()
+                    try:
+                        self.result = json.loads(received[self._start : end])
+                    except json.JSONDecodeError:
+                        # Braces inside surrounding prose; look for the next object.
+                        restart, self._start = self._start + 1, -1
+                        if restart < base:
+                            text, base, pos = received[restart:], restart, 0
+                        else:
+                            pos = restart - base
+                        continue
+                    self._chunks = [received[:end]]
+                    self._length = end
+                    return self.result
+            pos += 1
+        return None
@@ -0,0 +1,111 @@
+"""Pack several users' prompts for one stage into a single model request."""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from textwrap import dedent
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+_BATCH_INSTRUCTIONS = dedent(
+    """
+    以下包含 {count} 位用户的独立输入，彼此无关。请对每一位用户分别严格按照系统提示完成分析，
+    不得混用不同用户的信息。
+
+    输出要求：只输出一个 JSON 数组，每位用户对应一个元素，格式为
+    {{"key": "<用户 key>", "result": <该用户的完整 JSON 结果>}}。
+    数组必须恰好包含以下 key 各一次：{keys}。
+    """
+).strip()
+
+
+@dataclass
+class MicroBatchPolicy:
+    """Batch size limits for multi-user stage requests, adapted per stage.
+
+    Each stage starts at ``max_batch_size``. A request whose combined output
+    cannot be split and validated halves that stage's size; every clean batch
+    grows it by one again, up to the maximum. ``max_prompt_chars`` bounds the
+    combined prompt so large users are packed into smaller batches.
+    """
+
+    max_batch_size: int = 8
+    max_prompt_chars: int = 24_000
+    _sizes: Dict[str, int] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def batch_size(self, stage: str) -> int:
+        with self._lock:
+            return self._sizes.get(stage, self.max_batch_size)
+
+    def record(self, stage: str, clean: bool) -> None:
+        with self._lock:
+            current = self._sizes.get(stage, self.max_batch_size)
+            if clean:
+                self._sizes[stage] = min(self.max_batch_size, current + 1)
+            else:
+                self._sizes[stage] = max(1, current // 2)
+
+
+def pack_batches(
+    prompts: Sequence[Tuple[str, str]],
+    max_size: int,
+    max_chars: int,
+) -> List[List[Tuple[str, str]]]:
+    """Greedily group ``(key, prompt)`` pairs within the size and length limits."""
+
+    batches: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    current_chars = 0
+    for key, prompt in prompts:
+        if current and (len(current) >= max_size or current_chars + len(prompt) > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append((key, prompt))
+        current_chars += len(prompt)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def format_batch_prompt(batch: Sequence[Tuple[str, str]]) -> str:
+    """Render one request containing every user's single-user prompt."""
+
+    keys = [key for key, _ in batch]
+    sections = [_BATCH_INSTRUCTIONS.format(count=len(batch), keys=", ".join(keys))]
+    for key, prompt in batch:
+        sections.append(f"### 用户 key: {key}\n{prompt}")
+    return "\n\n".join(sections)
+
+
+def split_batch_output(parsed: Any, keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Map the model's JSON array back to per-key results.
+
+    Entries with unknown or duplicated keys, or whose result is not a
+    non-empty object, are dropped; callers fall back to single-user calls for
+    any key missing from the returned mapping.
+    """
+
+    if isinstance(parsed, Mapping):
+        # Tolerate {"results": [...]} or a plain {key: result} object.
+        if isinstance(parsed.get("results"), list):
+            parsed = parsed["results"]
+        else:
+            parsed = [{"key": key, "result": value} for key, value in parsed.items()]
+    if not isinstance(parsed, list):
+        return {}
+
+    expected = set(keys)
+    seen: Dict[str, int] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    for item in parsed:
+        if not isinstance(item, Mapping):
+            continue
+        key = str(item.get("key", ""))
+        result = item.get("result")
+        if key not in expected:
+            continue
+        seen[key] = seen.get(key, 0) + 1
+        if isinstance(result, dict) and result:
+            results[key] = result
+    return {key: value for key, value in results.items() if seen.get(key) == 1}
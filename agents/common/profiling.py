@@ -0,0 +1,174 @@
+"""Opt-in cProfile and tracemalloc capture around top-level agent calls."""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+try:  # pragma: no cover - optional dependency guard
+    from opentelemetry import trace
+except Exception:  # pragma: no cover - keep runtime lenient
+    trace = None  # type: ignore
+
+LOGGER = logging.getLogger(__name__)
+_PROFILE_DIR_ENV = "WEBANK_PROFILE_DIR"
+_DEFAULT_PROFILE_DIR = "profiles"
+_ALLOC_TOP = 50
+
+# Only the outermost profiled call captures; nested ones (e.g. a pipeline run
+# inside a profiled reply) would otherwise fight over the same profiler.
+_ACTIVE: contextvars.ContextVar[bool] = contextvars.ContextVar("webank_profile_active", default=False)
+
+# tracemalloc is process-wide; concurrent profiled calls share one session.
+_TRACEMALLOC_LOCK = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _acquire_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _TRACEMALLOC_LOCK:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _TRACEMALLOC_LOCK:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def profiling_enabled(flag: Optional[bool] = None) -> bool:
+    """Per-call ``flag`` wins; otherwise profiling is on when ``WEBANK_PROFILE_DIR`` is set."""
+
+    if flag is not None:
+        return flag
+    return bool(os.getenv(_PROFILE_DIR_ENV))
+
+
+def _profile_root() -> Path:
+    return Path(os.getenv(_PROFILE_DIR_ENV) or _DEFAULT_PROFILE_DIR)
+
+
+def _trace_ids() -> Tuple[str, str]:
+    """Current ``(trace_id, span_id)`` in hex, or a random id outside a valid span."""
+
+    if trace is not None:
+        context = trace.get_current_span().get_span_context()
+        if context.is_valid:
+            return format(context.trace_id, "032x"), format(context.span_id, "016x")
+    return "untraced", uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def profile_call(name: str, enabled: Optional[bool] = None) -> Iterator[Optional[Path]]:
+    """Capture CPU and allocation profiles of the enclosed block when enabled.
+
+    Writes ``<root>/<trace_id>/<name>-<span_id>.prof`` (cProfile, readable with
+    ``pstats``) and ``...alloc.json`` (top allocation growth by source line).
+    cProfile only sees the calling thread, so work handed to pool threads shows
+    up as time spent waiting on futures.
+    """
+
+    if not profiling_enabled(enabled) or _ACTIVE.get():
+        yield None
+        return
+
+    trace_id, span_id = _trace_ids()
+    target = _profile_root() / trace_id / f"{name}-{span_id}"
+    token = _ACTIVE.set(True)
+    _acquire_tracemalloc()
+    before = tracemalloc.take_snapshot()
+    profiler: Optional[cProfile.Profile] = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process.
+        LOGGER.debug("Another profiler is active; capturing allocations only for %s", name)
+        profiler = None
+    try:
+        yield target
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        after = tracemalloc.take_snapshot()
+        _release_tracemalloc()
+        _ACTIVE.reset(token)
+        try:
+            _write_profiles(target, profiler, before, after)
+        except OSError as exc:
+            LOGGER.warning("Failed to write profile %s: %s", target, exc)
+
+
+def _write_profiles(
+    target: Path,
+    profiler: Optional[cProfile.Profile],
+    before: tracemalloc.Snapshot,
+    after: tracemalloc.Snapshot,
+) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if profiler is not None:
+        profiler.dump_stats(str(target.parent / f"{target.name}.prof"))
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    allocations = [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size": stat.size_diff,
+            "count": stat.count_diff,
+        }
+        for stat in diff[:_ALLOC_TOP]
+        if stat.size_diff > 0
+    ]
+    (target.parent / f"{target.name}.alloc.json").write_text(
+        json.dumps(allocations), encoding="utf-8"
+    )
+
+
+def summarize_profiles(root: Path, top: int = 20, sort: str = "tottime") -> str:
+    """Merge every profile under ``root`` into top-N functions and allocation sites."""
+
+    prof_files = sorted(root.rglob("*.prof"))
+    if not prof_files:
+        return f"[profile] {root} 下没有 .prof 文件"
+
+    buffer = StringIO()
+    stats = pstats.Stats(str(prof_files[0]), stream=buffer)
+    for path in prof_files[1:]:
+        stats.add(str(path))
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+    allocations: Dict[str, Dict[str, int]] = defaultdict(lambda: {"size": 0, "count": 0})
+    for path in root.rglob("*.alloc.json"):
+        for item in json.loads(path.read_text(encoding="utf-8")):
+            bucket = allocations[item["location"]]
+            bucket["size"] += int(item["size"])
+            bucket["count"] += int(item["count"])
+
+    lines = [
+        f"[profile] merged {len(prof_files)} runs from {root} (sort={sort})",
+        buffer.getvalue().rstrip(),
+        "",
+        f"[profile] top {top} allocation sites (net growth per run, summed)",
+    ]
+    ranked = sorted(allocations.items(), key=lambda item: -item[1]["size"])[:top]
+    for location, bucket in ranked:
+        lines.append(f"{bucket['size'] / 1024:>10.1f} KiB {bucket['count']:>8} blocks  {location}")
+    return "\n".join(lines)
@@ -0,0 +1,250 @@
+"""Content-addressed cache for structured agent stage results."""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+def stage_cache_key(agent_name: str, model_id: str, system_prompt: str, prompt: str) -> str:
+    """Hash every input that can change a stage's output."""
+
+    digest = hashlib.sha256()
+    for part in (agent_name, model_id, system_prompt, prompt):
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") never collide.
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def fingerprint_stage_input(stage_input: Any) -> str:
+    """Stable SHA-256 of a stage input slice, independent of key order."""
+
+    canonical = json.dumps(
+        stage_input,
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LRUTier:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else 0.0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteTier:
+    """Persistent tier stored in a local SQLite file.
+
+    Entries older than ``ttl_seconds`` are treated as misses. Reads never
+    write: hits are remembered in memory and their ``accessed_at`` is saved
+    with the next :meth:`put`. Expired rows are swept every ``evict_every``
+    puts, and once the approximate row count exceeds ``max_entries`` the
+    least recently used rows are evicted down to 90% of it, so the
+    ``COUNT(*)`` and ``DELETE`` run once per batch of puts rather than on
+    each one. With ``track_access=False`` hits are not recorded and eviction
+    follows insertion order.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 100_000,
+        table: str = "stage_results",
+        track_access: bool = True,
+        evict_every: int = 256,
+    ) -> None:
+        self.path = Path(path)
+        self.table = table
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.track_access = track_access
+        self.evict_every = evict_every
+        self._touched: Dict[str, float] = {}
+        self._puts_since_sweep = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table}_created ON {self.table} (created_at)"
+            )
+            self._conn.commit()
+            (self._approx_count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and created_at + self.ttl_seconds < now:
+                return None  # deleted by the next sweep
+            if self.track_access:
+                self._touched[key] = now
+        return json.loads(value)
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._save_touched()
+            self._conn.execute(
+                f"""
+                INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (key, encoded, now, now),
+            )
+            # Over-counts replaced keys; the sweep resets it to the exact count.
+            self._approx_count += 1
+            self._puts_since_sweep += 1
+            if self._approx_count > self.max_entries or self._puts_since_sweep >= self.evict_every:
+                self._evict()
+            self._conn.commit()
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._touched.pop(key, None)
+            deleted = self._conn.execute(f"DELETE FROM {self.table} WHERE key=?", (key,)).rowcount
+            self._approx_count -= max(deleted, 0)
+            self._conn.commit()
+
+    def _save_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                f"UPDATE {self.table} SET accessed_at=? WHERE key=?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        self._puts_since_sweep = 0
+        if self.ttl_seconds:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            overflow = count - (self.max_entries - self.max_entries // 10)
+            self._conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+            count -= overflow
+        self._approx_count = count
+
+    def close(self) -> None:
+        with self._lock:
+            self._save_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+@dataclass
+class StageResultCache:
+    """Two-tier (memory, then optional SQLite) cache for parsed stage outputs."""
+
+    memory: LRUTier = field(default_factory=LRUTier)
+    persistent: Optional[SQLiteTier] = None
+    hits: int = 0
+    misses: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def from_path(
+        cls,
+        path: Path | str | None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 100_000,
+        memory_entries: int = 1024,
+    ) -> "StageResultCache":
+        persistent = SQLiteTier(path, ttl_seconds, max_entries) if path else None
+        return cls(memory=LRUTier(memory_entries, ttl_seconds), persistent=persistent)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None and self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Callers may mutate stage results, so never hand out the cached object.
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        stored = copy.deepcopy(value)
+        self.memory.put(key, stored)
+        if self.persistent is not None:
+            self.persistent.put(key, stored)
+
+    def invalidate(self, key: str) -> None:
+        self.memory.pop(key)
+        if self.persistent is not None:
+            self.persistent.pop(key)
@@ -0,0 +1,68 @@
+"""Helpers for invoking agno agents (or test stubs) from asyncio code."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Mapping, Tuple
+
+
+async def arun_agent(agent: Any, prompt: str) -> Any:
+    """Await an agent call, preferring agno's native ``arun`` coroutine.
+
+    Local stand-ins such as ``FallbackConversationAgent`` only expose ``run``;
+    those are pushed to the default executor so the event loop never blocks.
+    """
+
+    arun = getattr(agent, "arun", None)
+    if arun is not None:
+        return await arun(prompt)
+    return await asyncio.to_thread(agent.run, prompt)
+
+
+def stringify_output(output: Any) -> str:
+    """Render various agent outputs to plain text for tracing."""
+
+    if isinstance(output, dict) and "content" in output:
+        return str(output["content"]).strip()
+    if hasattr(output, "content"):
+        return str(output.content).strip()
+    return str(output).strip()
+
+
+def stream_delta(event: Any) -> str:
+    """Return the text delta carried by a streamed agno event (or plain chunk)."""
+
+    if isinstance(event, str):
+        return event
+    if getattr(event, "event", None) != "RunContent":
+        return ""
+    content = getattr(event, "content", None)
+    return content if isinstance(content, str) else ""
+
+
+def is_stream(output: Any) -> bool:
+    """True when ``agent.run(..., stream=True)`` produced an event iterator."""
+
+    if isinstance(output, (str, bytes, dict)) or hasattr(output, "content"):
+        return False
+    return hasattr(output, "__iter__") or hasattr(output, "__aiter__")
+
+
+def usage_tokens(output: Any) -> Tuple[int, int]:
+    """Return ``(prompt_tokens, completion_tokens)`` reported on an agno run output.
+
+    Handles both the metrics object of recent agno releases and the older dict
+    of per-message lists; anything else (test stubs, plain strings) counts 0.
+    """
+
+    metrics = getattr(output, "metrics", None)
+    if metrics is None:
+        return 0, 0
+
+    def read(name: str) -> int:
+        value = metrics.get(name) if isinstance(metrics, Mapping) else getattr(metrics, name, None)
+        if isinstance(value, (list, tuple)):
+            return int(sum(item for item in value if isinstance(item, (int, float))))
+        return int(value) if isinstance(value, (int, float)) else 0
+
+    return read("input_tokens"), read("output_tokens")
@@ -0,0 +1,130 @@
+"""Text latency reports built from locally buffered spans."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from agents.common.stats import percentile
+
+SpanRecord = Mapping[str, Any]
+
+
+def group_traces(spans: Iterable[SpanRecord]) -> Dict[str, List[SpanRecord]]:
+    """Group span records by trace id, each trace ordered by start time."""
+
+    traces: Dict[str, List[SpanRecord]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    for records in traces.values():
+        records.sort(key=lambda span: span["start"])
+    return dict(traces)
+
+
+def union_length(intervals: List[Tuple[float, float]]) -> float:
+    """Total length of the union of ``intervals``."""
+
+    total = 0.0
+    current_start, current_end = None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def self_times(trace: Sequence[SpanRecord]) -> Dict[str, float]:
+    """Span id -> time not covered by any child span.
+
+    Children running concurrently (parallel upstream stages) are merged first,
+    so overlapping children are not subtracted twice.
+    """
+
+    children: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+    for span in trace:
+        if span.get("parent_id"):
+            children[span["parent_id"]].append((span["start"], span["end"]))
+    result = {}
+    for span in trace:
+        clipped = [
+            (max(start, span["start"]), min(end, span["end"]))
+            for start, end in children.get(span["span_id"], ())
+            if end > span["start"] and start < span["end"]
+        ]
+        result[span["span_id"]] = max(0.0, span["duration"] - union_length(clipped))
+    return result
+
+
+def render_waterfall(trace: Sequence[SpanRecord], width: int = 40) -> str:
+    """One line per span: offset, duration, self time, bar and indented name."""
+
+    if not trace:
+        return ""
+    ids = {span["span_id"] for span in trace}
+    by_parent: Dict[Any, List[SpanRecord]] = defaultdict(list)
+    for span in trace:
+        parent = span.get("parent_id") if span.get("parent_id") in ids else None
+        by_parent[parent].append(span)
+    origin = min(span["start"] for span in trace)
+    total = max(span["end"] for span in trace) - origin or 1e-9
+    own = self_times(trace)
+
+    lines = [f"{'offset':>9} {'dur':>9} {'self':>9}  {'timeline':<{width}}  span"]
+
+    def visit(span: SpanRecord, depth: int) -> None:
+        offset = span["start"] - origin
+        begin = int(offset / total * width)
+        length = max(1, int(span["duration"] / total * width))
+        bar = (" " * begin + "█" * length)[:width]
+        lines.append(
+            f"{offset * 1000:>7.1f}ms {span['duration'] * 1000:>7.1f}ms "
+            f"{own[span['span_id']] * 1000:>7.1f}ms  {bar:<{width}}  {'  ' * depth}{span['name']}"
+        )
+        for child in sorted(by_parent.get(span["span_id"], ()), key=lambda item: item["start"]):
+            visit(child, depth + 1)
+
+    for root in by_parent.get(None, ()):
+        visit(root, 0)
+    return "\n".join(lines)
+
+
+def render_span_stats(traces: Mapping[str, Sequence[SpanRecord]]) -> str:
+    """p50/p95 of duration and self time per span name across traces."""
+
+    durations: Dict[str, List[float]] = defaultdict(list)
+    own_times: Dict[str, List[float]] = defaultdict(list)
+    for trace in traces.values():
+        own = self_times(trace)
+        for span in trace:
+            durations[span["name"]].append(span["duration"])
+            own_times[span["name"]].append(own[span["span_id"]])
+
+    lines = [f"{'span':<28} {'n':>5} {'p50':>9} {'p95':>9} {'self p50':>9} {'self p95':>9}"]
+    for name in sorted(durations, key=lambda key: -percentile(durations[key], 50)):
+        samples, own = durations[name], own_times[name]
+        lines.append(
+            f"{name:<28} {len(samples):>5} "
+            f"{percentile(samples, 50) * 1000:>7.1f}ms {percentile(samples, 95) * 1000:>7.1f}ms "
+            f"{percentile(own, 50) * 1000:>7.1f}ms {percentile(own, 95) * 1000:>7.1f}ms"
+        )
+    return "\n".join(lines)
+
+
+def render_serialization_costs(
+    costs: Sequence[Tuple[str, int, float, float, int]],
+    top: int = 10,
+) -> str:
+    """Top span attribute keys by time spent serializing their payloads."""
+
+    lines = [f"{'attribute':<32} {'calls':>6} {'total':>9} {'max':>9} {'avg chars':>10}"]
+    for key, calls, total, worst, chars in costs[:top]:
+        lines.append(
+            f"{key:<32} {calls:>6} {total * 1000:>7.2f}ms {worst * 1000:>7.2f}ms "
+            f"{chars // max(calls, 1):>10}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,16 @@
+"""Small statistics helpers used by batch/profiling reports."""
+
+from __future__ import annotations
+
+import math
+from typing import Sequence
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Return the nearest-rank percentile (``pct`` in 0-100) of ``samples``."""
+
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
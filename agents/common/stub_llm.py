@@ -0,0 +1,218 @@
+"""Local OpenAI-compatible chat completion stub with configurable latency."""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ReplyFn = Callable[[List[Dict[str, Any]]], str]
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """Per-request latency in seconds, parsed from ``kind:param,...``.
+
+    ``fixed:0.8`` · ``uniform:0.3,1.5`` · ``normal:0.8,0.2`` ·
+    ``lognormal:-0.2,0.5`` (mu/sigma of ln seconds) · ``exp:0.8`` (mean).
+    """
+
+    kind: str = "fixed"
+    params: Tuple[float, ...] = (0.0,)
+
+    _ARITY = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, _, raw = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind not in cls._ARITY:
+            raise ValueError(f"unknown latency distribution: {spec}")
+        params = tuple(float(part) for part in raw.split(",") if part.strip())
+        if len(params) != cls._ARITY[kind]:
+            raise ValueError(f"{kind} expects {cls._ARITY[kind]} parameter(s): {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(*self.params)
+        else:
+            value = rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+def default_reply(messages: List[Dict[str, Any]]) -> str:
+    """JSON reply in the shape ConversationService expects, echoing the question."""
+
+    question = ""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            question = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+            break
+    return json.dumps(
+        {"response": f"（stub）已收到：{question[-60:]}", "actions": [], "insight_refs": []},
+        ensure_ascii=False,
+    )
+
+
+@dataclass
+class StubChatServer:
+    """Threaded HTTP server answering ``POST */chat/completions``.
+
+    Supports ``stream=true`` (SSE, the reply split into ``chunks`` pieces spread
+    over the sampled latency) and injects HTTP 500s at ``error_rate``. Use as a
+    context manager; ``base_url`` plugs into ``DashScope(base_url=...)``.
+    """
+
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    error_rate: float = 0.0
+    reply: ReplyFn = default_reply
+    chunks: int = 4
+    seed: Optional[int] = None
+    host: str = "127.0.0.1"
+    port: int = 0
+    requests: int = 0
+    errors: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _server: Optional[ThreadingHTTPServer] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def base_url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("stub server not started")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubChatServer":
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub._handle(self, body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                return
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubChatServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.requests += 1
+            delay = self.latency.sample(self._rng)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def _handle(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]) -> None:
+        delay, failed = self._draw()
+        model = body.get("model", "stub")
+        messages = body.get("messages") or []
+        if failed:
+            time.sleep(delay)
+            _send_json(handler, 500, {"error": {"message": "stub injected failure", "code": "stub_error"}})
+            return
+
+        text = self.reply(messages)
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 2
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(text) // 2,
+            "total_tokens": prompt_tokens + len(text) // 2,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if not body.get("stream"):
+            time.sleep(delay)
+            _send_json(
+                handler,
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": text},
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        pieces = max(1, self.chunks)
+        step = max(1, -(-len(text) // pieces))
+        for index, start in enumerate(range(0, len(text), step)):
+            time.sleep(delay / pieces)
+            last = start + step >= len(text)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": text[start : start + step]}
+                        if index == 0
+                        else {"content": text[start : start + step]},
+                        "finish_reason": "stop" if last else None,
+                    }
+                ],
+            }
+            if last:
+                chunk["usage"] = usage
+            handler.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+
+def _send_json(handler: BaseHTTPRequestHandler, status: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
@@ -2,17 +2,29 @@
 
 from __future__ import annotations
 
+import bisect
+import hashlib
+import json
 import logging
 import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
 from contextlib import contextmanager
 from functools import lru_cache
-from typing import Any, Dict, Iterator, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, TypeVar
+
+from agents.common.runner import usage_tokens
 
 try:  # pragma: no cover - optional dependency guard
     from opentelemetry import trace
     from opentelemetry.sdk.resources import Resource
-    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
     from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, Sampler, TraceIdRatioBased
     from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 
     _OTEL_AVAILABLE = True
@@ -20,15 +32,41 @@ except Exception:  # pragma: no cover - keep runtime lenient
     trace = None  # type: ignore
     Resource = None  # type: ignore
     TracerProvider = None  # type: ignore
+    SpanProcessor = object  # type: ignore
     BatchSpanProcessor = None  # type: ignore
+    ParentBased = None  # type: ignore
+    Sampler = object  # type: ignore
+    TraceIdRatioBased = None  # type: ignore
     OTLPSpanExporter = None  # type: ignore
     _OTEL_AVAILABLE = False
 
+try:  # pragma: no cover - optional dependency guard
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+
+    _OTEL_METRICS_AVAILABLE = True
+except Exception:  # pragma: no cover - keep runtime lenient
+    otel_metrics = None  # type: ignore
+    MeterProvider = None  # type: ignore
+    PeriodicExportingMetricReader = None  # type: ignore
+    OTLPMetricExporter = None  # type: ignore
+    _OTEL_METRICS_AVAILABLE = False
+
 
 LOGGER = logging.getLogger(__name__)
 _TRACE_NAMESPACE = "webank.agents"
 _DEFAULT_LANGSMITH_ENDPOINT = "https://api.smith.langchain.com/otel/v1/traces"
 _ENABLE_FLAG = "WEBANK_ENABLE_OTEL"
+_SAMPLE_RATIOS_ENV = "WEBANK_OTEL_SAMPLE_RATIOS"
+_SAMPLE_DEFAULT_ENV = "WEBANK_OTEL_SAMPLE_DEFAULT"
+_BLOB_DIR_ENV = "WEBANK_OTEL_BLOB_DIR"
+_LOCAL_SPANS_ENV = "WEBANK_OTEL_LOCAL_SPANS"
+_LOCAL_SPANS_FILE_ENV = "WEBANK_OTEL_LOCAL_SPANS_FILE"
+SPAN_TEXT_LIMIT = 2048
+
+AttributeProvider = Callable[[], Any]
 
 
 def _parse_bool(value: str | None) -> Optional[bool]:
@@ -67,6 +105,69 @@ def _parse_header_string(raw_headers: str | None) -> Dict[str, str]:
     return headers
 
 
+def _parse_sample_ratios(raw: str | None) -> Dict[str, float]:
+    """Parse ``"pipeline.run=0.1,agent.=0.5"`` into span-name prefixes and ratios."""
+
+    ratios: Dict[str, float] = {}
+    for name, value in _parse_header_string(raw).items():
+        try:
+            ratios[name] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            LOGGER.warning("Ignoring invalid sample ratio %r for span %s", value, name)
+    return ratios
+
+
+class SpanNameRatioSampler(Sampler):
+    """Head sampler picking a trace-id ratio by span name (longest prefix wins).
+
+    Only root spans consult it; ``build_sampler`` wraps it in ``ParentBased`` so
+    every child follows its trace's decision.
+    """
+
+    def __init__(self, ratios: Mapping[str, float], default_ratio: float = 1.0) -> None:
+        self._samplers = {
+            name: TraceIdRatioBased(ratio)
+            for name, ratio in sorted(ratios.items(), key=lambda item: -len(item[0]))
+        }
+        self._default = TraceIdRatioBased(default_ratio)
+
+    def _sampler_for(self, name: str) -> Any:
+        for prefix, sampler in self._samplers.items():
+            if name.startswith(prefix):
+                return sampler
+        return self._default
+
+    def should_sample(
+        self,
+        parent_context: Any,
+        trace_id: int,
+        name: str,
+        kind: Any = None,
+        attributes: Any = None,
+        links: Any = None,
+        trace_state: Any = None,
+    ) -> Any:
+        return self._sampler_for(name).should_sample(
+            parent_context, trace_id, name, kind, attributes, links, trace_state
+        )
+
+    def get_description(self) -> str:
+        return f"SpanNameRatioSampler({len(self._samplers)} rules)"
+
+
+def build_sampler(
+    ratios: Optional[Mapping[str, float]] = None,
+    default_ratio: Optional[float] = None,
+) -> Any:
+    """Parent-based per-span-name sampler; defaults come from the environment."""
+
+    if ratios is None:
+        ratios = _parse_sample_ratios(os.getenv(_SAMPLE_RATIOS_ENV))
+    if default_ratio is None:
+        default_ratio = float(os.getenv(_SAMPLE_DEFAULT_ENV, "1.0"))
+    return ParentBased(root=SpanNameRatioSampler(ratios, default_ratio))
+
+
 def _build_headers() -> Dict[str, str]:
     headers = _parse_header_string(os.getenv("OTEL_EXPORTER_OTLP_HEADERS"))
     api_key = os.getenv("LANGSMITH_API_KEY")
@@ -78,6 +179,28 @@ def _build_headers() -> Dict[str, str]:
     return headers
 
 
+def _resource() -> Any:
+    return Resource.create(
+        {
+            "service.name": os.getenv("OTEL_SERVICE_NAME", "webank-agents"),
+            "service.namespace": os.getenv("OTEL_SERVICE_NAMESPACE", "webank"),
+        }
+    )
+
+
+def _sdk_tracer_provider(sampler: Any = None) -> Any:
+    """Return the global SDK tracer provider, installing one if none is set yet."""
+
+    current = trace.get_tracer_provider()
+    if isinstance(current, TracerProvider):
+        return current
+    trace.set_tracer_provider(
+        TracerProvider(resource=_resource(), sampler=sampler or build_sampler())
+    )
+    current = trace.get_tracer_provider()
+    return current if isinstance(current, TracerProvider) else None
+
+
 @lru_cache(maxsize=1)
 def configure_tracing() -> bool:
     """Configure OpenTelemetry once for LangSmith if enabled."""
@@ -98,27 +221,13 @@ def configure_tracing() -> bool:
         )
         return False
 
-    resource = Resource.create(
-        {
-            "service.name": os.getenv("OTEL_SERVICE_NAME", "webank-agents"),
-            "service.namespace": os.getenv("OTEL_SERVICE_NAMESPACE", "webank"),
-        }
-    )
-
-    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider = _sdk_tracer_provider()
+    if tracer_provider is None:
+        LOGGER.debug("Tracer provider already configured and not SDK-based; skipping override.")
+        return False
     span_processor = BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint, headers=headers))
     tracer_provider.add_span_processor(span_processor)
 
-    try:
-        trace.set_tracer_provider(tracer_provider)
-    except RuntimeError:
-        current_provider = trace.get_tracer_provider()
-        if isinstance(current_provider, TracerProvider):  # type: ignore[arg-type]
-            current_provider.add_span_processor(span_processor)
-        else:
-            LOGGER.debug("Tracer provider already configured and not SDK-based; skipping override.")
-            return False
-
     LOGGER.info("OpenTelemetry tracing configured for LangSmith exporter at %s", endpoint)
     return True
 
@@ -129,11 +238,129 @@ def is_tracing_enabled() -> bool:
     return configure_tracing()
 
 
+def _truncate(text: str, limit: int = SPAN_TEXT_LIMIT) -> str:
+    if limit <= 3:
+        return text[:limit]
+    if len(text) <= limit:
+        return text
+    return f"{text[: limit - 3]}..."
+
+
+def _serialize(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class _SerializationStats:
+    """Time spent turning span payloads into attributes, per attribute key."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}
+
+    def record(self, key: str, seconds: float, chars: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(key, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            stats[3] += chars
+
+    def snapshot(self) -> List[Tuple[str, int, float, float, int]]:
+        """``(key, calls, total_s, max_s, chars)`` sorted by total time, descending."""
+
+        with self._lock:
+            rows = [(key, int(s[0]), s[1], s[2], int(s[3])) for key, s in self._stats.items()]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+_SERIALIZATION = _SerializationStats()
+
+
+def serialization_costs() -> List[Tuple[str, int, float, float, int]]:
+    return _SERIALIZATION.snapshot()
+
+
+def reset_serialization_costs() -> None:
+    _SERIALIZATION.clear()
+
+
+def offload_blob(text: str) -> Optional[str]:
+    """Store ``text`` under ``$WEBANK_OTEL_BLOB_DIR`` keyed by its SHA-256.
+
+    Returns the digest, or None when offloading is disabled or fails. Identical
+    payloads are written once.
+    """
+
+    root = os.getenv(_BLOB_DIR_ENV)
+    if not root:
+        return None
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = Path(root) / digest[:2] / f"{digest}.json"
+    if path.exists():
+        return digest
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temp file per call: threads of one process may offload the same payload at once.
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as tmp:
+            tmp_name = tmp.name
+            tmp.write(data)
+        os.replace(tmp_name, path)
+    except OSError as exc:
+        LOGGER.debug("Span payload offload failed: %s", exc)
+        if tmp_name is not None:
+            Path(tmp_name).unlink(missing_ok=True)
+        return None
+    return digest
+
+
+def set_payload_attribute(
+    span: Any,
+    key: str,
+    value: Any,
+    limit: int = SPAN_TEXT_LIMIT,
+) -> None:
+    """Attach a (possibly large) payload to ``span`` as truncated text.
+
+    With ``WEBANK_OTEL_BLOB_DIR`` set, the full text is offloaded and its hash
+    recorded under ``<key>.blob_sha256``.
+    """
+
+    if span is None:
+        return
+    started = time.perf_counter()
+    text = _serialize(value).strip()
+    if text:
+        digest = offload_blob(text) if len(text) > limit else None
+        if digest is not None:
+            span.set_attribute(f"{key}.blob_sha256", digest)
+        span.set_attribute(key, _truncate(text, limit))
+    _SERIALIZATION.record(key, time.perf_counter() - started, len(text))
+
+
 @contextmanager
 def trace_agent_span(
-    name: str, attributes: Optional[Dict[str, Any]] = None
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    lazy_attributes: Optional[Mapping[str, AttributeProvider]] = None,
 ) -> Iterator[Any]:
-    """Context manager that records a span around an agent action."""
+    """Context manager that records a span around an agent action.
+
+    Yields None when tracing is unavailable or the span is not sampled, so
+    callers guarding on ``span is not None`` skip building attributes.
+    ``lazy_attributes`` are only evaluated for recording spans; str, dict and
+    list results go through :func:`set_payload_attribute`.
+    """
 
     if trace is None:
         yield None
@@ -141,12 +368,434 @@ def trace_agent_span(
 
     # Attempt lazy configuration (safe even if already configured elsewhere).
     configure_tracing()
+    configure_local_spans()
 
     tracer = trace.get_tracer(_TRACE_NAMESPACE)
     with tracer.start_as_current_span(name) as span:
+        if not span.is_recording():
+            # The span still carries context for children; it just takes no data.
+            yield None
+            return
         if attributes:
             for key, value in attributes.items():
                 if value is None:
                     continue
                 span.set_attribute(key, value)
+        for key, provider in (lazy_attributes or {}).items():
+            value = provider()
+            if isinstance(value, (str, dict, list, tuple)):
+                set_payload_attribute(span, key, value)
+            elif value is not None:
+                span.set_attribute(key, value)
         yield span
+
+
+# --------------------------------------------------------------------------
+# Local span buffer
+# --------------------------------------------------------------------------
+
+
+def _span_record(span: Any) -> Dict[str, Any]:
+    context = span.get_span_context()
+    parent = getattr(span, "parent", None)
+    start = (span.start_time or 0) / 1e9
+    end = (span.end_time or span.start_time or 0) / 1e9
+    return {
+        "name": span.name,
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_id": format(parent.span_id, "016x") if parent is not None else None,
+        "start": start,
+        "end": end,
+        "duration": max(0.0, end - start),
+        "attributes": dict(span.attributes or {}),
+    }
+
+
+class LocalSpanBuffer(SpanProcessor):
+    """Span processor keeping the last ``capacity`` finished spans in memory.
+
+    With ``path`` set each span is also appended to that file as one JSON line,
+    so traces survive the process on machines without an exporter.
+    """
+
+    def __init__(self, capacity: int = 2048, path: Optional[Path] = None) -> None:
+        self._spans: "deque[Dict[str, Any]]" = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._path = path
+
+    def on_start(self, span: Any, parent_context: Any = None) -> None:
+        return None
+
+    def on_end(self, span: Any) -> None:
+        record = _span_record(span)
+        with self._lock:
+            self._spans.append(record)
+            if self._path is not None:
+                with self._path.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def spans(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def shutdown(self) -> None:
+        return None
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def install_local_spans(
+    capacity: int = 2048,
+    path: Optional[Path] = None,
+    sampler: Any = None,
+) -> Optional[LocalSpanBuffer]:
+    """Attach a :class:`LocalSpanBuffer` to the global SDK tracer provider.
+
+    Installs a provider when none exists yet (``sampler`` applies only then).
+    Returns None when OpenTelemetry is unavailable or a non-SDK provider is set.
+    """
+
+    if not _OTEL_AVAILABLE:
+        return None
+    provider = _sdk_tracer_provider(sampler)
+    if provider is None:
+        return None
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    buffer = LocalSpanBuffer(capacity, path)
+    provider.add_span_processor(buffer)
+    return buffer
+
+
+@lru_cache(maxsize=1)
+def configure_local_spans() -> Optional[LocalSpanBuffer]:
+    """Install the local buffer once when ``WEBANK_OTEL_LOCAL_SPANS`` is set."""
+
+    capacity = os.getenv(_LOCAL_SPANS_ENV)
+    if not capacity:
+        return None
+    path = os.getenv(_LOCAL_SPANS_FILE_ENV)
+    return install_local_spans(int(capacity), Path(path) if path else None)
+
+
+# --------------------------------------------------------------------------
+# Metrics
+# --------------------------------------------------------------------------
+
+_METRICS_ENDPOINT_ENV = "OTEL_EXPORTER_OTLP_METRICS_ENDPOINT"
+# Seconds; LLM stages range from cached (ms) to slow summaries (tens of seconds).
+_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+# Seconds; for waits that are usually sub-millisecond (pool checkouts, locks).
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(attributes: Mapping[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in attributes.items()))
+
+
+def _render_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+@lru_cache(maxsize=1)
+def configure_metrics() -> bool:
+    """Install an OTLP metrics exporter once, when an endpoint is configured.
+
+    Without it the OpenTelemetry instruments are no-ops; the local registry
+    behind :func:`render_metrics` is always populated.
+    """
+
+    endpoint = os.getenv(_METRICS_ENDPOINT_ENV)
+    if not _OTEL_METRICS_AVAILABLE or not endpoint or not _should_enable():
+        return False
+    reader = PeriodicExportingMetricReader(
+        OTLPMetricExporter(endpoint=endpoint, headers=_build_headers())
+    )
+    try:
+        otel_metrics.set_meter_provider(MeterProvider(resource=_resource(), metric_readers=[reader]))
+    except RuntimeError:
+        LOGGER.debug("Meter provider already configured; keeping the existing one.")
+        return False
+    LOGGER.info("OpenTelemetry metrics configured for exporter at %s", endpoint)
+    return True
+
+
+class _Metric:
+    """Base for metrics that other modules register on :data:`METRICS`."""
+
+    _factory = ""
+
+    def __init__(self, registry: "AgentMetrics", name: str, otel_name: str, description: str, unit: str) -> None:
+        self._registry = registry
+        self.name = name
+        self.otel_name = otel_name
+        self.description = description
+        self.unit = unit
+        self._instrument: Any = None
+
+    def _otel(self) -> Any:
+        if otel_metrics is None:
+            return None
+        if self._instrument is None:
+            configure_metrics()
+            meter = otel_metrics.get_meter(_TRACE_NAMESPACE)
+            self._instrument = getattr(meter, self._factory)(
+                self.otel_name, unit=self.unit, description=self.description
+            )
+        return self._instrument
+
+
+class CounterMetric(_Metric):
+    _factory = "create_counter"
+
+    def add(self, amount: float, attributes: Mapping[str, Any]) -> None:
+        self._registry._increment(self.name, attributes, amount)
+        instrument = self._otel()
+        if instrument is not None:
+            instrument.add(amount, attributes)
+
+
+class HistogramMetric(_Metric):
+    _factory = "create_histogram"
+
+    def record(self, value: float, attributes: Mapping[str, Any]) -> None:
+        self._registry._observe(self.name, attributes, value)
+        instrument = self._otel()
+        if instrument is not None:
+            instrument.record(value, attributes)
+
+
+class GaugeMetric(_Metric):
+    _factory = "create_up_down_counter"
+
+    def add(self, delta: int, attributes: Mapping[str, Any]) -> None:
+        self._registry._adjust(self.name, attributes, delta)
+        instrument = self._otel()
+        if instrument is not None:
+            instrument.add(delta, attributes)
+
+    def set(self, value: int, attributes: Mapping[str, Any]) -> None:
+        """Overwrite the local value; not exported, OpenTelemetry up/down counters only add."""
+        with self._registry._lock:
+            self._registry._gauges[self.name][_labels(attributes)] = value
+
+
+_MetricT = TypeVar("_MetricT", bound=_Metric)
+
+
+class AgentMetrics:
+    """Stage/agent metrics mirrored to OpenTelemetry and a local text registry.
+
+    * ``webank_stage_duration_seconds`` histogram (agent, model, stage)
+    * ``webank_agent_tokens_total`` counter (agent, model, kind=prompt|completion)
+    * ``webank_json_parse_failures_total`` counter (agent, model, stage)
+    * ``webank_agent_in_flight`` gauge (agent, model)
+
+    Other modules register their own series with :meth:`counter`,
+    :meth:`histogram` and :meth:`gauge`; those share the meter and show up
+    in :meth:`render` alongside the agent metrics.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+        self._histogram_sums: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[Labels, int]] = defaultdict(lambda: defaultdict(int))
+        self._histogram_buckets: Dict[str, Tuple[float, ...]] = {"webank_stage_duration_seconds": _DURATION_BUCKETS}
+        self._counter_names: List[str] = ["webank_agent_tokens_total", "webank_json_parse_failures_total"]
+        self._gauge_names: List[str] = ["webank_agent_in_flight"]
+        self._registered: Dict[str, _Metric] = {}
+        self._instruments: Optional[Dict[str, Any]] = None
+
+    def counter(self, name: str, otel_name: str, description: str, unit: str = "") -> CounterMetric:
+        return self._register(CounterMetric(self, name, otel_name, description, unit), self._counter_names)
+
+    def histogram(
+        self, name: str, otel_name: str, description: str, buckets: Tuple[float, ...], unit: str = "s"
+    ) -> HistogramMetric:
+        with self._lock:
+            self._histogram_buckets.setdefault(name, tuple(buckets))
+        return self._register(HistogramMetric(self, name, otel_name, description, unit), [])
+
+    def gauge(self, name: str, otel_name: str, description: str, unit: str = "") -> GaugeMetric:
+        return self._register(GaugeMetric(self, name, otel_name, description, unit), self._gauge_names)
+
+    def _register(self, metric: _MetricT, names: List[str]) -> _MetricT:
+        """Add ``metric`` to the registry; a name registered before keeps its first handle."""
+        with self._lock:
+            existing = self._registered.get(metric.name)
+            if existing is not None:
+                return existing  # type: ignore[return-value]
+            self._registered[metric.name] = metric
+            if metric.name not in names:
+                names.append(metric.name)
+        return metric
+
+    def _otel(self) -> Optional[Dict[str, Any]]:
+        if otel_metrics is None:
+            return None
+        if self._instruments is None:
+            configure_metrics()
+            meter = otel_metrics.get_meter(_TRACE_NAMESPACE)
+            self._instruments = {
+                "duration": meter.create_histogram(
+                    "webank.stage.duration", unit="s", description="Pipeline stage latency"
+                ),
+                "tokens": meter.create_counter(
+                    "webank.agent.tokens", unit="{token}", description="Model tokens consumed"
+                ),
+                "parse_failures": meter.create_counter(
+                    "webank.agent.json_parse_failures", description="Unparseable agent outputs"
+                ),
+                "in_flight": meter.create_up_down_counter(
+                    "webank.agent.in_flight", description="Agent calls currently running"
+                ),
+            }
+        return self._instruments
+
+    def _observe(self, name: str, attributes: Mapping[str, Any], seconds: float) -> None:
+        key = _labels(attributes)
+        bounds = self._histogram_buckets[name]
+        with self._lock:
+            buckets = self._histograms[name].setdefault(key, [0.0] * (len(bounds) + 1))
+            buckets[bisect.bisect_left(bounds, seconds)] += 1
+            self._histogram_sums[name][key] += seconds
+
+    def observe_stage(self, stage: str, agent: str, model: str, seconds: float) -> None:
+        attributes = {"agent": agent, "model": model, "stage": stage}
+        self._observe("webank_stage_duration_seconds", attributes, seconds)
+        instruments = self._otel()
+        if instruments is not None:
+            instruments["duration"].record(seconds, attributes)
+
+    def add_tokens(self, agent: str, model: str, prompt: int, completion: int) -> None:
+        for kind, count in (("prompt", prompt), ("completion", completion)):
+            if count <= 0:
+                continue
+            attributes = {"agent": agent, "model": model, "kind": kind}
+            self._increment("webank_agent_tokens_total", attributes, count)
+            instruments = self._otel()
+            if instruments is not None:
+                instruments["tokens"].add(count, attributes)
+
+    def record_usage(self, agent: str, model: str, output: Any) -> None:
+        """Count the tokens reported on an agent run output, if any."""
+
+        self.add_tokens(agent, model, *usage_tokens(output))
+
+    def count_parse_failure(self, stage: str, agent: str, model: str) -> None:
+        attributes = {"agent": agent, "model": model, "stage": stage}
+        self._increment("webank_json_parse_failures_total", attributes, 1)
+        instruments = self._otel()
+        if instruments is not None:
+            instruments["parse_failures"].add(1, attributes)
+
+    @contextmanager
+    def in_flight(self, agent: str, model: str) -> Iterator[None]:
+        attributes = {"agent": agent, "model": model}
+        instruments = self._otel()
+        self._adjust("webank_agent_in_flight", attributes, 1)
+        if instruments is not None:
+            instruments["in_flight"].add(1, attributes)
+        try:
+            yield
+        finally:
+            self._adjust("webank_agent_in_flight", attributes, -1)
+            if instruments is not None:
+                instruments["in_flight"].add(-1, attributes)
+
+    def _increment(self, name: str, attributes: Mapping[str, Any], amount: float) -> None:
+        with self._lock:
+            self._counters[name][_labels(attributes)] += amount
+
+    def _adjust(self, name: str, attributes: Mapping[str, Any], delta: int) -> None:
+        with self._lock:
+            self._gauges[name][_labels(attributes)] += delta
+
+    def render(self) -> str:
+        """Prometheus text exposition of the local registry."""
+
+        with self._lock:
+            histograms = {
+                name: {key: list(value) for key, value in series.items()}
+                for name, series in self._histograms.items()
+            }
+            sums = {name: dict(series) for name, series in self._histogram_sums.items()}
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            gauges = {name: dict(values) for name, values in self._gauges.items()}
+            buckets_by_name = dict(self._histogram_buckets)
+            counter_names = list(self._counter_names)
+            gauge_names = list(self._gauge_names)
+
+        lines: List[str] = []
+        for name, bounds in buckets_by_name.items():
+            lines.append(f"# TYPE {name} histogram")
+            for key, buckets in sorted(histograms.get(name, {}).items()):
+                cumulative = 0.0
+                for bound, count in zip(bounds + (float("inf"),), buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = _render_labels(key, 'le="%s"' % le)
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative:g}")
+                lines.append(f"{name}_sum{_render_labels(key)} {sums[name][key]:.6f}")
+                lines.append(f"{name}_count{_render_labels(key)} {cumulative:g}")
+        for name in counter_names:
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(f"{name}{_render_labels(key)} {value:g}")
+        for name in gauge_names:
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in sorted(gauges.get(name, {}).items()):
+                lines.append(f"{name}{_render_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = AgentMetrics()
+
+
+def render_metrics() -> str:
+    return METRICS.render()
+
+
+def dump_metrics(path: Path) -> None:
+    """Write the current metrics snapshot as Prometheus text."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(render_metrics(), encoding="utf-8")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - quiet access log
+        LOGGER.debug("metrics endpoint: " + format, *args)
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expose ``/metrics`` for pull-based scraping from a daemon thread."""
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="webank-metrics", daemon=True)
+    thread.start()
+    return server
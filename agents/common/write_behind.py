@@ -0,0 +1,225 @@
+"""Bounded write-behind queue that flushes rows to storage in batches."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from agents.common.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+_ROWS = METRICS.counter(
+    "webank_write_behind_total", "webank.write_behind.rows", "Write-behind rows queued/written/failed/dropped"
+)
+
+Item = Tuple[str, Any]
+# Receives one batch of ``(key, row)`` in submission order; must raise on failure.
+WriteFn = Callable[[List[Item]], None]
+
+BLOCK = "block"
+DROP = "drop"
+
+# DB-API exceptions caused by the rows themselves; anything else (OperationalError,
+# InterfaceError, connection resets) is treated as transient.
+_ROW_ERROR_NAMES = frozenset({"IntegrityError", "DataError", "ProgrammingError"})
+
+
+def is_row_error(exc: BaseException) -> bool:
+    """True for DB-API errors that retrying the same rows cannot fix (pymysql and sqlite3 alike)."""
+    return any(cls.__name__ in _ROW_ERROR_NAMES for cls in type(exc).__mro__)
+
+
+class WriteBehindQueue:
+    """Queue rows per key and hand them to ``write`` from one background thread.
+
+    A batch is written once ``batch_size`` rows are queued or ``flush_interval``
+    seconds after its first row arrived. A single writer thread consumes the
+    queue in FIFO order, so rows of the same key are written in submission
+    order. A batch failing with a transient error (lost connection, database
+    down) is retried whole with capped exponential backoff until it goes
+    through. A batch failing ``max_attempts`` times with a row error (see
+    ``row_error``, by default :func:`is_row_error`) is split in halves that
+    are retried the same way, so a row the storage keeps rejecting ends up
+    alone and is logged and dropped (counted as ``dead_lettered``) instead of
+    blocking every row behind it. :meth:`close` stops waiting after its
+    timeout and reports how many rows were left unwritten.
+
+    Rows stay visible through :meth:`pending` until their batch has been
+    written. :attr:`epoch` works like a seqlock: it is bumped before every
+    write attempt and again once the written rows have left the pending view,
+    so it is odd while a write is in flight. A reader that sees an odd or
+    changed epoch between reading :meth:`pending` and reading storage may
+    have seen a row in both places and must retry.
+
+    When ``max_queue`` rows are waiting, ``overflow`` decides what happens:
+    ``"block"`` waits up to ``block_timeout`` seconds for room and then drops
+    the row, while ``"drop"`` drops it at once. Drops are logged and counted
+    in ``webank_write_behind_total``.
+    """
+
+    def __init__(
+        self,
+        write: WriteFn,
+        name: str = "write_behind",
+        max_queue: int = 10_000,
+        batch_size: int = 200,
+        flush_interval: float = 0.05,
+        overflow: str = BLOCK,
+        block_timeout: float = 1.0,
+        max_backoff: float = 5.0,
+        max_attempts: int = 5,
+        row_error: Callable[[BaseException], bool] = is_row_error,
+    ) -> None:
+        if overflow not in (BLOCK, DROP):
+            raise ValueError(f"overflow must be {BLOCK!r} or {DROP!r}, got {overflow!r}")
+        self.write = write
+        self.name = name
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_backoff = max_backoff
+        self.max_attempts = max(1, max_attempts)
+        self.row_error = row_error
+        self.epoch = 0
+        self._queue: Deque[Item] = deque()
+        self._pending: Dict[str, Deque[Any]] = defaultdict(deque)
+        self._in_flight = 0
+        self._closing = False
+        self._flushing = False
+        self._backoff = 0.0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"webank-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, row: Any) -> bool:
+        """Queue ``row``; returns False when the queue is closing or the overflow policy dropped it."""
+        with self._cond:
+            if self._closing:
+                return False
+            if len(self._queue) >= self.max_queue and self.overflow == BLOCK:
+                self._cond.wait_for(
+                    lambda: len(self._queue) < self.max_queue or self._closing, self.block_timeout
+                )
+            if len(self._queue) >= self.max_queue or self._closing:
+                logger.warning("%s full (%s rows), dropping a row for %s", self.name, len(self._queue), key)
+                _ROWS.add(1, {"queue": self.name, "event": "dropped"})
+                return False
+            self._queue.append((key, row))
+            self._pending[key].append(row)
+            self._cond.notify_all()
+        _ROWS.add(1, {"queue": self.name, "event": "queued"})
+        return True
+
+    def pending(self, key: str) -> Tuple[int, List[Any]]:
+        """``(epoch, rows)`` for ``key`` that are queued or being written, oldest first."""
+        with self._cond:
+            return self.epoch, list(self._pending.get(key, ()))
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued so far; returns False if ``timeout`` expired first."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Stop accepting rows and drain the queue; returns False if rows were left behind."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        left = self.depth()
+        if left:
+            logger.error("%s closed with %s unwritten rows", self.name, left)
+        return left == 0
+
+    def _next_batch(self) -> List[Item]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closing)
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not (self._closing or self._flushing):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._in_flight = len(batch)
+            # Room was freed for blocked submitters.
+            self._cond.notify_all()
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # closing and drained
+            self._write_isolating(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._flushing = self._flushing and bool(self._queue)
+                self._cond.notify_all()
+
+    def _write_isolating(self, batch: List[Item]) -> None:
+        attempts = 0
+        while True:
+            self._begin_write()
+            try:
+                self.write(batch)
+            except Exception as exc:
+                self._end_write([])
+                _ROWS.add(len(batch), {"queue": self.name, "event": "failed"})
+                if self.row_error(exc):
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        break
+                self._backoff = min(self.max_backoff, self._backoff * 2 or 0.05)
+                logger.warning(
+                    "%s failed to write %s rows, retrying in %.2fs: %s",
+                    self.name, len(batch), self._backoff, exc,
+                )
+                time.sleep(self._backoff)
+                continue
+            self._backoff = 0.0
+            self._end_write(batch)
+            _ROWS.add(len(batch), {"queue": self.name, "event": "written"})
+            return
+
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            self._write_isolating(batch[:middle])
+            self._write_isolating(batch[middle:])
+            return
+        key, row = batch[0]
+        logger.error("%s dropping a row for %s after %s failed attempts: %r", self.name, key, self.max_attempts, row)
+        _ROWS.add(1, {"queue": self.name, "event": "dead_lettered"})
+        with self._cond:
+            self._forget(batch)
+            self._cond.notify_all()
+
+    def _begin_write(self) -> None:
+        # Seqlock: an odd epoch tells readers that rows may be committed but still pending.
+        with self._cond:
+            self.epoch += 1
+
+    def _end_write(self, written: List[Item]) -> None:
+        with self._cond:
+            self._forget(written)
+            self.epoch += 1
+            self._cond.notify_all()
+
+    def _forget(self, items: List[Item]) -> None:
+        for key, _ in items:
+            rows = self._pending[key]
+            rows.popleft()
+            if not rows:
+                del self._pending[key]
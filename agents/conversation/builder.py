@@ -70,8 +70,12 @@ class FallbackConversationAgent:
 
 
 def build_conversation_agent(model: Model | None = None) -> Agent:
-    """Instantiate the conversation agent with default model + instructions."""
-    if _has_dashscope_key():
+    """Instantiate the conversation agent with default model + instructions.
+
+    An explicit ``model`` (e.g. pointed at a local stub server) is always used;
+    otherwise the offline fallback kicks in when no DashScope key is set.
+    """
+    if model is not None or _has_dashscope_key():
         return Agent(
             name="ConversationAgent",
             model=model or _CONVERSATION_MODEL_FACTORY(),
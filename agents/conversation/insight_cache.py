@@ -0,0 +1,154 @@
+"""Read-through cache for per-user insights, invalidated by insight writes."""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from agents.common.result_cache import LRUTier, SQLiteTier
+from agents.common.telemetry import METRICS
+from agents.db import database_key
+
+logger = logging.getLogger(__name__)
+
+_REQUESTS = METRICS.counter(
+    "webank_insight_cache_requests_total", "webank.insight_cache.requests", "User insight cache lookups by outcome"
+)
+
+
+@dataclass
+class InsightCache:
+    """In-process LRU of ``fetch_user_insights`` results, with an optional shared SQLite tier.
+
+    Every entry is stored with the user's version token at lookup time and
+    only served while that token is current. :meth:`invalidate` replaces the
+    token with a fresh random one, so a read that raced a write can never
+    re-cache the old rows. With a ``shared`` tier the tokens live in a
+    ``<table>_versions`` table of the shared file that never expires or
+    evicts, so an invalidation in one worker process is seen by every worker
+    on the host; without one they are process-local. Lookups only read the
+    shared file; it is written by :meth:`store` and :meth:`invalidate`.
+    """
+
+    memory: LRUTier = field(default_factory=lambda: LRUTier(4096, 300.0))
+    shared: Optional[SQLiteTier] = None
+    namespace: str = ""
+    hits: int = 0
+    misses: int = 0
+    _versions: LRUTier = field(default_factory=lambda: LRUTier(65536), repr=False)
+    _shared_versions: Optional[SQLiteTier] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.shared is not None and self._shared_versions is None:
+            # One row per user; a lost token could let a pre-invalidation entry match again.
+            self._shared_versions = SQLiteTier(
+                self.shared.path,
+                ttl_seconds=None,
+                max_entries=sys.maxsize,
+                table=f"{self.shared.table}_versions",
+                track_access=False,
+            )
+
+    def lookup(self, user_id: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """Return ``(insights or None, version)``; pass the version to :meth:`store` after a miss."""
+        version = self._version(user_id)
+        entry = self.memory.get(self._key("entry", user_id))
+        result = "hit_memory"
+        if entry is None or entry[0] != version:
+            entry, result = self._shared_call(self.shared, "get", self._key("entry", user_id)), "hit_shared"
+            if entry is not None and entry[0] == version:
+                self.memory.put(self._key("entry", user_id), (entry[0], entry[1]))
+        if entry is None or entry[0] != version:
+            self._count("miss")
+            return None, version
+        self._count(result)
+        # Callers may mutate the insights while building prompts.
+        return copy.deepcopy(entry[1]), version
+
+    def store(self, user_id: str, insights: Dict[str, Any], version: str) -> None:
+        # A JSON round trip doubles as a deep copy and keeps both tiers identical.
+        value = json.loads(json.dumps(insights, ensure_ascii=False, default=str))
+        self.memory.put(self._key("entry", user_id), (version, value))
+        self._shared_call(self.shared, "put", self._key("entry", user_id), [version, value])
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop the user's entries; call after the write has committed."""
+        key, version = self._key("version", user_id), uuid.uuid4().hex
+        self._versions.put(key, version)
+        self._shared_call(self._shared_versions, "put", key, version)
+        self.memory.pop(self._key("entry", user_id))
+        self._shared_call(self.shared, "pop", self._key("entry", user_id))
+
+    def _version(self, user_id: str) -> str:
+        key = self._key("version", user_id)
+        if self._shared_versions is not None:
+            return self._shared_call(self._shared_versions, "get", key) or ""
+        return self._versions.get(key) or ""
+
+    def _key(self, kind: str, user_id: str) -> str:
+        return f"{self.namespace}|{kind}|{user_id}"
+
+    def _shared_call(self, tier: Optional[SQLiteTier], method: str, *args: Any) -> Any:
+        if tier is None:
+            return None
+        try:
+            return getattr(tier, method)(*args)
+        except sqlite3.Error as exc:  # pragma: no cover - a busy shared file degrades to a miss
+            logger.warning("Shared insight cache %s failed: %s", method, exc)
+            return None
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            if result == "miss":
+                self.misses += 1
+            else:
+                self.hits += 1
+        _REQUESTS.add(1, {"result": result})
+
+
+_CACHES: Dict[Tuple[Any, ...], InsightCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_insight_cache() -> Optional[InsightCache]:
+    """Cache for the configured database, or None when ``WEBANK_INSIGHT_CACHE_TTL=0``.
+
+    ``WEBANK_INSIGHT_CACHE_TTL`` (seconds, default 300) caps how stale an
+    entry may get when the write happened in another process or host that
+    does not share ``WEBANK_INSIGHT_CACHE_PATH``.
+    """
+    ttl = float(os.getenv("WEBANK_INSIGHT_CACHE_TTL", "300"))
+    if ttl <= 0:
+        return None
+    key = database_key()
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            size = int(os.getenv("WEBANK_INSIGHT_CACHE_SIZE", "4096"))
+            path = os.getenv("WEBANK_INSIGHT_CACHE_PATH")
+            cache = InsightCache(
+                memory=LRUTier(size, ttl),
+                shared=(
+                    SQLiteTier(path, ttl, max_entries=size * 16, table="insight_cache", track_access=False)
+                    if path
+                    else None
+                ),
+                namespace=":".join(str(part) for part in key),
+            )
+            _CACHES[key] = cache
+        return cache
+
+
+def invalidate_user_insights(user_id: str) -> None:
+    cache = get_insight_cache()
+    if cache is not None:
+        cache.invalidate(user_id)
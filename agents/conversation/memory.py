@@ -2,14 +2,17 @@
 
 from __future__ import annotations
 
+import atexit
 import json
 import logging
 import os
+import threading
 import uuid
 from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from agents.common.write_behind import WriteBehindQueue
 from agents.db import db_cursor
 
 logger = logging.getLogger(__name__)
@@ -17,6 +20,16 @@ logger = logging.getLogger(__name__)
 _USE_MEMORY = os.getenv("AI_MEMORY_BACKEND", "").lower() == "memory"
 _MEM_SESSIONS: Dict[str, Dict] = {}
 _MEM_MESSAGES: Dict[str, List[Dict]] = defaultdict(list)
+_MESSAGE_WRITER: Optional[WriteBehindQueue] = None
+_MESSAGE_WRITER_LOCK = threading.Lock()
+# A flush can land between reading the queue and reading the table; retry the read this often.
+_PENDING_READ_ATTEMPTS = 5
+
+_INSERT_MESSAGE_SQL = """
+    INSERT INTO ai_session_messages
+    (session_id, sender, message, actions, insight_refs, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
 
 
 def _enable_memory_mode(reason: Exception) -> None:
@@ -84,22 +97,18 @@ def fetch_messages(session_id: str, limit: int = 10) -> List[Dict]:
         rows = _MEM_MESSAGES.get(session_id, [])[-limit:]
         return list(rows)
 
-    try:
-        with db_cursor() as (_, cursor):
-            cursor.execute(
-                """
-                SELECT sender, message, actions, insight_refs, created_at
-                FROM ai_session_messages
-                WHERE session_id=%s
-                ORDER BY created_at DESC
-                LIMIT %s
-                """,
-                (session_id, limit),
-            )
-            rows = cursor.fetchall() or []
-    except Exception as exc:  # pragma: no cover
-        _enable_memory_mode(exc)
-        return fetch_messages(session_id, limit)
+    writer = get_message_writer()
+    stable = writer is None
+    for _ in range(_PENDING_READ_ATTEMPTS):
+        epoch, pending = writer.pending(session_id) if writer is not None else (0, [])
+        try:
+            rows = _select_messages(session_id, limit)
+        except Exception as exc:  # pragma: no cover
+            _enable_memory_mode(exc)
+            return fetch_messages(session_id, limit)
+        if writer is None or (epoch % 2 == 0 and writer.epoch == epoch):
+            stable = True
+            break
 
     formatted: List[Dict] = []
     for row in reversed(rows):
@@ -112,7 +121,39 @@ def fetch_messages(session_id: str, limit: int = 10) -> List[Dict]:
                 "created_at": row.get("created_at"),
             }
         )
-    return formatted
+    if not stable:
+        # Still racing the writer after every retry: drop queued rows the table already returned.
+        stored = {_message_identity(item) for item in formatted}
+        pending = [item for item in pending if _message_identity(item) not in stored]
+    if not pending:
+        return formatted
+    # Queued messages are usually the newest, but an overflow may have written a later one inline.
+    merged = sorted(formatted + pending, key=lambda item: _timestamp_key(item.get("created_at")))
+    return merged[-limit:]
+
+
+def _timestamp_key(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value or "")
+
+
+def _message_identity(item: Dict[str, Any]) -> Tuple[Any, Any, str]:
+    # Second precision: MySQL DATETIME columns drop the microseconds the queued row still has.
+    return item.get("sender"), item.get("message"), _timestamp_key(item.get("created_at"))[:19].replace(" ", "T")
+
+
+def _select_messages(session_id: str, limit: int) -> List[Dict]:
+    with db_cursor() as (_, cursor):
+        cursor.execute(
+            """
+            SELECT sender, message, actions, insight_refs, created_at
+            FROM ai_session_messages
+            WHERE session_id=%s
+            ORDER BY created_at DESC
+            LIMIT %s
+            """,
+            (session_id, limit),
+        )
+        return cursor.fetchall() or []
 
 
 def append_message(
@@ -135,23 +176,67 @@ def append_message(
         _MEM_MESSAGES[session_id].append(payload)
         return
 
+    writer = get_message_writer()
+    if writer is not None and writer.submit(session_id, payload):
+        return
+    # No write-behind, or its queue overflowed or is closing: write inline so the message is never lost.
     try:
         with db_cursor() as (_, cursor):
-            cursor.execute(
-                """
-                INSERT INTO ai_session_messages
-                (session_id, sender, message, actions, insight_refs, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    session_id,
-                    sender,
-                    message,
-                    json.dumps(actions or [], ensure_ascii=False),
-                    json.dumps(insight_refs or [], ensure_ascii=False),
-                    datetime.utcnow(),
-                ),
-            )
+            cursor.execute(_INSERT_MESSAGE_SQL, _message_params(session_id, payload))
     except Exception as exc:  # pragma: no cover
         _enable_memory_mode(exc)
         append_message(session_id, sender, message, actions, insight_refs)
+
+
+def _message_params(session_id: str, payload: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        session_id,
+        payload["sender"],
+        payload["message"],
+        json.dumps(payload["actions"], ensure_ascii=False),
+        json.dumps(payload["insight_refs"], ensure_ascii=False),
+        datetime.fromisoformat(payload["created_at"]),
+    )
+
+
+def _insert_messages(batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+    with db_cursor() as (_, cursor):
+        cursor.executemany(
+            _INSERT_MESSAGE_SQL,
+            [_message_params(session_id, payload) for session_id, payload in batch],
+        )
+
+
+def get_message_writer() -> Optional[WriteBehindQueue]:
+    """Write-behind queue for ``ai_session_messages``, or None unless ``WEBANK_MESSAGE_WRITE_BEHIND=true``.
+
+    Messages are inserted in batches by a background thread; see
+    :class:`WriteBehindQueue` for the size/time triggers. When the queue
+    overflows, :func:`append_message` falls back to a synchronous insert.
+    """
+    global _MESSAGE_WRITER
+    if os.getenv("WEBANK_MESSAGE_WRITE_BEHIND", "false").lower() != "true":
+        return None
+    with _MESSAGE_WRITER_LOCK:
+        if _MESSAGE_WRITER is None:
+            _MESSAGE_WRITER = WriteBehindQueue(
+                _insert_messages,
+                name="session_messages",
+                max_queue=int(os.getenv("WEBANK_MESSAGE_QUEUE_MAX", "10000")),
+                batch_size=int(os.getenv("WEBANK_MESSAGE_BATCH_SIZE", "200")),
+                flush_interval=float(os.getenv("WEBANK_MESSAGE_FLUSH_MS", "50")) / 1000,
+                overflow=os.getenv("WEBANK_MESSAGE_OVERFLOW", "block"),
+                block_timeout=float(os.getenv("WEBANK_MESSAGE_BLOCK_TIMEOUT", "1")),
+            )
+        return _MESSAGE_WRITER
+
+
+def close_message_writer(timeout: Optional[float] = 10.0) -> bool:
+    """Drain queued messages to the database; registered to run at interpreter exit."""
+    global _MESSAGE_WRITER
+    with _MESSAGE_WRITER_LOCK:
+        writer, _MESSAGE_WRITER = _MESSAGE_WRITER, None
+    return writer.close(timeout) if writer is not None else True
+
+
+atexit.register(close_message_writer)
@@ -3,10 +3,143 @@
 from __future__ import annotations
 
 import json
+import logging
 from datetime import datetime, date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from agents.db import db_cursor
+from agents.common.result_cache import fingerprint_stage_input
+from agents.conversation.insight_cache import invalidate_user_insights
+from agents.db import db_cursor, for_update_clause, insert_absent_statement, is_missing_table, upsert_statement
+
+logger = logging.getLogger(__name__)
+
+# stage -> (table, order field, selected columns); "latest" means newest by order field, then id.
+INSIGHT_SOURCES: Dict[str, Tuple[str, str, List[str]]] = {
+    "asset": (
+        "user_asset_snapshots",
+        "report_date",
+        ["risk_level", "asset_breakdown", "credit_capacity", "raw_payload"],
+    ),
+    "behavior": (
+        "user_behavior_insights",
+        "snapshot_at",
+        ["intent_labels", "operational_signals", "source_logs"],
+    ),
+    "socio_role": ("user_socio_roles", "update_time", ["role_tags", "life_stage", "raw_payload"]),
+    "summary": ("user_insight_summary", "created_at", ["summary_text", "recommendations"]),
+}
+
+# Per-user pointer to the latest snapshot row of each stage, keyed (user_id, stage).
+LATEST_TABLE = "user_insight_latest"
+LATEST_COLUMNS = ("user_id", "stage", "snapshot_id", "content_hash", "updated_at")
+_pointer_warning_logged = False
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Naive datetime from a DATETIME/DATE column or its ISO string form."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+
+def _is_newer(order_value: Any, row_id: int, current_order: Any, current_id: int) -> bool:
+    """Same ordering as the readers: order field DESC, then id DESC."""
+    new_at, current_at = parse_timestamp(order_value), parse_timestamp(current_order)
+    if new_at is not None and current_at is not None and new_at != current_at:
+        return new_at > current_at
+    return row_id > current_id
+
+
+def _persist_snapshot(
+    stage: str,
+    user_id: str,
+    payload: Dict[str, Any],
+    insert_sql: str,
+    params: Sequence[Any],
+    order_value: Any,
+) -> bool:
+    """Insert a snapshot row and keep ``user_insight_latest`` on the latest row.
+
+    Returns False without writing when the payload hashes the same as the
+    snapshot the pointer references. Databases without the pointer table
+    get the plain insert, like before it existed. After a write commits,
+    the user's cached insights are invalidated.
+    """
+    global _pointer_warning_logged
+    content_hash = fingerprint_stage_input(payload)
+    try:
+        written = _insert_with_pointer(stage, user_id, content_hash, insert_sql, params, order_value)
+    except Exception as exc:
+        if not is_missing_table(exc):
+            raise
+        if not _pointer_warning_logged:
+            _pointer_warning_logged = True
+            logger.warning("%s unavailable, persisting snapshots without it: %s", LATEST_TABLE, exc)
+        with db_cursor() as (_, cursor):
+            cursor.execute(insert_sql, params)
+        written = True
+    if written:
+        invalidate_user_insights(user_id)
+    return written
+
+
+def _insert_with_pointer(
+    stage: str,
+    user_id: str,
+    content_hash: str,
+    insert_sql: str,
+    params: Sequence[Any],
+    order_value: Any,
+) -> bool:
+    table, order_field, _ = INSIGHT_SOURCES[stage]
+    with db_cursor() as (_, cursor):
+        # Claim the pointer row, then read it locked: concurrent writers for the same
+        # (user_id, stage) queue here instead of each moving the pointer from a stale read.
+        # A claimed row points at id 0, which never joins, so it reads as "no pointer yet".
+        cursor.execute(
+            insert_absent_statement(LATEST_TABLE, LATEST_COLUMNS, ("user_id", "stage")),
+            (user_id, stage, 0, "", datetime.utcnow()),
+        )
+        cursor.execute(
+            f"""
+            SELECT p.content_hash, t.id AS snapshot_id, t.{order_field} AS order_value
+            FROM {LATEST_TABLE} p
+            LEFT JOIN {table} t ON t.id = p.snapshot_id
+            WHERE p.user_id=%s AND p.stage=%s
+            {for_update_clause()}
+            """,
+            (user_id, stage),
+        )
+        current = cursor.fetchone()
+        if current and current.get("snapshot_id") is not None and current.get("content_hash") == content_hash:
+            return False
+        cursor.execute(insert_sql, params)
+        row_id = cursor.lastrowid
+
+        if current is None or current.get("snapshot_id") is None:
+            # No (valid) pointer yet: backfill it from the table so older rows are ranked too.
+            cursor.execute(
+                f"SELECT id FROM {table} WHERE user_id=%s ORDER BY {order_field} DESC, id DESC LIMIT 1",
+                (user_id,),
+            )
+            target_id = cursor.fetchone()["id"]
+        elif _is_newer(order_value, row_id, current["order_value"], current["snapshot_id"]):
+            target_id = row_id
+        else:
+            return True  # a backdated snapshot; the pointer already references a later one
+
+        cursor.execute(
+            upsert_statement(LATEST_TABLE, LATEST_COLUMNS, ("user_id", "stage")),
+            (user_id, stage, target_id, content_hash if target_id == row_id else "", datetime.utcnow()),
+        )
+    return True
 
 
 def persist_asset_snapshot(user_id: str, payload: Optional[Dict[str, Any]]) -> None:
@@ -17,83 +150,129 @@ def persist_asset_snapshot(user_id: str, payload: Optional[Dict[str, Any]]) -> N
     breakdown = payload.get("asset_breakdown") or payload.get("assetBreakdown") or payload
     credit_capacity = payload.get("credit_capacity") or payload.get("creditCapacity")
 
-    with db_cursor() as (_, cursor):
-        cursor.execute(
-            """
-            INSERT INTO user_asset_snapshots
-            (user_id, report_date, risk_level, asset_breakdown, credit_capacity, raw_payload)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                report_date,
-                risk_level,
-                json.dumps(breakdown or {}, ensure_ascii=False),
-                json.dumps(credit_capacity or {}, ensure_ascii=False),
-                json.dumps(payload, ensure_ascii=False),
-            ),
-        )
+    _persist_snapshot(
+        "asset",
+        user_id,
+        payload,
+        """
+        INSERT INTO user_asset_snapshots
+        (user_id, report_date, risk_level, asset_breakdown, credit_capacity, raw_payload)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        (
+            user_id,
+            report_date,
+            risk_level,
+            json.dumps(breakdown or {}, ensure_ascii=False),
+            json.dumps(credit_capacity or {}, ensure_ascii=False),
+            json.dumps(payload, ensure_ascii=False),
+        ),
+        report_date,
+    )
 
 
 def persist_behavior_insight(user_id: str, payload: Optional[Dict[str, Any]]) -> None:
     if not payload:
         return
+    snapshot_at = payload.get("snapshot_at") or datetime.utcnow()
 
-    with db_cursor() as (_, cursor):
-        cursor.execute(
-            """
-            INSERT INTO user_behavior_insights
-            (user_id, snapshot_at, intent_labels, operational_signals, source_logs)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                payload.get("snapshot_at") or datetime.utcnow(),
-                json.dumps(payload.get("intent_labels") or payload.get("intents") or [], ensure_ascii=False),
-                json.dumps(
-                    payload.get("operational_signals") or payload.get("signals") or {}, ensure_ascii=False
-                ),
-                json.dumps(payload.get("source_logs") or payload, ensure_ascii=False),
+    _persist_snapshot(
+        "behavior",
+        user_id,
+        payload,
+        """
+        INSERT INTO user_behavior_insights
+        (user_id, snapshot_at, intent_labels, operational_signals, source_logs)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        (
+            user_id,
+            snapshot_at,
+            json.dumps(payload.get("intent_labels") or payload.get("intents") or [], ensure_ascii=False),
+            json.dumps(
+                payload.get("operational_signals") or payload.get("signals") or {}, ensure_ascii=False
             ),
-        )
+            json.dumps(payload.get("source_logs") or payload, ensure_ascii=False),
+        ),
+        snapshot_at,
+    )
 
 
 def persist_socio_role(user_id: str, payload: Optional[Dict[str, Any]]) -> None:
     if not payload:
         return
+    update_time = datetime.utcnow()
 
-    with db_cursor() as (_, cursor):
-        cursor.execute(
-            """
-            INSERT INTO user_socio_roles
-            (user_id, role_tags, life_stage, raw_payload, update_time)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                json.dumps(payload.get("role_tags") or payload.get("tags") or [], ensure_ascii=False),
-                payload.get("life_stage") or payload.get("lifeStage"),
-                json.dumps(payload, ensure_ascii=False),
-                datetime.utcnow(),
-            ),
-        )
+    _persist_snapshot(
+        "socio_role",
+        user_id,
+        payload,
+        """
+        INSERT INTO user_socio_roles
+        (user_id, role_tags, life_stage, raw_payload, update_time)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        (
+            user_id,
+            json.dumps(payload.get("role_tags") or payload.get("tags") or [], ensure_ascii=False),
+            payload.get("life_stage") or payload.get("lifeStage"),
+            json.dumps(payload, ensure_ascii=False),
+            update_time,
+        ),
+        update_time,
+    )
 
 
 def persist_summary(user_id: str, payload: Optional[Dict[str, Any]]) -> None:
     if not payload:
         return
+    created_at = datetime.utcnow()
+
+    _persist_snapshot(
+        "summary",
+        user_id,
+        payload,
+        """
+        INSERT INTO user_insight_summary
+        (user_id, summary_text, recommendations, created_at)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (
+            user_id,
+            payload.get("summary") or payload.get("summary_text") or "",
+            json.dumps(payload.get("recommendations") or payload, ensure_ascii=False),
+            created_at,
+        ),
+        created_at,
+    )
+
+
+def persist_stage_states(
+    user_id: str,
+    fingerprints: Dict[str, str],
+    results: Dict[str, Any],
+) -> None:
+    """Upsert the per-stage input fingerprint and result used for incremental refresh."""
+    rows = [
+        (
+            user_id,
+            stage,
+            fingerprint,
+            json.dumps(results.get(stage) or {}, ensure_ascii=False),
+            datetime.utcnow(),
+        )
+        for stage, fingerprint in fingerprints.items()
+        if results.get(stage)
+    ]
+    if not rows:
+        return
 
     with db_cursor() as (_, cursor):
-        cursor.execute(
-            """
-            INSERT INTO user_insight_summary
-            (user_id, summary_text, recommendations, created_at)
-            VALUES (%s, %s, %s, %s)
-            """,
-            (
-                user_id,
-                payload.get("summary") or payload.get("summary_text") or "",
-                json.dumps(payload.get("recommendations") or payload, ensure_ascii=False),
-                datetime.utcnow(),
+        cursor.executemany(
+            upsert_statement(
+                "user_insight_stage_states",
+                ("user_id", "stage", "input_fingerprint", "result", "updated_at"),
+                ("user_id", "stage"),
             ),
+            rows,
         )
@@ -0,0 +1,135 @@
+"""Snapshot retention: thin old insight rows and rebuild the latest-pointer table."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from agents.conversation.persistence import INSIGHT_SOURCES, LATEST_COLUMNS, LATEST_TABLE, parse_timestamp
+from agents.db import db_cursor, upsert_clause
+
+# Upper bound on ids per DELETE ... IN (...) so each transaction stays short.
+_DELETE_CHUNK = 500
+
+
+@dataclass
+class CompactionResult:
+    stage: str
+    table: str
+    scanned: int = 0
+    deleted: int = 0
+
+    @property
+    def kept(self) -> int:
+        return self.scanned - self.deleted
+
+
+def _bucket(created_at: datetime, now: datetime, daily_days: int) -> str:
+    """Daily bucket inside the ``daily_days`` window, monthly bucket before it."""
+    if now - created_at < timedelta(days=daily_days):
+        return created_at.strftime("%Y-%m-%d")
+    return created_at.strftime("%Y-%m")
+
+
+def plan_compaction(
+    rows: List[Dict[str, Any]],
+    now: datetime,
+    daily_days: int,
+    protected: Set[int],
+) -> List[int]:
+    """Ids to delete so each user keeps its newest row per day/month bucket.
+
+    ``rows`` carry ``id``, ``user_id`` and ``created_at``. Rows whose
+    timestamp cannot be parsed and ``protected`` ids are always kept.
+    """
+    newest: Dict[Tuple[str, str], Tuple[datetime, int]] = {}
+    candidates: List[Tuple[int, Tuple[str, str]]] = []
+    for row in rows:
+        created_at = parse_timestamp(row.get("created_at"))
+        if created_at is None:
+            continue
+        key = (row["user_id"], _bucket(created_at, now, daily_days))
+        rank = (created_at, row["id"])
+        if key not in newest or rank > newest[key]:
+            newest[key] = rank
+        candidates.append((row["id"], key))
+    return [
+        row_id
+        for row_id, key in candidates
+        if row_id != newest[key][1] and row_id not in protected
+    ]
+
+
+def compact_snapshots(
+    now: Optional[datetime] = None,
+    daily_days: int = 30,
+    dry_run: bool = False,
+) -> List[CompactionResult]:
+    """Keep one snapshot per user per day for ``daily_days``, then one per month.
+
+    Rows referenced by ``user_insight_latest`` are never deleted. With
+    ``dry_run`` only the counts are computed.
+    """
+    now = now or datetime.utcnow()
+    results: List[CompactionResult] = []
+    for stage, (table, _, _) in INSIGHT_SOURCES.items():
+        with db_cursor() as (_, cursor):
+            cursor.execute(f"SELECT id, user_id, created_at FROM {table}")
+            rows = cursor.fetchall() or []
+            cursor.execute(f"SELECT snapshot_id FROM {LATEST_TABLE} WHERE stage=%s", (stage,))
+            protected = {row["snapshot_id"] for row in cursor.fetchall() or []}
+
+        doomed = plan_compaction(rows, now, daily_days, protected)
+        result = CompactionResult(stage=stage, table=table, scanned=len(rows), deleted=len(doomed))
+        results.append(result)
+        if dry_run:
+            continue
+        for start in range(0, len(doomed), _DELETE_CHUNK):
+            chunk = doomed[start : start + _DELETE_CHUNK]
+            with db_cursor() as (_, cursor):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk,
+                )
+        logging.getLogger(__name__).info("Compacted %s: deleted %s of %s rows", table, len(doomed), len(rows))
+    return results
+
+
+def rebuild_latest_pointers() -> Dict[str, int]:
+    """Repoint ``user_insight_latest`` at each user's newest row, per stage.
+
+    Backfills databases whose snapshots predate the pointer table. The
+    ``content_hash`` is left empty, so the next write of each stage always
+    inserts a fresh snapshot.
+    """
+    updated: Dict[str, int] = {}
+    conflict = upsert_clause(LATEST_COLUMNS, ("user_id", "stage"))
+    for stage, (table, order_field, _) in INSIGHT_SOURCES.items():
+        with db_cursor() as (_, cursor):
+            cursor.execute(
+                f"""
+                INSERT INTO {LATEST_TABLE} ({', '.join(LATEST_COLUMNS)})
+                SELECT t.user_id, %s, t.id, '', %s
+                FROM {table} t
+                WHERE t.id = (
+                    SELECT l.id FROM {table} l
+                    WHERE l.user_id = t.user_id
+                    ORDER BY l.{order_field} DESC, l.id DESC
+                    LIMIT 1
+                )
+                {conflict}
+                """,
+                (stage, datetime.utcnow()),
+            )
+            updated[stage] = cursor.rowcount
+    return updated
+
+
+def render_compaction(results: List[CompactionResult], dry_run: bool = False) -> str:
+    verb = "would delete" if dry_run else "deleted"
+    return "\n".join(
+        f"[compact] {result.table:<24} scanned={result.scanned} {verb}={result.deleted} kept={result.kept}"
+        for result in results
+    )
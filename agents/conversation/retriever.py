@@ -5,56 +5,228 @@ from __future__ import annotations
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from agents.db import db_cursor
 from agents.conversation import memory
+from agents.conversation.insight_cache import get_insight_cache
+from agents.conversation.persistence import INSIGHT_SOURCES as _INSIGHT_SOURCES, LATEST_TABLE
+
+
+# Upper bound on user ids per IN (...) list in one batched query.
+_INSIGHT_BATCH_SIZE = 500
+# Upper bound on UNION ALL branches per seek query (SQLite allows 500 compound SELECTs).
+_SEEK_BRANCHES = 200
+
+
+def _columns(fields: List[str]) -> List[str]:
+    return fields + ["created_at"] if "created_at" not in fields else fields
+
+
+def _source_latest(stage: str, user_id: str) -> Optional[Dict[str, Any]]:
+    table, order_field, fields = _INSIGHT_SOURCES[stage]
+    return _fetch_latest(user_id, table=table, order_field=order_field, fields=fields)
 
 
 def fetch_latest_asset(user_id: str) -> Optional[Dict[str, Any]]:
-    return _fetch_latest(
-        user_id,
-        table="user_asset_snapshots",
-        order_field="report_date",
-        fields=["risk_level", "asset_breakdown", "credit_capacity", "raw_payload"],
-    )
+    return _source_latest("asset", user_id)
 
 
 def fetch_latest_behavior(user_id: str) -> Optional[Dict[str, Any]]:
-    return _fetch_latest(
-        user_id,
-        table="user_behavior_insights",
-        order_field="snapshot_at",
-        fields=["intent_labels", "operational_signals", "source_logs"],
-    )
+    return _source_latest("behavior", user_id)
 
 
 def fetch_latest_socio_role(user_id: str) -> Optional[Dict[str, Any]]:
-    return _fetch_latest(
-        user_id,
-        table="user_socio_roles",
-        order_field="update_time",
-        fields=["role_tags", "life_stage", "raw_payload"],
-    )
+    return _source_latest("socio_role", user_id)
 
 
 def fetch_latest_summary(user_id: str) -> Optional[Dict[str, Any]]:
-    return _fetch_latest(
-        user_id,
-        table="user_insight_summary",
-        order_field="created_at",
-        fields=["summary_text", "recommendations"],
-    )
+    return _source_latest("summary", user_id)
 
 
 def fetch_user_insights(user_id: str) -> Dict[str, Any]:
-    """Aggregate all latest insight records for the given user."""
-    return {
-        "asset": fetch_latest_asset(user_id),
-        "behavior": fetch_latest_behavior(user_id),
-        "socio_role": fetch_latest_socio_role(user_id),
-        "summary": fetch_latest_summary(user_id),
+    """Aggregate all latest insight records for the given user in one query."""
+    return fetch_users_insights([user_id])[user_id]
+
+
+def fetch_users_insights(user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Latest asset/behavior/socio_role/summary record for each user.
+
+    All four tables are read with one ``UNION ALL`` round trip per chunk of
+    :data:`_INSIGHT_BATCH_SIZE` users, joined through the ``user_insight_latest``
+    pointer table so each branch is a primary-key lookup; only stages that come
+    back without a pointer cost a second, index-seek query. Users without a row
+    in some table get ``None`` for that stage, exactly like the per-table
+    ``fetch_latest_*``. Results are served from :func:`get_insight_cache` when
+    possible; only cache misses reach the database.
+    """
+    ordered = list(dict.fromkeys(user_ids))
+    insights: Dict[str, Dict[str, Any]] = {
+        user_id: {stage: None for stage in _INSIGHT_SOURCES} for user_id in ordered
     }
+    if memory._USE_MEMORY or not ordered:
+        return insights
+
+    cache = get_insight_cache()
+    versions: Dict[str, str] = {}
+    missing = ordered
+    if cache is not None:
+        missing = []
+        for user_id in ordered:
+            cached, versions[user_id] = cache.lookup(user_id)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                insights[user_id] = cached
+
+    for start in range(0, len(missing), _INSIGHT_BATCH_SIZE):
+        chunk = missing[start : start + _INSIGHT_BATCH_SIZE]
+        rows = _query_latest_insights(chunk)
+        if rows is None:
+            continue
+        for row in rows:
+            stage = row["stage"]
+            record = {column: row[f"c{index}"] for index, column in enumerate(_INSIGHT_SOURCES[stage][2])}
+            record["created_at"] = row["created_at"]
+            insights[row["user_id"]][stage] = _normalize_row(record)
+        if cache is not None:
+            for user_id in chunk:
+                cache.store(user_id, insights[user_id], versions[user_id])
+    return insights
+
+
+def _query_latest_insights(user_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """Latest rows through ``user_insight_latest``, then index seeks for stages without a pointer.
+
+    Databases that have not created ``user_insight_latest`` yet get the
+    correlated scan over the snapshot tables instead. Returns None when the
+    queries fail, so the caller does not cache the empty result.
+    """
+    rows = _run_insights_query(_pointer_insights_query(user_ids))
+    if rows is None:
+        return _run_insights_query(_scan_insights_query(user_ids))
+    found = {(row["user_id"], row["stage"]) for row in rows}
+    unpointed = [(user_id, stage) for user_id in user_ids for stage in _INSIGHT_SOURCES if (user_id, stage) not in found]
+    for start in range(0, len(unpointed), _SEEK_BRANCHES):
+        seeked = _run_insights_query(_seek_insights_query(unpointed[start : start + _SEEK_BRANCHES]))
+        if seeked is None:
+            return None
+        rows.extend(seeked)
+    return rows
+
+
+def _run_insights_query(statement: Tuple[str, List[Any]]) -> Optional[List[Dict[str, Any]]]:
+    query, params = statement
+    try:
+        with db_cursor() as (_, cursor):
+            cursor.execute(query, params)
+            return list(cursor.fetchall() or [])
+    except Exception as exc:  # pragma: no cover - keeps chat alive if tables are missing
+        logging.getLogger(__name__).warning("Fetch insights failed: %s", exc)
+        return None
+
+
+def _insight_columns(stage: str) -> str:
+    """``SELECT`` list of one branch: stage columns positionally as ``c0..cN``, padded with NULL.
+
+    ``created_at`` stays in its own column so it keeps its DATETIME type.
+    """
+    width = max(len(fields) for _, _, fields in _INSIGHT_SOURCES.values())
+    fields = _INSIGHT_SOURCES[stage][2]
+    selected = [f"t.{column} AS c{index}" for index, column in enumerate(fields)]
+    selected += [f"NULL AS c{index}" for index in range(len(fields), width)]
+    return f"SELECT '{stage}' AS stage, t.user_id AS user_id, t.created_at AS created_at, {', '.join(selected)}"
+
+
+def _pointer_insights_query(user_ids: List[str]) -> Tuple[str, List[Any]]:
+    """One ``UNION ALL`` over the insight tables, each branch a primary-key join from the pointer."""
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    branches = [
+        f"""
+        {_insight_columns(stage)}
+        FROM {LATEST_TABLE} p
+        JOIN {table} t ON t.id = p.snapshot_id
+        WHERE p.stage = '{stage}' AND p.user_id IN ({placeholders})
+        """
+        for stage, (table, _, _) in _INSIGHT_SOURCES.items()
+    ]
+    return "\nUNION ALL\n".join(branches), list(user_ids) * len(branches)
+
+
+def _seek_insights_query(pairs: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+    """Latest row per ``(user_id, stage)`` pair, each a single ``(user_id, <order>, id)`` index seek."""
+    branches: List[str] = []
+    for _, stage in pairs:
+        table, order_field, _ = _INSIGHT_SOURCES[stage]
+        branches.append(
+            f"""
+            {_insight_columns(stage)}
+            FROM {table} t
+            WHERE t.id = (
+              SELECT l.id FROM {table} l
+              WHERE l.user_id = %s
+              ORDER BY l.{order_field} DESC, l.id DESC
+              LIMIT 1
+            )
+            """
+        )
+    return "\nUNION ALL\n".join(branches), [user_id for user_id, _ in pairs]
+
+
+def _scan_insights_query(user_ids: List[str]) -> Tuple[str, List[Any]]:
+    """Pre-pointer fallback: the correlated ``id = (... LIMIT 1)`` keeps each user's latest row.
+
+    Uses the same ordering as :func:`_fetch_latest` and works on MySQL 5.7
+    as well as SQLite.
+    """
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    branches = [
+        f"""
+        {_insight_columns(stage)}
+        FROM {table} t
+        WHERE t.user_id IN ({placeholders})
+          AND t.id = (
+            SELECT l.id FROM {table} l
+            WHERE l.user_id = t.user_id
+            ORDER BY l.{order_field} DESC, l.id DESC
+            LIMIT 1
+          )
+        """
+        for stage, (table, order_field, _) in _INSIGHT_SOURCES.items()
+    ]
+    return "\nUNION ALL\n".join(branches), list(user_ids) * len(branches)
+
+
+def fetch_stage_states(user_id: str) -> Dict[str, Dict[str, Any]]:
+    """Return ``{stage: {"fingerprint", "result"}}`` from the last refresh."""
+    if memory._USE_MEMORY:
+        return {}
+
+    try:
+        with db_cursor() as (_, cursor):
+            cursor.execute(
+                """
+                SELECT stage, input_fingerprint, result
+                FROM user_insight_stage_states
+                WHERE user_id=%s
+                """,
+                (user_id,),
+            )
+            rows = cursor.fetchall() or []
+    except Exception as exc:  # pragma: no cover - incremental refresh is best effort
+        logging.getLogger(__name__).warning("Fetch stage states failed: %s", exc)
+        return {}
+
+    states: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        result = row.get("result")
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except json.JSONDecodeError:
+                continue
+        states[row["stage"]] = {"fingerprint": row.get("input_fingerprint"), "result": result}
+    return states
 
 
 def _fetch_latest(
@@ -63,7 +235,7 @@ def _fetch_latest(
     order_field: str,
     fields: list[str],
 ) -> Optional[Dict[str, Any]]:
-    columns = ", ".join(fields + ["created_at"] if "created_at" not in fields else fields)
+    columns = ", ".join(_columns(fields))
     query = f"""
         SELECT {columns}
         FROM {table}
@@ -85,7 +257,11 @@ def _fetch_latest(
 
     if not row:
         return None
+    return _normalize_row(row)
+
 
+def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode JSON text columns and ISO-format datetimes."""
     normalized = {}
     for key, value in row.items():
         if isinstance(value, str) and value:
@@ -2,12 +2,17 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from agents.common.telemetry import trace_agent_span
+from agno.models.base import Model
+
+from agents.common.profiling import profile_call
+from agents.common.runner import arun_agent
+from agents.common.telemetry import METRICS, trace_agent_span
 from agents.conversation.builder import (
     build_conversation_agent,
     format_conversation_prompt,
@@ -17,12 +22,21 @@ from agents.conversation.persistence import (
     persist_asset_snapshot,
     persist_behavior_insight,
     persist_socio_role,
+    persist_stage_states,
     persist_summary,
 )
-from agents.conversation.retriever import fetch_user_insights
+from agents.conversation.retriever import fetch_stage_states, fetch_user_insights
+from agents.db import db_session
+from agents.pipeline import WebankAgentPipeline, stage_fingerprints
 
 logger = logging.getLogger(__name__)
 
+_DEGRADED_REPLY = {
+    "response": "当前服务存在波动，我已记录您的诉求，请稍后再试。",
+    "actions": [],
+    "insight_refs": [],
+}
+
 
 def _coerce_response(output: Any) -> Dict[str, Any]:
     """Normalize model outputs into a unified dict."""
@@ -55,9 +69,10 @@ class ConversationService:
     """Primary interface for the multi-turn AI assistant."""
 
     history_limit: int = 10
+    model: Optional[Model] = None
 
     def __post_init__(self) -> None:
-        self.agent = build_conversation_agent()
+        self.agent = build_conversation_agent(self.model)
 
     # ------------------------------------------------------------------ #
     # Public APIs                                                        #
@@ -69,17 +84,36 @@ class ConversationService:
         session_id: Optional[str] = None,
         context: Optional[Dict[str, Any]] = None,
         channel: str = "app",
+        profile: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Generate a reply and persist the conversation messages.
+
+        ``profile`` forces CPU/allocation profiling of the whole turn on or off
+        (default: enabled when ``WEBANK_PROFILE_DIR`` is set).
+        """
+        with profile_call("conversation.reply", profile):
+            return self._generate_reply(user_id, message, session_id, context, channel)
+
+    def _generate_reply(
+        self,
+        user_id: str,
+        message: str,
+        session_id: Optional[str],
+        context: Optional[Dict[str, Any]],
+        channel: str,
     ) -> Dict[str, Any]:
-        """Generate a reply and persist the conversation messages."""
         if not user_id:
             raise ValueError("user_id is required")
         if not message:
             raise ValueError("message is required")
 
-        resolved_session = ensure_session(user_id, session_id, context, channel)
-        history = fetch_messages(resolved_session, self.history_limit)
-        append_message(resolved_session, "user", message)
-        insights = fetch_user_insights(user_id)
+        # One pooled connection for the reads and the user message; it goes back
+        # to the pool before the model call so slow replies don't hold it.
+        with db_session():
+            resolved_session = ensure_session(user_id, session_id, context, channel)
+            history = fetch_messages(resolved_session, self.history_limit)
+            append_message(resolved_session, "user", message)
+            insights = fetch_user_insights(user_id)
         prompt = format_conversation_prompt(message, insights, history, context)
 
         try:
@@ -90,15 +124,14 @@ class ConversationService:
                     "conversation.channel": channel,
                 },
             ):
-                raw_output = self.agent.run(prompt)
+                labels = self._metric_labels()
+                with METRICS.in_flight(*labels):
+                    raw_output = self.agent.run(prompt)
+                METRICS.record_usage(*labels, raw_output)
                 reply_payload = _coerce_response(raw_output)
         except Exception as exc:  # pragma: no cover - defensive guard
             logger.exception("Conversation agent failed for user %s: %s", user_id, exc)
-            reply_payload = {
-                "response": "当前服务存在波动，我已记录您的诉求，请稍后再试。",
-                "actions": [],
-                "insight_refs": [],
-            }
+            reply_payload = dict(_DEGRADED_REPLY)
 
         append_message(
             resolved_session,
@@ -116,13 +149,122 @@ class ConversationService:
             "usedInsights": insights,
         }
 
+    async def agenerate_reply(
+        self,
+        user_id: str,
+        message: str,
+        session_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        channel: str = "app",
+    ) -> Dict[str, Any]:
+        """Coroutine variant of :meth:`generate_reply`.
+
+        Blocking storage calls run in worker threads; independent reads (history
+        and insights) and the user-message write overlapping the model call are
+        awaited together via ``asyncio.gather``.
+        """
+        if not user_id:
+            raise ValueError("user_id is required")
+        if not message:
+            raise ValueError("message is required")
+
+        resolved_session = await asyncio.to_thread(
+            ensure_session, user_id, session_id, context, channel
+        )
+        history, insights = await asyncio.gather(
+            asyncio.to_thread(fetch_messages, resolved_session, self.history_limit),
+            asyncio.to_thread(fetch_user_insights, user_id),
+        )
+        prompt = format_conversation_prompt(message, insights, history, context)
+
+        _, reply_payload = await asyncio.gather(
+            asyncio.to_thread(append_message, resolved_session, "user", message),
+            self._arun_agent(user_id, prompt, channel),
+        )
+
+        await asyncio.to_thread(
+            append_message,
+            resolved_session,
+            "assistant",
+            reply_payload["response"],
+            reply_payload.get("actions"),
+            reply_payload.get("insight_refs"),
+        )
+
+        return {
+            "sessionId": resolved_session,
+            "response": reply_payload["response"],
+            "actions": reply_payload.get("actions", []),
+            "insight_refs": reply_payload.get("insight_refs", []),
+            "usedInsights": insights,
+        }
+
+    def _metric_labels(self) -> Tuple[str, str]:
+        model_id = getattr(getattr(self.agent, "model", None), "id", None)
+        return self.agent.name or "ConversationAgent", str(model_id or "")
+
     def fetch_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
         """Expose history for API consumers."""
         return fetch_messages(session_id, limit or self.history_limit)
 
-    def persist_pipeline_output(self, user_id: str, payload: Dict[str, Any]) -> None:
-        """Store outputs generated by the offline pipeline."""
-        persist_socio_role(user_id, payload.get("socio_role"))
-        persist_asset_snapshot(user_id, payload.get("asset"))
-        persist_behavior_insight(user_id, payload.get("behavior"))
-        persist_summary(user_id, payload.get("summary"))
+    async def _arun_agent(self, user_id: str, prompt: str, channel: str) -> Dict[str, Any]:
+        try:
+            with trace_agent_span(
+                "agent.conversation",
+                {
+                    "agent.name": self.agent.name or "ConversationAgent",
+                    "conversation.channel": channel,
+                },
+            ):
+                labels = self._metric_labels()
+                with METRICS.in_flight(*labels):
+                    raw_output = await arun_agent(self.agent, prompt)
+                METRICS.record_usage(*labels, raw_output)
+                return _coerce_response(raw_output)
+        except Exception as exc:  # pragma: no cover - defensive guard
+            logger.exception("Conversation agent failed for user %s: %s", user_id, exc)
+            return dict(_DEGRADED_REPLY)
+
+    def persist_pipeline_output(
+        self,
+        user_id: str,
+        payload: Dict[str, Any],
+        stages: Optional[Iterable[str]] = None,
+    ) -> None:
+        """Store outputs generated by the offline pipeline (optionally only ``stages``)."""
+        selected = set(stages) if stages is not None else None
+        writers = (
+            ("socio_role", persist_socio_role),
+            ("asset", persist_asset_snapshot),
+            ("behavior", persist_behavior_insight),
+            ("summary", persist_summary),
+        )
+        with db_session():
+            for stage, writer in writers:
+                if selected is None or stage in selected:
+                    writer(user_id, payload.get(stage))
+
+    def refresh_user_insights(
+        self,
+        user_id: str,
+        payload: Dict[str, Any],
+        pipeline: WebankAgentPipeline,
+    ) -> Dict[str, Any]:
+        """Run the pipeline incrementally against the user's last persisted refresh.
+
+        Stages whose input slice is unchanged reuse the stored result and are
+        not written again; only changed stages get a new snapshot row.
+        """
+        previous = fetch_stage_states(user_id)
+        result = pipeline.run(payload, previous=previous)
+        fingerprints = stage_fingerprints(payload, result)
+        changed = [
+            stage
+            for stage, fingerprint in fingerprints.items()
+            if (previous.get(stage) or {}).get("fingerprint") != fingerprint
+        ]
+        if changed:
+            with db_session():
+                self.persist_pipeline_output(user_id, result, stages=changed)
+                persist_stage_states(user_id, fingerprints, result)
+        return result
@@ -2,41 +2,517 @@
 
 from __future__ import annotations
 
+import contextvars
+import logging
 import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
-from typing import Generator, Tuple
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Deque, Dict, Generator, Iterable, List, Optional, Sequence, Tuple
 
 import pymysql
 from dotenv import load_dotenv
 from pymysql.cursors import DictCursor
 
+from agents.common.telemetry import METRICS, WAIT_BUCKETS, trace_agent_span
+
 load_dotenv(override=True)
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%s")
+
+_POOL_WAIT = METRICS.histogram(
+    "webank_db_pool_wait_seconds",
+    "webank.db.pool.wait",
+    "Time spent waiting for a pooled DB connection",
+    WAIT_BUCKETS,
+)
+_POOL_CONNECTIONS = METRICS.counter(
+    "webank_db_pool_connections_total", "webank.db.pool.connections", "DB connections opened/closed by the pool"
+)
+_POOL_IN_USE = METRICS.gauge("webank_db_pool_in_use", "webank.db.pool.in_use", "Pooled DB connections checked out")
+_POOL_IDLE = METRICS.gauge("webank_db_pool_idle", "webank.db.pool.idle", "Idle pooled DB connections")
+
+
+def _sqlite_params(params: Optional[Sequence[Any]]) -> Tuple[Any, ...]:
+    # sqlite3's implicit datetime adapters are deprecated; store ISO strings.
+    return tuple(
+        value.isoformat() if isinstance(value, (datetime, date)) else value
+        for value in (params or ())
+    )
+
+
+class _SQLiteCursor:
+    """DictCursor look-alike over sqlite3 so the MySQL-style queries run unchanged."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+    def __enter__(self) -> "_SQLiteCursor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._cursor.close()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> int:
+        self._cursor.execute(_PLACEHOLDER.sub("?", query), _sqlite_params(params))
+        return self._cursor.rowcount
+
+    def executemany(self, query: str, rows: Iterable[Sequence[Any]]) -> int:
+        self._cursor.executemany(_PLACEHOLDER.sub("?", query), [_sqlite_params(row) for row in rows])
+        return self._cursor.rowcount
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._cursor.fetchall()]
+
+
+class _SQLiteConnection:
+    def __init__(self, path: str) -> None:
+        # Pooled connections move between threads; the pool never shares one concurrently.
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+    def cursor(self) -> _SQLiteCursor:
+        return _SQLiteCursor(self._conn.cursor())
+
+    def ping(self, reconnect: bool = False) -> None:
+        self._conn.execute("SELECT 1")
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
 
 
-def _connect() -> pymysql.connections.Connection:
-    """Create a new MySQL connection using environment variables."""
+def sqlite_path() -> Optional[str]:
+    """Database file when ``WEBANK_DB_BACKEND=sqlite`` (local runs and load tests), else None."""
+    if os.getenv("WEBANK_DB_BACKEND", "mysql").lower() != "sqlite":
+        return None
+    return os.getenv("WEBANK_SQLITE_PATH", "webank.sqlite3")
+
+
+def _mysql_params() -> Dict[str, Any]:
+    return {
+        "host": os.getenv("DB_HOST", os.getenv("MYSQL_HOST", "localhost")),
+        "user": os.getenv("DB_USER", os.getenv("MYSQL_USER", "root")),
+        "password": os.getenv("DB_PASSWORD", os.getenv("MYSQL_PASSWORD", "")),
+        "database": os.getenv("DB_NAME", os.getenv("MYSQL_DATABASE", "Fin")),
+        "port": int(os.getenv("DB_PORT", os.getenv("MYSQL_PORT", "3306"))),
+    }
+
+
+def _connect() -> Any:
+    """Create a new MySQL connection (or SQLite, see :func:`sqlite_path`) using env vars."""
+    path = sqlite_path()
+    if path is not None:
+        return _SQLiteConnection(path)
     return pymysql.connect(
-        host=os.getenv("DB_HOST", os.getenv("MYSQL_HOST", "localhost")),
-        user=os.getenv("DB_USER", os.getenv("MYSQL_USER", "root")),
-        password=os.getenv("DB_PASSWORD", os.getenv("MYSQL_PASSWORD", "")),
-        database=os.getenv("DB_NAME", os.getenv("MYSQL_DATABASE", "Fin")),
-        port=int(os.getenv("DB_PORT", os.getenv("MYSQL_PORT", "3306"))),
+        **_mysql_params(),
         cursorclass=DictCursor,
         charset="utf8mb4",
         autocommit=False,
     )
 
 
-@contextmanager
-def db_cursor() -> Generator[Tuple[pymysql.connections.Connection, DictCursor], None, None]:
-    """Context manager that yields a connection and cursor and handles commit/rollback."""
-    conn = _connect()
+def upsert_clause(columns: Sequence[str], key_columns: Sequence[str]) -> str:
+    """Conflict clause that overwrites non-key ``columns``, in the active dialect."""
+    updates = [column for column in columns if column not in key_columns]
+    if sqlite_path() is not None:
+        assignments = ", ".join(f"{column}=excluded.{column}" for column in updates)
+        return f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {assignments}"
+    assignments = ", ".join(f"{column}=VALUES({column})" for column in updates)
+    return f"ON DUPLICATE KEY UPDATE {assignments}"
+
+
+def upsert_statement(table: str, columns: Sequence[str], key_columns: Sequence[str]) -> str:
+    """``INSERT ... VALUES`` that updates non-key ``columns`` on a key conflict."""
+    placeholders = ", ".join(["%s"] * len(columns))
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    return f"{insert} {upsert_clause(columns, key_columns)}"
+
+
+def insert_absent_statement(table: str, columns: Sequence[str], key_columns: Sequence[str]) -> str:
+    """``INSERT ... VALUES`` that leaves an existing row with the same key untouched.
+
+    Either way the key is write-locked until the transaction ends (SQLite
+    takes its database-wide write lock), so it can serialize writers of a row
+    that may not exist yet without InnoDB gap-lock deadlocks.
+    """
+    placeholders = ", ".join(["%s"] * len(columns))
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if sqlite_path() is not None:
+        return f"{insert} ON CONFLICT ({', '.join(key_columns)}) DO NOTHING"
+    return f"{insert} ON DUPLICATE KEY UPDATE {key_columns[0]}={key_columns[0]}"
+
+
+def for_update_clause() -> str:
+    """Row-locking suffix for a ``SELECT`` in the active dialect.
+
+    Empty on SQLite, which has no row locks; a transaction that has already
+    written holds the database write lock there.
+    """
+    return "" if sqlite_path() is not None else "FOR UPDATE"
+
+
+def is_missing_table(exc: BaseException) -> bool:
+    """True for the driver's "table does not exist" error (MySQL 1146, SQLite "no such table")."""
+    if isinstance(exc, sqlite3.OperationalError):
+        return str(exc).startswith("no such table")
+    return isinstance(exc, pymysql.err.ProgrammingError) and bool(exc.args) and exc.args[0] == 1146
+
+
+@dataclass
+class _PooledConnection:
+    conn: Any
+    created_at: float
+    last_used: float
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of DB connections.
+
+    At most ``max_size`` connections exist; checkout blocks up to ``timeout``
+    seconds for one to be returned. Idle connections are pinged before reuse
+    when unused for ``ping_after`` seconds, replaced once older than
+    ``max_age``, and closed after ``idle_timeout`` while more than
+    ``min_size`` are open. Wait time, open/close events and in-use/idle counts
+    go to :data:`METRICS` under ``pool=name``.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        name: str = "default",
+        min_size: int = 1,
+        max_size: int = 10,
+        max_age: float = 1800.0,
+        idle_timeout: float = 300.0,
+        ping_after: float = 5.0,
+        timeout: float = 10.0,
+    ) -> None:
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self._idle: Deque[_PooledConnection] = deque()
+        self._leased: Dict[int, _PooledConnection] = {}
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._warmed = False
+
+    @property
+    def size(self) -> int:
+        with self._cond:
+            return self._opened
+
+    def acquire(self) -> Any:
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        self._warm()
+        while True:
+            entry = self._checkout(deadline)
+            if entry is None:
+                entry = self._open()
+            elif not self._usable(entry):
+                continue
+            entry.last_used = time.monotonic()
+            with self._cond:
+                self._leased[id(entry.conn)] = entry
+            _POOL_WAIT.record(time.perf_counter() - started, {"pool": self.name})
+            _POOL_IN_USE.add(1, {"pool": self.name})
+            return entry.conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        with self._cond:
+            entry = self._leased.pop(id(conn), None)
+        if entry is None:
+            return
+        _POOL_IN_USE.add(-1, {"pool": self.name})
+        if discard or time.monotonic() - entry.created_at > self.max_age:
+            self._close(entry, "closed_broken" if discard else "closed_age")
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            _POOL_IDLE.set(len(self._idle), {"pool": self.name})
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Close every idle connection; leased ones are closed when released."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self.max_age = -1.0
+        for entry in idle:
+            self._close(entry, "closed_shutdown")
+
+    @contextmanager
+    def connection(self) -> Generator[Any, None, None]:
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=not _rollback(conn))
+            raise
+        self.release(conn)
+
+    def _warm(self) -> None:
+        if self._warmed:
+            return
+        self._warmed = True
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._opened >= self.min_size:
+                    return
+                self._opened += 1
+            try:
+                entry = self._open()
+            except Exception as exc:  # pragma: no cover - checkout will surface the error
+                logger.debug("DB pool %s warm-up failed: %s", self.name, exc)
+                return
+            with self._cond:
+                self._idle.append(entry)
+                _POOL_IDLE.set(len(self._idle), {"pool": self.name})
+
+    def _checkout(self, deadline: float) -> Optional[_PooledConnection]:
+        """Pop an idle connection, or reserve a slot (``None``) to open a new one."""
+        with self._cond:
+            while True:
+                self._trim_idle()
+                if self._idle:
+                    entry = self._idle.pop()
+                    _POOL_IDLE.set(len(self._idle), {"pool": self.name})
+                    return entry
+                if self._opened < self.max_size:
+                    self._opened += 1
+                    return None
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"DB pool {self.name} exhausted: {self.max_size} connections in use for {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+    def _trim_idle(self) -> None:
+        # Oldest-used connections sit at the left end of the deque.
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._opened > self.min_size
+            and now - self._idle[0].last_used > self.idle_timeout
+        ):
+            entry = self._idle.popleft()
+            self._opened -= 1
+            _close_quietly(entry.conn)
+            _POOL_CONNECTIONS.add(1, {"pool": self.name, "event": "closed_idle"})
+
+    def _open(self) -> _PooledConnection:
+        """Open a connection for a slot already counted in ``_opened``."""
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+        _POOL_CONNECTIONS.add(1, {"pool": self.name, "event": "opened"})
+        now = time.monotonic()
+        return _PooledConnection(conn, created_at=now, last_used=now)
+
+    def _usable(self, entry: _PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - entry.created_at > self.max_age:
+            self._close(entry, "closed_age")
+            return False
+        if now - entry.last_used > self.ping_after:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                self._close(entry, "closed_dead")
+                return False
+        return True
+
+    def _close(self, entry: _PooledConnection, event: str) -> None:
+        _close_quietly(entry.conn)
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+        _POOL_CONNECTIONS.add(1, {"pool": self.name, "event": event})
+
+
+def _rollback(conn: Any) -> bool:
     try:
-        with conn.cursor() as cursor:
-            yield conn, cursor
-        conn.commit()
-    except Exception:
         conn.rollback()
-        raise
-    finally:
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn: Any) -> None:
+    try:
         conn.close()
+    except Exception:  # pragma: no cover - already broken
+        pass
+
+
+_POOLS: Dict[Tuple[Any, ...], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def database_key() -> Tuple[Any, ...]:
+    """Identity of the configured database, used to key per-database pools and caches."""
+    path = sqlite_path()
+    if path is not None:
+        return ("sqlite", path)
+    params = _mysql_params()
+    return ("mysql", params["host"], params["port"], params["user"], params["database"])
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """Pool for the currently configured database, or None when ``WEBANK_DB_POOL_MAX=0``."""
+    max_size = int(os.getenv("WEBANK_DB_POOL_MAX", "10"))
+    if max_size <= 0:
+        return None
+    key = database_key()
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                _connect,
+                name=key[0] if key[0] == "sqlite" else f"{key[0]}:{key[1]}/{key[4]}",
+                min_size=min(int(os.getenv("WEBANK_DB_POOL_MIN", "1")), max_size),
+                max_size=max_size,
+                max_age=float(os.getenv("WEBANK_DB_POOL_MAX_AGE", "1800")),
+                idle_timeout=float(os.getenv("WEBANK_DB_POOL_IDLE_TIMEOUT", "300")),
+                ping_after=float(os.getenv("WEBANK_DB_POOL_PING_AFTER", "5")),
+                timeout=float(os.getenv("WEBANK_DB_POOL_TIMEOUT", "10")),
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+def close_pools() -> None:
+    """Close idle pooled connections (e.g. at shutdown or after a fork)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+@dataclass
+class _Scope:
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    conn: Any = None
+    pool: Optional[ConnectionPool] = None
+
+
+_SCOPE: contextvars.ContextVar[Optional[_Scope]] = contextvars.ContextVar("webank_db_scope", default=None)
+
+
+@contextmanager
+def db_session() -> Generator[None, None, None]:
+    """Reuse one connection for every :func:`db_cursor` inside the block.
+
+    The connection is checked out lazily on first use (so memory-mode code
+    paths never touch the DB) and returned when the block exits. Each
+    ``db_cursor`` still commits or rolls back its own statements. Calls from
+    threads that inherit the context are serialized on the shared connection.
+    """
+    if _SCOPE.get() is not None:
+        yield
+        return
+    scope = _Scope()
+    token = _SCOPE.set(scope)
+    try:
+        yield
+    finally:
+        _SCOPE.reset(token)
+        if scope.conn is not None:
+            if scope.pool is not None:
+                scope.pool.release(scope.conn)
+            else:
+                _close_quietly(scope.conn)
+
+
+def _scoped_connection(scope: _Scope) -> Any:
+    if scope.conn is None:
+        scope.pool = get_pool()
+        scope.conn = scope.pool.acquire() if scope.pool is not None else _connect()
+    return scope.conn
+
+
+def _discard_scoped(scope: _Scope) -> None:
+    conn, scope.conn = scope.conn, None
+    if scope.pool is not None:
+        scope.pool.release(conn, discard=True)
+    else:
+        _close_quietly(conn)
+
+
+@contextmanager
+def db_cursor() -> Generator[Tuple[pymysql.connections.Connection, DictCursor], None, None]:
+    """Context manager that yields a connection and cursor and handles commit/rollback.
+
+    Connections come from the pool (see :func:`get_pool`), or from the
+    enclosing :func:`db_session` when there is one.
+    """
+    with trace_agent_span("db.cursor"):
+        scope = _SCOPE.get()
+        if scope is not None:
+            with scope.lock:
+                conn = _scoped_connection(scope)
+                try:
+                    with conn.cursor() as cursor:
+                        yield conn, cursor
+                    conn.commit()
+                except BaseException:
+                    if not _rollback(conn):
+                        _discard_scoped(scope)
+                    raise
+            return
+
+        pool = get_pool()
+        if pool is None:
+            conn = _connect()
+            try:
+                with conn.cursor() as cursor:
+                    yield conn, cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            return
+
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                yield conn, cursor
+            conn.commit()
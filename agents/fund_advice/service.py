@@ -3,32 +3,20 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-import json
-
-from agents.common.telemetry import trace_agent_span
+from agents.common.profiling import profile_call
+from agents.common.runner import arun_agent, stringify_output
+from agents.common.telemetry import METRICS, set_payload_attribute, trace_agent_span
 
 from agents.fund_advice.builder import (
     build_fund_advice_agent,
     format_fund_prompt,
 )
 
-_SPAN_TEXT_LIMIT = 2048
-
-
-def _truncate(text: str) -> str:
-    if len(text) <= _SPAN_TEXT_LIMIT:
-        return text
-    return f"{text[:_SPAN_TEXT_LIMIT-3]}..."
 
-
-def _stringify_output(output: Any) -> str:
-    if isinstance(output, dict) and "content" in output:
-        return str(output["content"]).strip()
-    if hasattr(output, "content"):
-        return str(output.content).strip()
-    return str(output).strip()
+def _model_id(agent: Any) -> str:
+    return str(getattr(getattr(agent, "model", None), "id", None) or "")
 
 
 @dataclass
@@ -38,7 +26,12 @@ class FundAdviceService:
     def __post_init__(self) -> None:
         self.agent = build_fund_advice_agent()
 
-    def generate_advice(self, fund_payload: Dict[str, Any]) -> str:
+    def generate_advice(self, fund_payload: Dict[str, Any], profile: Optional[bool] = None) -> str:
+        """Return advice text; ``profile`` forces CPU/allocation profiling on or off."""
+        with profile_call("fund_advice.generate", profile):
+            return self._generate_advice(fund_payload)
+
+    def _generate_advice(self, fund_payload: Dict[str, Any]) -> str:
         prompt = format_fund_prompt(fund_payload)
         agent_name = getattr(self.agent, "name", None) or "FundAdviceAgent"
         with trace_agent_span(
@@ -46,15 +39,37 @@ class FundAdviceService:
             {
                 "agent.name": agent_name,
             },
+            lazy_attributes={
+                "agent.input.prompt": lambda: prompt,
+                "agent.input.payload": lambda: fund_payload,
+            },
+        ) as span:
+            labels = (agent_name, _model_id(self.agent))
+            with METRICS.in_flight(*labels):
+                output = self.agent.run(prompt)
+            METRICS.record_usage(*labels, output)
+            response_text = stringify_output(output)
+            set_payload_attribute(span, "agent.output.text", response_text)
+        return response_text
+
+    async def agenerate_advice(self, fund_payload: Dict[str, Any]) -> str:
+        """Coroutine variant of :meth:`generate_advice` built on ``agent.arun``."""
+        prompt = format_fund_prompt(fund_payload)
+        agent_name = getattr(self.agent, "name", None) or "FundAdviceAgent"
+        with trace_agent_span(
+            "agent.fund_advice",
+            {
+                "agent.name": agent_name,
+            },
+            lazy_attributes={
+                "agent.input.prompt": lambda: prompt,
+                "agent.input.payload": lambda: fund_payload,
+            },
         ) as span:
-            if span:
-                span.set_attribute("agent.input.prompt", _truncate(prompt))
-                span.set_attribute(
-                    "agent.input.payload",
-                    _truncate(json.dumps(fund_payload, ensure_ascii=False)),
-                )
-            output = self.agent.run(prompt)
-            response_text = _stringify_output(output)
-            if span:
-                span.set_attribute("agent.output.text", _truncate(response_text))
+            labels = (agent_name, _model_id(self.agent))
+            with METRICS.in_flight(*labels):
+                output = await arun_agent(self.agent, prompt)
+            METRICS.record_usage(*labels, output)
+            response_text = stringify_output(output)
+            set_payload_attribute(span, "agent.output.text", response_text)
         return response_text
@@ -0,0 +1,327 @@
+"""Concurrent multi-turn load generator for ConversationService."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from agno.models.dashscope import DashScope
+
+from agents.common.span_report import group_traces, union_length
+from agents.common.stats import percentile
+from agents.common.telemetry import trace_agent_span
+from agents.conversation import memory
+from agents.conversation.service import _DEGRADED_REPLY, ConversationService
+
+DEFAULT_MESSAGES = (
+    "我最近的资产配置风险高吗？",
+    "是否需要增加债券基金的比例？",
+    "帮我看看这个月的消费有没有异常。",
+    "有没有适合我的稳健型理财产品？",
+    "如果下个月要买车，现金流够不够？",
+)
+
+# Just the tables the conversation path touches, in portable SQL.
+LOADTEST_SQLITE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS ai_sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        channel TEXT,
+        page_context TEXT,
+        created_at TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ai_session_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        message TEXT,
+        actions TEXT,
+        insight_refs TEXT,
+        created_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_session ON ai_session_messages (session_id, created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS user_asset_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        report_date TEXT,
+        risk_level TEXT,
+        asset_breakdown TEXT,
+        credit_capacity TEXT,
+        raw_payload TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_behavior_insights (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        snapshot_at TEXT,
+        intent_labels TEXT,
+        operational_signals TEXT,
+        source_logs TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_socio_roles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        role_tags TEXT,
+        life_stage TEXT,
+        raw_payload TEXT,
+        update_time TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_insight_summary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        summary_text TEXT,
+        recommendations TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_insight_latest (
+        user_id TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (user_id, stage)
+    )
+    """,
+)
+
+
+def init_sqlite_store(path: Path, user_ids: Iterable[str]) -> None:
+    """Create the conversation tables in ``path`` and seed one insight row (and pointer) per user."""
+
+    now = datetime.utcnow().isoformat()
+    with sqlite3.connect(str(path)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in LOADTEST_SQLITE_SCHEMA:
+            conn.execute(statement)
+        for user_id in user_ids:
+            seeded = {
+                "asset": conn.execute(
+                    "INSERT INTO user_asset_snapshots (user_id, report_date, risk_level, asset_breakdown, "
+                    "credit_capacity, raw_payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, now[:10], "R3", json.dumps({"fund": 0.4, "deposit": 0.6}), "{}", "{}"),
+                ),
+                "behavior": conn.execute(
+                    "INSERT INTO user_behavior_insights (user_id, snapshot_at, intent_labels, "
+                    "operational_signals, source_logs) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, now, json.dumps([{"label": "理财咨询", "score": 0.7}], ensure_ascii=False), "{}", "[]"),
+                ),
+                "socio_role": conn.execute(
+                    "INSERT INTO user_socio_roles (user_id, role_tags, life_stage, raw_payload, update_time) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user_id, json.dumps(["白领"], ensure_ascii=False), "成家立业", "{}", now),
+                ),
+                "summary": conn.execute(
+                    "INSERT INTO user_insight_summary (user_id, summary_text, recommendations) VALUES (?, ?, ?)",
+                    (user_id, "稳健型，关注资产配置", "[]"),
+                ),
+            }
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_insight_latest (user_id, stage, snapshot_id, content_hash, updated_at) "
+                "VALUES (?, ?, ?, '', ?)",
+                [(user_id, stage, cursor.lastrowid, now) for stage, cursor in seeded.items()],
+            )
+
+
+def configure_store(store: str, sqlite_file: Optional[Path] = None) -> None:
+    """Point conversation storage at the in-process memory store or a SQLite file.
+
+    Process-wide: meant for the load-test CLI, which owns its process.
+    """
+
+    if store == "memory":
+        memory._USE_MEMORY = True
+        return
+    if store != "sqlite" or sqlite_file is None:
+        raise ValueError("store must be 'memory' or 'sqlite' with a file path")
+    memory._USE_MEMORY = False
+    os.environ["WEBANK_DB_BACKEND"] = "sqlite"
+    os.environ["WEBANK_SQLITE_PATH"] = str(sqlite_file)
+
+
+def build_stub_service(base_url: str, model_id: str = "qwen-plus", history_limit: int = 10) -> ConversationService:
+    """ConversationService whose agent talks to an OpenAI-compatible endpoint at ``base_url``."""
+
+    model = DashScope(id=model_id, base_url=base_url, api_key=os.getenv("DASHSCOPE_API_KEY") or "stub")
+    return ConversationService(history_limit=history_limit, model=model)
+
+
+@dataclass
+class LoadTestReport:
+    """Per-turn latencies, outcome counters and the DB/LLM time split."""
+
+    users: int
+    turns: int
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    degraded: int = 0
+    error_samples: List[str] = field(default_factory=list)
+    db_seconds: List[float] = field(default_factory=list)
+    llm_seconds: List[float] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, latency: float, reply: Optional[Dict[str, Any]], error: Optional[Exception]) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+            if error is not None:
+                self.errors += 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f"{type(error).__name__}: {error}")
+            elif reply is not None and reply.get("response") == _DEGRADED_REPLY["response"]:
+                self.degraded += 1
+
+    def attach_breakdown(self, spans: Iterable[Dict[str, Any]]) -> None:
+        """Split each ``loadtest.turn`` trace into time under ``db.cursor`` and ``agent.conversation``."""
+
+        for trace in group_traces(spans).values():
+            if not any(span["name"] == "loadtest.turn" for span in trace):
+                continue
+            self.db_seconds.append(
+                union_length([(s["start"], s["end"]) for s in trace if s["name"] == "db.cursor"])
+            )
+            self.llm_seconds.append(
+                union_length([(s["start"], s["end"]) for s in trace if s["name"] == "agent.conversation"])
+            )
+
+    @property
+    def total_turns(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.total_turns / self.elapsed if self.elapsed > 0 else 0.0
+
+    def render(self) -> str:
+        total = max(1, self.total_turns)
+        lines = [
+            f"[loadtest] users={self.users} turns/user={self.turns} completed={self.total_turns} "
+            f"elapsed={self.elapsed:.1f}s throughput={self.throughput:.2f} turns/s",
+            "[loadtest] latency "
+            + " ".join(
+                f"p{pct}={percentile(self.latencies, pct) * 1000:.0f}ms" for pct in (50, 90, 95, 99)
+            )
+            + f" max={max(self.latencies, default=0.0) * 1000:.0f}ms",
+            f"[loadtest] errors={self.errors} ({self.errors / total:.1%}) "
+            f"degraded={self.degraded} ({self.degraded / total:.1%})",
+        ]
+        for sample in self.error_samples:
+            lines.append(f"[loadtest]   {sample}")
+        if self.db_seconds:
+            turn_time = sum(self.latencies) or 1.0
+            for label, samples in (("db", self.db_seconds), ("llm", self.llm_seconds)):
+                lines.append(
+                    f"[loadtest] {label:<4} mean={sum(samples) / len(samples) * 1000:.0f}ms "
+                    f"p95={percentile(samples, 95) * 1000:.0f}ms "
+                    f"share={sum(samples) / turn_time:.0%}"
+                )
+        return "\n".join(lines)
+
+
+@dataclass
+class ConversationLoadTest:
+    """Simulate ``users`` concurrent sessions of ``turns`` messages each.
+
+    Each user waits ``think_time`` seconds (jittered ±50%) between turns and
+    starts at a random offset within ``ramp_seconds``. Every turn runs inside
+    a ``loadtest.turn`` span so the DB/LLM split can be read from local spans.
+    """
+
+    service: ConversationService
+    users: int = 10
+    turns: int = 5
+    think_time: float = 0.0
+    ramp_seconds: float = 0.0
+    messages: Sequence[str] = DEFAULT_MESSAGES
+    seed: Optional[int] = None
+    user_prefix: str = "LT"
+
+    def user_ids(self) -> List[str]:
+        return [f"{self.user_prefix}{index:05d}" for index in range(self.users)]
+
+    def _pause(self, rng: random.Random, seconds: float) -> float:
+        return rng.uniform(0.5, 1.5) * seconds if seconds > 0 else 0.0
+
+    def run(self) -> LoadTestReport:
+        report = LoadTestReport(users=self.users, turns=self.turns)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users, thread_name_prefix="webank-loadtest") as executor:
+            futures = [
+                executor.submit(self._user_session, user_id, index, report)
+                for index, user_id in enumerate(self.user_ids())
+            ]
+            for future in futures:
+                future.result()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def _user_session(self, user_id: str, index: int, report: LoadTestReport) -> None:
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        time.sleep(rng.uniform(0, self.ramp_seconds) if self.ramp_seconds > 0 else 0.0)
+        session_id = None
+        for turn in range(self.turns):
+            if turn:
+                time.sleep(self._pause(rng, self.think_time))
+            message = self.messages[(index + turn) % len(self.messages)]
+            turn_started = time.perf_counter()
+            reply, error = None, None
+            with trace_agent_span("loadtest.turn", {"loadtest.user": user_id, "loadtest.turn": turn}):
+                try:
+                    reply = self.service.generate_reply(user_id, message, session_id=session_id)
+                    session_id = reply.get("sessionId", session_id)
+                except Exception as exc:
+                    error = exc
+            report.record(time.perf_counter() - turn_started, reply, error)
+
+    async def arun(self) -> LoadTestReport:
+        """Same workload through ``agenerate_reply`` on one event loop."""
+
+        report = LoadTestReport(users=self.users, turns=self.turns)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(self._auser_session(user_id, index, report) for index, user_id in enumerate(self.user_ids()))
+        )
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def _auser_session(self, user_id: str, index: int, report: LoadTestReport) -> None:
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        await asyncio.sleep(rng.uniform(0, self.ramp_seconds) if self.ramp_seconds > 0 else 0.0)
+        session_id = None
+        for turn in range(self.turns):
+            if turn:
+                await asyncio.sleep(self._pause(rng, self.think_time))
+            message = self.messages[(index + turn) % len(self.messages)]
+            turn_started = time.perf_counter()
+            reply, error = None, None
+            with trace_agent_span("loadtest.turn", {"loadtest.user": user_id, "loadtest.turn": turn}):
+                try:
+                    reply = await self.service.agenerate_reply(user_id, message, session_id=session_id)
+                    session_id = reply.get("sessionId", session_id)
+                except Exception as exc:
+                    error = exc
+            report.record(time.perf_counter() - turn_started, reply, error)
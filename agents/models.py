@@ -3,27 +3,107 @@
 from __future__ import annotations
 
 import os
-from typing import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Optional
 
 from agno.models.dashscope import DashScope
 
+from agents.common.cassette import RECORD, REPLAY, Cassette, CassetteClient
+
 DefaultModelFactory = Callable[[], DashScope]
 
+LIVE = "live"
+_BACKEND_ENV = "WEBANK_MODEL_BACKEND"
+_CASSETTE_ENV = "WEBANK_CASSETTE"
+_REPLAY_LATENCY_ENV = "WEBANK_REPLAY_LATENCY"
+_DEFAULT_CASSETTE = "cassettes/models.jsonl"
+
+
+@dataclass
+class ModelBackend:
+    """Which backend factories build: live DashScope, or record/replay via a cassette."""
+
+    mode: str = LIVE
+    cassette_path: str = _DEFAULT_CASSETTE
+    latency_scale: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "ModelBackend":
+        return cls(
+            mode=os.getenv(_BACKEND_ENV, LIVE).lower(),
+            cassette_path=os.getenv(_CASSETTE_ENV, _DEFAULT_CASSETTE),
+            latency_scale=float(os.getenv(_REPLAY_LATENCY_ENV, "0")),
+        )
+
+
+_BACKEND_OVERRIDE: Optional[ModelBackend] = None
+
+
+def set_model_backend(backend: Optional[ModelBackend]) -> None:
+    """Override the env-configured backend for models built from now on (``None`` resets)."""
+
+    global _BACKEND_OVERRIDE
+    if backend is not None and backend.mode not in (LIVE, RECORD, REPLAY):
+        raise ValueError(f"unknown model backend: {backend.mode}")
+    _BACKEND_OVERRIDE = backend
+
+
+def current_model_backend() -> ModelBackend:
+    return _BACKEND_OVERRIDE or ModelBackend.from_env()
+
+
+@lru_cache(maxsize=None)
+def open_cassette(path: str) -> Cassette:
+    """Share one loaded cassette per file across every model instance."""
+
+    return Cassette(Path(path))
+
+
+@dataclass
+class CassetteDashScope(DashScope):
+    """DashScope model whose chat completions go through a recording cassette.
+
+    Only the transport is swapped, so agno's request building and response
+    parsing (including streaming and token metrics) run exactly as live.
+    """
+
+    cassette_mode: str = REPLAY
+    cassette_path: str = _DEFAULT_CASSETTE
+    replay_latency: float = 0.0
+
+    def _cassette_client(self, is_async: bool) -> CassetteClient:
+        inner: Any = None
+        if self.cassette_mode == RECORD:
+            inner = super().get_async_client() if is_async else super().get_client()
+        return CassetteClient(
+            open_cassette(self.cassette_path),
+            self.cassette_mode,
+            inner=inner,
+            latency_scale=self.replay_latency,
+            is_async=is_async,
+        )
+
+    def get_client(self) -> Any:  # type: ignore[override]
+        return self._cassette_client(is_async=False)
+
+    def get_async_client(self) -> Any:  # type: ignore[override]
+        return self._cassette_client(is_async=True)
+
 
 def default_model_factory() -> DashScope:
     """Return the default DashScope model configured via env vars."""
-    model_id = os.getenv("AGNO_MODEL_ID", "qwen-plus")
-    temperature = float(os.getenv("AGNO_TEMPERATURE", "0.3"))
-    base_url = os.getenv(
-        "DASHSCOPE_BASE_URL",
-        "https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
-    api_key = os.getenv("DASHSCOPE_API_KEY")
-    return DashScope(id=model_id, temperature=temperature, base_url=base_url, api_key=api_key)
+    return build_model_factory()()
 
 
 def build_model_factory(model_id: str | None = None) -> DefaultModelFactory:
-    """Build a factory producing DashScope models with a fixed identifier."""
+    """Build a factory producing DashScope models with a fixed identifier.
+
+    The backend (``WEBANK_MODEL_BACKEND=live|record|replay`` or
+    :func:`set_model_backend`) is resolved each time the factory is called, so
+    module-level factories in the agent builders follow CLI overrides.
+    """
     fallback_id = os.getenv("AGNO_MODEL_ID", "qwen-plus")
     resolved_model_id = model_id or fallback_id
     temperature = float(os.getenv("AGNO_TEMPERATURE", "0.3"))
@@ -34,11 +114,22 @@ def build_model_factory(model_id: str | None = None) -> DefaultModelFactory:
     api_key = os.getenv("DASHSCOPE_API_KEY")
 
     def factory() -> DashScope:
-        return DashScope(
+        backend = current_model_backend()
+        if backend.mode == LIVE:
+            return DashScope(
+                id=resolved_model_id,
+                temperature=temperature,
+                base_url=base_url,
+                api_key=api_key,
+            )
+        return CassetteDashScope(
             id=resolved_model_id,
             temperature=temperature,
             base_url=base_url,
             api_key=api_key,
+            cassette_mode=backend.mode,
+            cassette_path=backend.cassette_path,
+            replay_latency=backend.latency_scale,
         )
 
     return factory
@@ -2,54 +2,50 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import copy
+import inspect
 import json
 import re
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
 from agno.agent import Agent
 
 from agents.asset.builder import build_asset_agent, format_asset_prompt
 from agents.behavior.builder import build_behavior_agent, format_behavior_prompt
-from agents.common.telemetry import trace_agent_span
+from agents.behavior.signals import apply_precomputed_signals
+from agents.common.cascade import ModelCascade, check_stage_output
+from agents.common.hedging import (
+    HEDGE_ATTEMPT,
+    DeadlinePolicy,
+    StageTimeoutError,
+    acall_with_deadline,
+    call_with_deadline,
+)
+from agents.common.json_repair import loads_repaired
+from agents.common.json_stream import IncrementalJSONParser
+from agents.common.microbatch import (
+    MicroBatchPolicy,
+    format_batch_prompt,
+    pack_batches,
+    split_batch_output,
+)
+from agents.common.profiling import profile_call
+from agents.common.result_cache import StageResultCache, fingerprint_stage_input, stage_cache_key
+from agents.common.runner import arun_agent, is_stream, stream_delta, stringify_output
+from agents.common.telemetry import METRICS, set_payload_attribute, trace_agent_span
 from agents.models import build_model_factory
 from agents.socio_role.builder import (
     build_socio_role_agent,
     format_socio_role_prompt,
 )
+from agents.socio_role.cohort import SocioRoleCohorts, cohort_key
 from agents.summary.builder import build_summary_agent, format_summary_prompt
 
-_SPAN_TEXT_LIMIT = 2048
-
-
-def _truncate(text: str, limit: int = _SPAN_TEXT_LIMIT) -> str:
-    """Clip long metadata attributes to avoid oversized spans."""
-
-    if limit <= 3:
-        return text[:limit]
-    if len(text) <= limit:
-        return text
-    return f"{text[: limit - 3]}..."
-
-
-def _stringify_output(output: Any) -> str:
-    """Render various agent outputs to plain text for tracing."""
-
-    if isinstance(output, dict) and "content" in output:
-        return str(output["content"]).strip()
-    if hasattr(output, "content"):
-        return str(output.content).strip()
-    return str(output).strip()
-
-
-def _safe_json_dumps(payload: Any) -> str:
-    """Serialize payloads defensively for span attributes."""
-
-    try:
-        return json.dumps(payload, ensure_ascii=False)
-    except (TypeError, ValueError):
-        return str(payload)
-
 
 def _annotate_agent_input(
     span: Any,
@@ -58,116 +54,188 @@ def _annotate_agent_input(
 ) -> None:
     if span is None:
         return
-    span.set_attribute("agent.input.prompt", _truncate(prompt))
+    set_payload_attribute(span, "agent.input.prompt", prompt)
     if payload is not None:
-        span.set_attribute("agent.input.payload", _truncate(_safe_json_dumps(payload)))
+        set_payload_attribute(span, "agent.input.payload", payload)
 
 
 def _annotate_agent_raw_output(span: Any, output: Any) -> None:
     if span is None:
         return
-    rendered = _stringify_output(output)
-    if rendered:
-        span.set_attribute("agent.output.raw", _truncate(rendered))
+    set_payload_attribute(span, "agent.output.raw", stringify_output(output))
 
 
 def _annotate_agent_structured_output(span: Any, payload: Dict[str, Any]) -> None:
     if span is None:
         return
-    span.set_attribute("agent.output.json", _truncate(_safe_json_dumps(payload)))
+    set_payload_attribute(span, "agent.output.json", payload)
+
+
+_STAGE_SPECS: Dict[str, Tuple[Callable[[Dict[str, Any]], str], str]] = {
+    "socio_role": (format_socio_role_prompt, "SocioRoleAgent"),
+    "asset": (format_asset_prompt, "AssetAgent"),
+    "behavior": (format_behavior_prompt, "BehaviorAgent"),
+    "summary": (format_summary_prompt, "SummaryAgent"),
+}
+# Deterministic fix-ups applied to a stage result, whichever path produced it.
+_STAGE_POSTPROCESSORS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    "behavior": apply_precomputed_signals,
+}
+_UPSTREAM_STAGES = ("socio_role", "asset", "behavior")
+# Per-user outcome of a batched run: the result, or the error that failed the user.
+StageOutcome = Union[Dict[str, Any], Exception]
+
+
+class PipelineStageError(RuntimeError):
+    """A stage failed after its retries; carries the stages that did complete.
+
+    ``checkpoint`` uses the ``previous`` format of :meth:`WebankAgentPipeline.run`,
+    so passing it back re-runs only the failed stage and what depends on it.
+    """
+
+    def __init__(self, stage: str, checkpoint: Dict[str, Dict[str, Any]], cause: BaseException):
+        super().__init__(f"Stage {stage} failed: {cause}")
+        self.stage = stage
+        self.checkpoint = checkpoint
+
+
+@dataclass(slots=True)
+class _RunContext:
+    """Per-run state shared by the stages of one pipeline execution."""
+
+    previous: Optional[Mapping[str, Mapping[str, Any]]] = None
+    deadline: Optional[float] = None
+    # Stages finished in this run, as ``{stage: {"fingerprint", "result"}}``.
+    completed: Dict[str, Dict[str, Any]] = field(default_factory=dict)
 
 
 @dataclass(slots=True)
 class WebankAgentPipeline:
-    """Sequential pipeline wiring the specialised agno agents."""
+    """Pipeline wiring the specialised agno agents.
+
+    The socio_role / asset / behavior stages only depend on their own slice of
+    the payload, so ``parallel=True`` fans them out on a thread pool and joins
+    before the summary stage. The default keeps the original sequential order.
+    With a ``cache`` attached, a stage whose rendered prompt, model and system
+    prompt are unchanged reuses the stored result instead of calling the model.
+    ``stream=True`` consumes model output as it arrives and stops the stream as
+    soon as the JSON object closes, ignoring any trailing prose. ``deadlines``
+    bounds each stage by its share of the pipeline budget and can fire a hedged
+    duplicate request, sent to that stage's ``hedge_agents`` instance, for
+    stages running past their usual latency. With
+    ``socio_cohorts`` the SocioRoleAgent sees a bucketed cohort profile and each
+    cohort's result is computed once and shared. A ``cascade`` answers each
+    listed stage with the cheap agent in ``cascade_agents`` first and escalates
+    to the stage agent only when that answer is unusable. Malformed JSON is
+    repaired where possible, otherwise only that stage is re-asked, up to
+    ``stage_retries`` times. :meth:`run_many` packs several
+    users into each stage request, sized by ``micro_batch``.
+    """
 
     socio_role_agent: Agent
     asset_agent: Agent
     behavior_agent: Agent
     summary_agent: Agent
+    parallel: bool = False
+    stage_observer: Optional[Callable[[str, float], None]] = None
+    cache: Optional[StageResultCache] = None
+    stream: bool = False
+    deadlines: Optional[DeadlinePolicy] = None
+    socio_cohorts: Optional[SocioRoleCohorts] = None
+    micro_batch: Optional[MicroBatchPolicy] = None
+    cascade: Optional[ModelCascade] = None
+    cascade_agents: Dict[str, Agent] = field(default_factory=dict)
+    hedge_agents: Dict[str, Agent] = field(default_factory=dict)
+    stage_retries: int = 1
+
+    def run(
+        self,
+        payload: Dict[str, Any],
+        previous: Optional[Mapping[str, Mapping[str, Any]]] = None,
+        profile: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Execute the full agent pipeline and return merged outputs.
+
+        ``previous`` maps stage names to ``{"fingerprint", "result"}`` from the
+        last persisted refresh (see ``retriever.fetch_stage_states``). A stage
+        whose input fingerprint still matches reuses that result; summary is
+        only re-run when one of the upstream results or the context changed.
+        A failing stage raises :class:`PipelineStageError` whose ``checkpoint``
+        can be passed back as ``previous`` to resume. ``profile`` forces CPU and
+        allocation profiling on or off (default: ``WEBANK_PROFILE_DIR``).
+        """
 
-    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute the full agent pipeline and return merged outputs."""
+        with profile_call("pipeline.run", profile):
+            return self._run(payload, previous)
 
+    def _run(
+        self,
+        payload: Dict[str, Any],
+        previous: Optional[Mapping[str, Mapping[str, Any]]],
+    ) -> Dict[str, Any]:
         with trace_agent_span(
             "pipeline.run",
-            {"pipeline.name": "WebankAgentPipeline"},
+            {
+                "pipeline.name": "WebankAgentPipeline",
+                "pipeline.parallel": self.parallel,
+            },
+            lazy_attributes={"pipeline.input.payload": lambda: payload},
         ) as pipeline_span:
-            if pipeline_span is not None:
-                pipeline_span.set_attribute(
-                    "pipeline.input.payload",
-                    _truncate(_safe_json_dumps(payload)),
-                )
 
-            socio_input = payload.get("socio_role", {})
-            asset_input = payload.get("asset", {})
-            behavior_input = payload.get("behavior", {})
-
-            socio_prompt = format_socio_role_prompt(socio_input)
-            socio_agent_name = getattr(self.socio_role_agent, "name", None) or "SocioRoleAgent"
-            with trace_agent_span(
-                "agent.socio_role",
-                {
-                    "agent.name": socio_agent_name,
-                    "pipeline.stage": "socio_role",
-                },
-            ) as span:
-                _annotate_agent_input(span, socio_prompt, socio_input)
-                socio_raw = self.socio_role_agent.run(socio_prompt)
-                _annotate_agent_raw_output(span, socio_raw)
-                socio_result = _safe_json_loads(socio_raw)
-                _annotate_agent_structured_output(span, socio_result)
-
-            asset_prompt = format_asset_prompt(asset_input)
-            asset_agent_name = getattr(self.asset_agent, "name", None) or "AssetAgent"
-            with trace_agent_span(
-                "agent.asset",
-                {
-                    "agent.name": asset_agent_name,
-                    "pipeline.stage": "asset",
-                },
-            ) as span:
-                _annotate_agent_input(span, asset_prompt, asset_input)
-                asset_raw = self.asset_agent.run(asset_prompt)
-                _annotate_agent_raw_output(span, asset_raw)
-                asset_result = _safe_json_loads(asset_raw)
-                _annotate_agent_structured_output(span, asset_result)
-
-            behavior_prompt = format_behavior_prompt(behavior_input)
-            behavior_agent_name = getattr(self.behavior_agent, "name", None) or "BehaviorAgent"
-            with trace_agent_span(
-                "agent.behavior",
-                {
-                    "agent.name": behavior_agent_name,
-                    "pipeline.stage": "behavior",
-                },
-            ) as span:
-                _annotate_agent_input(span, behavior_prompt, behavior_input)
-                behavior_raw = self.behavior_agent.run(behavior_prompt)
-                _annotate_agent_raw_output(span, behavior_raw)
-                behavior_result = _safe_json_loads(behavior_raw)
-                _annotate_agent_structured_output(span, behavior_result)
-
-            summary_payload = {
-                "socio_role": socio_result,
-                "asset": asset_result,
-                "behavior": behavior_result,
-                "context": payload.get("context", {}),
+            run = self._start_run(previous)
+            if self.parallel:
+                upstream = self._run_upstream_parallel(payload, run)
+            else:
+                upstream = {
+                    stage: self._run_stage(stage, payload.get(stage, {}), run)
+                    for stage in _UPSTREAM_STAGES
+                }
+
+            summary_payload = build_summary_input(payload, upstream)
+            summary_result = self._run_stage("summary", summary_payload, run)
+
+            result = {
+                "socio_role": upstream["socio_role"],
+                "asset": upstream["asset"],
+                "behavior": upstream["behavior"],
+                "summary": summary_result,
             }
-            summary_prompt = format_summary_prompt(summary_payload)
-            summary_agent_name = getattr(self.summary_agent, "name", None) or "SummaryAgent"
-            with trace_agent_span(
-                "agent.summary",
-                {
-                    "agent.name": summary_agent_name,
-                    "pipeline.stage": "summary",
-                },
-            ) as span:
-                _annotate_agent_input(span, summary_prompt, summary_payload)
-                summary_raw = self.summary_agent.run(summary_prompt)
-                _annotate_agent_raw_output(span, summary_raw)
-                summary_result = _safe_json_loads(summary_raw)
-                _annotate_agent_structured_output(span, summary_result)
+
+            set_payload_attribute(pipeline_span, "pipeline.output.payload", result)
+
+        return result
+
+    async def arun(
+        self,
+        payload: Dict[str, Any],
+        previous: Optional[Mapping[str, Mapping[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Asyncio variant of :meth:`run`; upstream stages always run under gather."""
+
+        with trace_agent_span(
+            "pipeline.run",
+            {
+                "pipeline.name": "WebankAgentPipeline",
+                "pipeline.mode": "async",
+            },
+            lazy_attributes={"pipeline.input.payload": lambda: payload},
+        ) as pipeline_span:
+
+            # Tasks created by gather inherit the current context, so stage
+            # spans nest under ``pipeline.run`` without extra plumbing.
+            run = self._start_run(previous)
+            socio_result, asset_result, behavior_result = await asyncio.gather(
+                *(
+                    self._arun_stage(stage, payload.get(stage, {}), run)
+                    for stage in _UPSTREAM_STAGES
+                )
+            )
+
+            summary_payload = build_summary_input(
+                payload,
+                {"socio_role": socio_result, "asset": asset_result, "behavior": behavior_result},
+            )
+            summary_result = await self._arun_stage("summary", summary_payload, run)
 
             result = {
                 "socio_role": socio_result,
@@ -176,34 +244,819 @@ class WebankAgentPipeline:
                 "summary": summary_result,
             }
 
-            if pipeline_span is not None:
-                pipeline_span.set_attribute(
-                    "pipeline.output.payload",
-                    _truncate(_safe_json_dumps(result)),
+            set_payload_attribute(pipeline_span, "pipeline.output.payload", result)
+
+        return result
+
+    def run_many(self, payloads: Mapping[str, Dict[str, Any]]) -> Dict[str, StageOutcome]:
+        """Run several users together, batching each stage's model calls.
+
+        Users needing the same stage are packed into one request per batch (see
+        ``agents.common.microbatch``); identical prompts are sent once. A user
+        missing or invalid in the batched answer is retried with a regular
+        single-user call. Returns ``user_id -> result`` in input order, with the
+        raised exception in place of the result for users that failed.
+        """
+
+        policy = self.micro_batch or MicroBatchPolicy()
+        with trace_agent_span(
+            "pipeline.run_many",
+            {
+                "pipeline.name": "WebankAgentPipeline",
+                "pipeline.batch.users": len(payloads),
+            },
+        ):
+            # The per-run budget is meant for one user, so batched runs skip it.
+            run = _RunContext()
+            stage_inputs = {
+                stage: {user_id: payload.get(stage, {}) for user_id, payload in payloads.items()}
+                for stage in _UPSTREAM_STAGES
+            }
+            if self.parallel:
+                with ThreadPoolExecutor(
+                    max_workers=len(_UPSTREAM_STAGES),
+                    thread_name_prefix="webank-pipeline",
+                ) as executor:
+                    futures = {
+                        stage: executor.submit(
+                            contextvars.copy_context().run,
+                            self._run_stage_batch,
+                            stage,
+                            inputs,
+                            run,
+                            policy,
+                        )
+                        for stage, inputs in stage_inputs.items()
+                    }
+                    upstream = {stage: future.result() for stage, future in futures.items()}
+            else:
+                upstream = {
+                    stage: self._run_stage_batch(stage, inputs, run, policy)
+                    for stage, inputs in stage_inputs.items()
+                }
+
+            outcomes: Dict[str, StageOutcome] = {}
+            summary_inputs: Dict[str, Dict[str, Any]] = {}
+            for user_id, payload in payloads.items():
+                results = {stage: upstream[stage][user_id] for stage in _UPSTREAM_STAGES}
+                error = next((r for r in results.values() if isinstance(r, Exception)), None)
+                if error is not None:
+                    outcomes[user_id] = error
+                else:
+                    outcomes[user_id] = results
+                    summary_inputs[user_id] = build_summary_input(payload, results)
+
+            summaries = self._run_stage_batch("summary", summary_inputs, run, policy)
+            for user_id, summary in summaries.items():
+                if isinstance(summary, Exception):
+                    outcomes[user_id] = summary
+                else:
+                    outcomes[user_id] = {**outcomes[user_id], "summary": summary}
+        return {user_id: outcomes[user_id] for user_id in payloads}
+
+    def _run_stage_batch(
+        self,
+        stage: str,
+        inputs: Mapping[str, Dict[str, Any]],
+        run: _RunContext,
+        policy: MicroBatchPolicy,
+    ) -> Dict[str, StageOutcome]:
+        """Resolve one stage for many users: cohort/cache first, then batched calls."""
+
+        outcomes: Dict[str, StageOutcome] = {}
+        # Unresolved users grouped by rendered prompt, with that prompt's cache slots.
+        waiting: Dict[str, List[str]] = {}
+        slots: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        agent_name = ""
+        for user_id, stage_input in inputs.items():
+            model_input = self._model_input(stage, stage_input)
+            agent, prompt, agent_name = self._prepare_stage(stage, model_input)
+            cohort, result = self._lookup_cohort(None, stage, model_input)
+            cache_key = None
+            if result is None:
+                cache_key, result = self._lookup_cache(None, stage, agent, agent_name, prompt)
+            if result is not None:
+                self._store_cohort(cohort, result)
+                outcomes[user_id] = _postprocess(stage, result, stage_input)
+                continue
+            waiting.setdefault(prompt, []).append(user_id)
+            slots.setdefault(prompt, (cache_key, cohort))
+
+        agent = self._stage_agent(stage)
+        # Cascaded stages batch on the cheap agent; answers failing its checks escalate per user.
+        cheap_agent = self._cascade_agent(stage)
+        keyed = [(f"u{index}", prompt) for index, prompt in enumerate(waiting)]
+        for batch in pack_batches(keyed, policy.batch_size(stage), policy.max_prompt_chars):
+            answers = (
+                self._call_batch(stage, cheap_agent or agent, agent_name, batch, policy)
+                if len(batch) > 1
+                else {}
+            )
+            for key, prompt in batch:
+                users = waiting[prompt]
+                stage_input = inputs[users[0]]
+                try:
+                    result = answers.get(key)
+                    reason = None
+                    if result is not None and cheap_agent is not None:
+                        reason = check_stage_output(stage, _postprocess(stage, result, stage_input))
+                        if reason is None:
+                            self._record_cascade(None, stage, None)
+                    if result is None or reason is not None:
+                        result = self._call_single(stage, agent, agent_name, prompt, run, stage_input, reason)
+                except Exception as exc:  # noqa: BLE001 - reported per user
+                    for user_id in users:
+                        outcomes[user_id] = exc
+                    continue
+                cache_key, cohort = slots[prompt]
+                self._store_cache(cache_key, result)
+                self._store_cohort(cohort, result)
+                for user_id in users:
+                    outcomes[user_id] = _postprocess(stage, copy.deepcopy(result), inputs[user_id])
+        return outcomes
+
+    def _call_batch(
+        self,
+        stage: str,
+        agent: Agent,
+        agent_name: str,
+        batch: List[Tuple[str, str]],
+        policy: MicroBatchPolicy,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Send one multi-user request; returns the validated per-key results."""
+
+        started = time.perf_counter()
+        with trace_agent_span(
+            f"agent.{stage}.batch",
+            {
+                "agent.name": agent_name,
+                "pipeline.stage": stage,
+                "agent.batch.size": len(batch),
+            },
+        ) as span:
+            prompt = format_batch_prompt(batch)
+            _annotate_agent_input(span, prompt)
+            try:
+                raw = agent.run(prompt)
+                _annotate_agent_raw_output(span, raw)
+                parsed = raw if isinstance(raw, list) else _safe_json_loads(raw)
+                answers = split_batch_output(parsed, [key for key, _ in batch])
+            except Exception:  # noqa: BLE001 - every user falls back to a single call
+                answers = {}
+            if span is not None:
+                span.set_attribute("agent.batch.valid", len(answers))
+        policy.record(stage, clean=len(answers) == len(batch))
+        elapsed = time.perf_counter() - started
+        self._observe_stage(f"{stage}.batch", elapsed)
+        METRICS.observe_stage(f"{stage}.batch", agent_name, _agent_model_id(agent), elapsed)
+        return answers
+
+    def _call_single(
+        self,
+        stage: str,
+        agent: Agent,
+        agent_name: str,
+        prompt: str,
+        run: _RunContext,
+        stage_input: Dict[str, Any],
+        cascade_reason: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """One-user call through the cascade; ``cascade_reason`` escalates a rejected batched answer."""
+
+        started = time.perf_counter()
+        with trace_agent_span(
+            f"agent.{stage}",
+            {
+                "agent.name": agent_name,
+                "pipeline.stage": stage,
+            },
+        ) as span:
+            _annotate_agent_input(span, prompt)
+            if cascade_reason is not None and self._record_cascade(span, stage, cascade_reason):
+                result = self._call_stage_agent(span, stage, agent, prompt, run)
+            else:
+                result = self._call_cascade(span, stage, agent, prompt, run, stage_input)
+        elapsed = time.perf_counter() - started
+        self._observe_stage(stage, elapsed)
+        METRICS.observe_stage(stage, agent_name, _agent_model_id(agent), elapsed)
+        return result
+
+    def _run_upstream_parallel(
+        self,
+        payload: Dict[str, Any],
+        run: _RunContext,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run the independent stages concurrently, keeping span parentage."""
+
+        with ThreadPoolExecutor(
+            max_workers=len(_UPSTREAM_STAGES),
+            thread_name_prefix="webank-pipeline",
+        ) as executor:
+            # Each worker runs inside a copy of the caller's context so the
+            # stage spans attach to the active ``pipeline.run`` span.
+            futures = {
+                stage: executor.submit(
+                    contextvars.copy_context().run,
+                    self._run_stage,
+                    stage,
+                    payload.get(stage, {}),
+                    run,
                 )
+                for stage in _UPSTREAM_STAGES
+            }
+            return {stage: future.result() for stage, future in futures.items()}
+
+    def _start_run(self, previous: Optional[Mapping[str, Mapping[str, Any]]]) -> _RunContext:
+        deadline = self.deadlines.start() if self.deadlines is not None else None
+        return _RunContext(previous=previous, deadline=deadline)
+
+    def _observe_stage(self, stage: str, elapsed: float) -> None:
+        if self.stage_observer is not None:
+            self.stage_observer(stage, elapsed)
+
+    def _stage_agent(self, stage: str) -> Agent:
+        return getattr(self, f"{stage}_agent")
+
+    def _run_stage(
+        self,
+        stage: str,
+        stage_input: Dict[str, Any],
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Run one stage, recording it in the run checkpoint or raising PipelineStageError."""
 
+        try:
+            result = self._execute_stage(stage, stage_input, run)
+        except PipelineStageError:
+            raise
+        except Exception as exc:
+            raise PipelineStageError(stage, run.completed, exc) from exc
+        _checkpoint_stage(run, stage, stage_input, result)
+        return result
+
+    def _execute_stage(
+        self,
+        stage: str,
+        stage_input: Dict[str, Any],
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Render, invoke and parse a single pipeline stage inside its span."""
+
+        model_input = self._model_input(stage, stage_input)
+        agent, prompt, agent_name = self._prepare_stage(stage, model_input)
+        started = time.perf_counter()
+        with trace_agent_span(
+            f"agent.{stage}",
+            {
+                "agent.name": agent_name,
+                "pipeline.stage": stage,
+            },
+        ) as span:
+            _annotate_agent_input(span, prompt, model_input)
+            result = _reuse_previous(span, stage, stage_input, run.previous)
+            cohort, cache_key = None, None
+            if result is None:
+                cohort, result = self._lookup_cohort(span, stage, model_input)
+            if result is None:
+                cache_key, result = self._lookup_cache(span, stage, agent, agent_name, prompt)
+            if result is None:
+                result = self._call_cascade(span, stage, agent, prompt, run, stage_input)
+                self._store_cache(cache_key, result)
+            self._store_cohort(cohort, result)
+        elapsed = time.perf_counter() - started
+        self._observe_stage(stage, elapsed)
+        METRICS.observe_stage(stage, agent_name, _agent_model_id(agent), elapsed)
+        return _postprocess(stage, result, stage_input)
+
+    async def _arun_stage(
+        self,
+        stage: str,
+        stage_input: Dict[str, Any],
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_run_stage`."""
+
+        try:
+            result = await self._aexecute_stage(stage, stage_input, run)
+        except PipelineStageError:
+            raise
+        except Exception as exc:
+            raise PipelineStageError(stage, run.completed, exc) from exc
+        _checkpoint_stage(run, stage, stage_input, result)
         return result
 
+    async def _aexecute_stage(
+        self,
+        stage: str,
+        stage_input: Dict[str, Any],
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_execute_stage`."""
+
+        model_input = self._model_input(stage, stage_input)
+        agent, prompt, agent_name = self._prepare_stage(stage, model_input)
+        started = time.perf_counter()
+        with trace_agent_span(
+            f"agent.{stage}",
+            {
+                "agent.name": agent_name,
+                "pipeline.stage": stage,
+            },
+        ) as span:
+            _annotate_agent_input(span, prompt, model_input)
+            result = _reuse_previous(span, stage, stage_input, run.previous)
+            cohort, cache_key = None, None
+            if result is None:
+                cohort, result = self._lookup_cohort(span, stage, model_input)
+            if result is None:
+                cache_key, result = self._lookup_cache(span, stage, agent, agent_name, prompt)
+            if result is None:
+                result = await self._acall_cascade(span, stage, agent, prompt, run, stage_input)
+                self._store_cache(cache_key, result)
+            self._store_cohort(cohort, result)
+        elapsed = time.perf_counter() - started
+        self._observe_stage(stage, elapsed)
+        METRICS.observe_stage(stage, agent_name, _agent_model_id(agent), elapsed)
+        return _postprocess(stage, result, stage_input)
 
-def build_default_pipeline(model_id: str | None = None) -> WebankAgentPipeline:
+    def _model_input(self, stage: str, stage_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Input actually rendered for the model (cohort profile in cohort mode)."""
+
+        if stage == "socio_role" and self.socio_cohorts is not None:
+            return self.socio_cohorts.rules.profile(stage_input)
+        return stage_input
+
+    def _lookup_cohort(
+        self,
+        span: Any,
+        stage: str,
+        model_input: Dict[str, Any],
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if stage != "socio_role" or self.socio_cohorts is None:
+            return None, None
+        key = cohort_key(model_input)
+        result = self.socio_cohorts.get(key)
+        if span is not None:
+            span.set_attribute("agent.cohort.key", key)
+            span.set_attribute("agent.cohort.hit", result is not None)
+        if result is not None:
+            _annotate_agent_structured_output(span, result)
+        return key, result
+
+    def _store_cohort(self, key: Optional[str], result: Dict[str, Any]) -> None:
+        if key is not None and self.socio_cohorts is not None:
+            self.socio_cohorts.put(key, result)
+
+    def _prepare_stage(self, stage: str, stage_input: Dict[str, Any]) -> Tuple[Agent, str, str]:
+        formatter, default_name = _STAGE_SPECS[stage]
+        agent = self._stage_agent(stage)
+        agent_name = getattr(agent, "name", None) or default_name
+        return agent, formatter(stage_input), agent_name
+
+    def _lookup_cache(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        agent_name: str,
+        prompt: str,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return ``(cache_key, cached_result)``; both are None without a cache."""
+
+        if self.cache is None:
+            return None, None
+        model_id = _agent_model_id(agent)
+        cheap_agent = self._cascade_agent(stage)
+        if cheap_agent is not None:
+            # Cascade answers may come from the cheap model, so keep them apart.
+            model_id = f"{_agent_model_id(cheap_agent)}>{model_id}"
+        cache_key = stage_cache_key(
+            agent_name,
+            model_id,
+            _agent_system_prompt(agent),
+            prompt,
+        )
+        result = self.cache.get(cache_key)
+        if span is not None:
+            span.set_attribute("agent.cache.hit", result is not None)
+            span.set_attribute("agent.cache.hits", self.cache.hits)
+            span.set_attribute("agent.cache.misses", self.cache.misses)
+        if result is not None:
+            _annotate_agent_structured_output(span, result)
+        return cache_key, result
+
+    def _store_cache(self, cache_key: Optional[str], result: Dict[str, Any]) -> None:
+        if cache_key is not None and self.cache is not None:
+            self.cache.put(cache_key, result)
+
+    def _cascade_agent(self, stage: str) -> Optional[Agent]:
+        if self.cascade is None or stage not in self.cascade.stages:
+            return None
+        return self.cascade_agents.get(stage)
+
+    def _call_cascade(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+        stage_input: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Try the cheap agent first and escalate to ``agent`` if its answer fails checks."""
+
+        cheap_agent = self._cascade_agent(stage)
+        if cheap_agent is None:
+            return self._call_stage_agent(span, stage, agent, prompt, run)
+        try:
+            # A broken cheap answer escalates straight away instead of being re-asked.
+            result = self._call_stage_agent(None, stage, cheap_agent, prompt, run, retries=0)
+            reason = check_stage_output(stage, _postprocess(stage, result, stage_input))
+        except (ValueError, TypeError):
+            result, reason = None, "invalid_json"
+        if self._record_cascade(span, stage, reason):
+            return self._call_stage_agent(span, stage, agent, prompt, run)
+        _annotate_agent_structured_output(span, result)
+        return result
+
+    async def _acall_cascade(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+        stage_input: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_call_cascade`."""
+
+        cheap_agent = self._cascade_agent(stage)
+        if cheap_agent is None:
+            return await self._acall_stage_agent(span, stage, agent, prompt, run)
+        try:
+            result = await self._acall_stage_agent(
+                None, stage, cheap_agent, prompt, run, retries=0
+            )
+            reason = check_stage_output(stage, _postprocess(stage, result, stage_input))
+        except (ValueError, TypeError):
+            result, reason = None, "invalid_json"
+        if self._record_cascade(span, stage, reason):
+            return await self._acall_stage_agent(span, stage, agent, prompt, run)
+        _annotate_agent_structured_output(span, result)
+        return result
+
+    def _record_cascade(self, span: Any, stage: str, reason: Optional[str]) -> bool:
+        """Count the cheap attempt; True when the stage must escalate."""
+
+        self.cascade.record(stage, reason)
+        if span is not None:
+            span.set_attribute("agent.cascade.escalated", reason is not None)
+            if reason is not None:
+                span.set_attribute("agent.cascade.reason", reason)
+        return reason is not None
+
+    def _call_stage_agent(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+        retries: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Call the stage agent, re-asking it when the output is not (repairable) JSON."""
+
+        retries = self.stage_retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return self._attempt_stage_agent(span, stage, agent, prompt, run)
+            except ValueError:
+                METRICS.count_parse_failure(stage, *_agent_labels(agent))
+                attempt += 1
+                if attempt > retries:
+                    raise
+                _annotate_retry(span, attempt)
+
+    async def _acall_stage_agent(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+        retries: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_call_stage_agent`."""
+
+        retries = self.stage_retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return await self._aattempt_stage_agent(span, stage, agent, prompt, run)
+            except ValueError:
+                METRICS.count_parse_failure(stage, *_agent_labels(agent))
+                attempt += 1
+                if attempt > retries:
+                    raise
+                _annotate_retry(span, attempt)
+
+    def _attempt_stage_agent(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Invoke the stage agent, under its deadline and hedging policy if any."""
+
+        if self.deadlines is None:
+            return self._invoke_agent(span, agent, prompt)
+        timeout = self.deadlines.stage_timeout(stage, run.deadline)
+        model_id = _agent_model_id(agent)
+        hedge_agent = self._hedge_agent(stage, agent)
+        hedge_delay = self.deadlines.hedge_delay(stage, model_id) if hedge_agent is not None else None
+        _annotate_deadline(span, timeout, hedge_delay)
+        started = time.perf_counter()
+        # Attempts may run concurrently, so they must not touch the shared span.
+        try:
+            result, attempt = call_with_deadline(
+                lambda: self._invoke_agent(None, agent, prompt),
+                timeout,
+                hedge_delay,
+                hedge=lambda: self._invoke_agent(None, hedge_agent, prompt),
+            )
+        except StageTimeoutError:
+            self.deadlines.record(stage, timeout, model_id)
+            raise
+        self.deadlines.record(stage, time.perf_counter() - started, model_id)
+        _annotate_attempt(span, attempt, result)
+        return result
+
+    async def _aattempt_stage_agent(
+        self,
+        span: Any,
+        stage: str,
+        agent: Agent,
+        prompt: str,
+        run: _RunContext,
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_attempt_stage_agent`."""
+
+        if self.deadlines is None:
+            return await self._ainvoke_agent(span, agent, prompt)
+        timeout = self.deadlines.stage_timeout(stage, run.deadline)
+        model_id = _agent_model_id(agent)
+        hedge_agent = self._hedge_agent(stage, agent)
+        hedge_delay = self.deadlines.hedge_delay(stage, model_id) if hedge_agent is not None else None
+        _annotate_deadline(span, timeout, hedge_delay)
+        started = time.perf_counter()
+        try:
+            result, attempt = await acall_with_deadline(
+                lambda: self._ainvoke_agent(None, agent, prompt),
+                timeout,
+                hedge_delay,
+                hedge=lambda: self._ainvoke_agent(None, hedge_agent, prompt),
+            )
+        except StageTimeoutError:
+            self.deadlines.record(stage, timeout, model_id)
+            raise
+        self.deadlines.record(stage, time.perf_counter() - started, model_id)
+        _annotate_attempt(span, attempt, result)
+        return result
+
+    def _hedge_agent(self, stage: str, agent: Agent) -> Optional[Agent]:
+        """Separate instance for the duplicate request; agno agents keep per-run state.
+
+        Only the stage agent is hedged; cheap cascade attempts escalate instead.
+        """
+
+        if agent is not self._stage_agent(stage):
+            return None
+        return self.hedge_agents.get(stage)
+
+    def _invoke_agent(self, span: Any, agent: Agent, prompt: str) -> Dict[str, Any]:
+        """Call the agent (streamed when enabled) and parse its JSON output."""
+
+        labels = _agent_labels(agent)
+        with METRICS.in_flight(*labels):
+            if not self.stream:
+                output = agent.run(prompt)
+                METRICS.record_usage(*labels, output)
+                return _parse_stage_output(span, output)
+
+            output = agent.run(prompt, stream=True)
+            if not is_stream(output):
+                METRICS.record_usage(*labels, output)
+                return _parse_stage_output(span, output)
+            parser = IncrementalJSONParser()
+            try:
+                for event in output:
+                    if parser.feed(stream_delta(event)) is not None:
+                        break
+            finally:
+                # Closing the generator aborts the HTTP stream once the object is complete.
+                close = getattr(output, "close", None)
+                if close is not None:
+                    close()
+            return _parse_streamed_output(span, parser)
+
+    async def _ainvoke_agent(self, span: Any, agent: Agent, prompt: str) -> Dict[str, Any]:
+        """Async counterpart of :meth:`_invoke_agent`."""
+
+        labels = _agent_labels(agent)
+        with METRICS.in_flight(*labels):
+            arun = getattr(agent, "arun", None)
+            if not self.stream or arun is None:
+                output = await arun_agent(agent, prompt)
+                METRICS.record_usage(*labels, output)
+                return _parse_stage_output(span, output)
+
+            output = arun(prompt, stream=True)
+            if inspect.isawaitable(output):
+                output = await output
+            if not is_stream(output):
+                METRICS.record_usage(*labels, output)
+                return _parse_stage_output(span, output)
+            parser = IncrementalJSONParser()
+            try:
+                async for event in output:
+                    if parser.feed(stream_delta(event)) is not None:
+                        break
+            finally:
+                aclose = getattr(output, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            return _parse_streamed_output(span, parser)
+
+
+def _checkpoint_stage(
+    run: _RunContext,
+    stage: str,
+    stage_input: Any,
+    result: Dict[str, Any],
+) -> None:
+    run.completed[stage] = {
+        "fingerprint": fingerprint_stage_input(stage_input),
+        "result": copy.deepcopy(result),
+    }
+
+
+def _postprocess(stage: str, result: Dict[str, Any], stage_input: Dict[str, Any]) -> Dict[str, Any]:
+    postprocessor = _STAGE_POSTPROCESSORS.get(stage)
+    return postprocessor(result, stage_input) if postprocessor is not None else result
+
+
+def _annotate_retry(span: Any, retry: int) -> None:
+    if span is not None:
+        span.set_attribute("agent.retry.count", retry)
+
+
+def _annotate_deadline(span: Any, timeout: Optional[float], hedge_delay: Optional[float]) -> None:
+    if span is None:
+        return
+    if timeout is not None:
+        span.set_attribute("agent.deadline.timeout_s", round(timeout, 3))
+    if hedge_delay is not None:
+        span.set_attribute("agent.hedge.delay_s", round(hedge_delay, 3))
+
+
+def _annotate_attempt(span: Any, attempt: int, result: Dict[str, Any]) -> None:
+    if span is None:
+        return
+    span.set_attribute("agent.hedge.winner", "hedge" if attempt == HEDGE_ATTEMPT else "primary")
+    _annotate_agent_structured_output(span, result)
+
+
+def _parse_stage_output(span: Any, raw: Any) -> Dict[str, Any]:
+    _annotate_agent_raw_output(span, raw)
+    result = _safe_json_loads(raw)
+    _annotate_agent_structured_output(span, result)
+    return result
+
+
+def _parse_streamed_output(span: Any, parser: IncrementalJSONParser) -> Dict[str, Any]:
+    if span is not None:
+        span.set_attribute("agent.stream.early_stop", parser.done)
+    if not isinstance(parser.result, dict):
+        # Stream ended before a complete object arrived; report it like a full response.
+        return _parse_stage_output(span, parser.text)
+    _annotate_agent_raw_output(span, parser.text)
+    _annotate_agent_structured_output(span, parser.result)
+    return parser.result
+
+
+def build_summary_input(
+    payload: Mapping[str, Any],
+    upstream: Mapping[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Assemble the SummaryAgent input from upstream results and context."""
+
+    return {
+        "socio_role": upstream["socio_role"],
+        "asset": upstream["asset"],
+        "behavior": upstream["behavior"],
+        "context": payload.get("context", {}),
+    }
+
+
+def stage_fingerprints(payload: Mapping[str, Any], result: Mapping[str, Any]) -> Dict[str, str]:
+    """Fingerprint every stage input of a finished run, for persistence."""
+
+    fingerprints = {
+        stage: fingerprint_stage_input(payload.get(stage, {})) for stage in _UPSTREAM_STAGES
+    }
+    fingerprints["summary"] = fingerprint_stage_input(build_summary_input(payload, result))
+    return fingerprints
+
+
+def _reuse_previous(
+    span: Any,
+    stage: str,
+    stage_input: Any,
+    previous: Optional[Mapping[str, Mapping[str, Any]]],
+) -> Optional[Dict[str, Any]]:
+    state = (previous or {}).get(stage)
+    if not state or not isinstance(state.get("result"), dict):
+        return None
+    if state.get("fingerprint") != fingerprint_stage_input(stage_input):
+        return None
+    if span is not None:
+        span.set_attribute("pipeline.stage.reused", True)
+    return copy.deepcopy(state["result"])
+
+
+def _agent_labels(agent: Any) -> Tuple[str, str]:
+    """``(agent name, model id)`` used to tag metrics."""
+
+    return getattr(agent, "name", None) or type(agent).__name__, _agent_model_id(agent)
+
+
+def _agent_model_id(agent: Any) -> str:
+    model = getattr(agent, "model", None)
+    return str(getattr(model, "id", None) or "")
+
+
+def _agent_system_prompt(agent: Any) -> str:
+    instructions = getattr(agent, "instructions", None)
+    if instructions is None:
+        return ""
+    if isinstance(instructions, (list, tuple)):
+        return "\n".join(str(item) for item in instructions)
+    return str(instructions)
+
+
+def build_default_pipeline(
+    model_id: str | None = None,
+    parallel: bool = False,
+    stage_observer: Optional[Callable[[str, float], None]] = None,
+    cache: Optional[StageResultCache] = None,
+    stream: bool = False,
+    deadlines: Optional[DeadlinePolicy] = None,
+    socio_cohorts: Optional[SocioRoleCohorts] = None,
+    micro_batch: Optional[MicroBatchPolicy] = None,
+    cascade: Optional[ModelCascade] = None,
+) -> WebankAgentPipeline:
     """Construct the pipeline with DashScope models."""
-    if model_id:
-        factory = build_model_factory(model_id)
-        socio_agent = build_socio_role_agent(model=factory())
-        asset_agent = build_asset_agent(model=factory())
-        behavior_agent = build_behavior_agent(model=factory())
-        summary_agent = build_summary_agent(model=factory())
-    else:
-        socio_agent = build_socio_role_agent()
-        asset_agent = build_asset_agent()
-        behavior_agent = build_behavior_agent()
-        summary_agent = build_summary_agent()
+    builders = {
+        "socio_role": build_socio_role_agent,
+        "asset": build_asset_agent,
+        "behavior": build_behavior_agent,
+        "summary": build_summary_agent,
+    }
+    factory = build_model_factory(model_id) if model_id else None
+
+    def stage_agent(stage: str) -> Agent:
+        return builders[stage](model=factory()) if factory is not None else builders[stage]()
+
+    agents = {stage: stage_agent(stage) for stage in builders}
+
+    cascade_agents: Dict[str, Agent] = {}
+    if cascade is not None:
+        cheap_factory = build_model_factory(cascade.model_id)
+        cascade_agents = {stage: builders[stage](model=cheap_factory()) for stage in cascade.stages}
+
+    hedge_agents: Dict[str, Agent] = {}
+    if deadlines is not None and deadlines.hedge_percentile is not None:
+        # The duplicate request must not share an agno Agent with the call it races.
+        hedge_agents = {stage: stage_agent(stage) for stage in builders}
 
     return WebankAgentPipeline(
-        socio_role_agent=socio_agent,
-        asset_agent=asset_agent,
-        behavior_agent=behavior_agent,
-        summary_agent=summary_agent,
+        socio_role_agent=agents["socio_role"],
+        asset_agent=agents["asset"],
+        behavior_agent=agents["behavior"],
+        summary_agent=agents["summary"],
+        parallel=parallel,
+        stage_observer=stage_observer,
+        cache=cache,
+        stream=stream,
+        deadlines=deadlines,
+        socio_cohorts=socio_cohorts,
+        micro_batch=micro_batch,
+        cascade=cascade,
+        cascade_agents=cascade_agents,
+        hedge_agents=hedge_agents,
     )
 
 
@@ -220,8 +1073,11 @@ def _safe_json_loads(output: Any) -> Dict[str, Any]:
         try:
             return json.loads(normalized)
         except json.JSONDecodeError as exc:
-            snippet = normalized[:200]
-            raise ValueError(f"Agent returned non-JSON payload: {snippet}") from exc
+            try:
+                return loads_repaired(normalized)
+            except ValueError:
+                snippet = normalized[:200]
+                raise ValueError(f"Agent returned non-JSON payload: {snippet}") from exc
     msg = f"Unsupported agent output type: {type(output)}"
     raise TypeError(msg)
 
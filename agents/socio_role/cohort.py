@@ -0,0 +1,146 @@
+"""Cohort bucketing so one SocioRoleAgent result can serve many similar users."""
+
+from __future__ import annotations
+
+import copy
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+DEFAULT_AGE_BOUNDS = (18, 25, 30, 35, 40, 45, 50, 60)
+DEFAULT_PROFESSION_ALIASES = {
+    "产品经理": "互联网",
+    "程序员": "互联网",
+    "开发": "互联网",
+    "运营": "互联网",
+    "工程师": "技术",
+    "教师": "教育",
+    "老师": "教育",
+    "医生": "医疗",
+    "护士": "医疗",
+    "公务员": "公职",
+    "会计": "财务",
+    "销售": "销售",
+    "学生": "学生",
+    "退休": "退休",
+}
+DEFAULT_CITY_TIERS = {
+    **{city: "一线" for city in ("北京", "上海", "广州", "深圳")},
+    **{
+        city: "新一线"
+        for city in (
+            "成都", "杭州", "重庆", "武汉", "西安", "苏州", "天津", "南京",
+            "长沙", "郑州", "东莞", "青岛", "沈阳", "宁波", "昆明",
+        )
+    },
+}
+DEFAULT_PASSTHROUGH = ("familyStatus",)
+
+
+@dataclass
+class CohortRules:
+    """Configurable mapping from a raw socio_role payload to its cohort profile.
+
+    Ages fall into bands delimited by ``age_bounds`` (minors always keep their
+    own band so ``minor_block`` stays exact), professions are normalized via
+    substring ``profession_aliases`` and cities via ``city_tiers``. Fields in
+    ``passthrough_fields`` are copied verbatim and become part of the key.
+    """
+
+    age_bounds: Sequence[int] = DEFAULT_AGE_BOUNDS
+    profession_aliases: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_PROFESSION_ALIASES))
+    city_tiers: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_CITY_TIERS))
+    default_city_tier: str = "其他"
+    passthrough_fields: Sequence[str] = DEFAULT_PASSTHROUGH
+
+    @classmethod
+    def from_file(cls, path: Path | str) -> "CohortRules":
+        """Load overrides from a JSON file with any of the dataclass fields."""
+
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(**data)
+
+    def age_band(self, age: Any) -> str:
+        try:
+            value = int(age)
+        except (TypeError, ValueError):
+            return "unknown"
+        if value < 18:
+            return "<18"
+        lower = None
+        for bound in sorted(self.age_bounds):
+            if value < bound:
+                return f"{lower}-{bound - 1}" if lower is not None else f"<{bound}"
+            lower = bound
+        return f"{lower}+"
+
+    def profession(self, raw: Any) -> str:
+        text = str(raw or "").strip().lower()
+        if not text:
+            return "unknown"
+        for alias, normalized in self.profession_aliases.items():
+            if alias.lower() in text:
+                return normalized
+        return text
+
+    def city_tier(self, raw: Any) -> str:
+        city = str(raw or "").strip().removesuffix("市")
+        if not city:
+            return "unknown"
+        return self.city_tiers.get(city, self.default_city_tier)
+
+    def profile(self, payload: Mapping[str, Any]) -> Dict[str, Any]:
+        """Return the cohort-level input sent to the agent instead of raw data."""
+
+        profile: Dict[str, Any] = {
+            "age_band": self.age_band(payload.get("age")),
+            "profession": self.profession(payload.get("profession") or payload.get("occupation")),
+            "city_tier": self.city_tier(
+                payload.get("city") or payload.get("residence_city") or payload.get("residenceCity")
+            ),
+        }
+        for key in self.passthrough_fields:
+            if payload.get(key) is not None:
+                profile[key] = payload[key]
+        return profile
+
+
+def cohort_key(profile: Mapping[str, Any]) -> str:
+    return json.dumps(profile, ensure_ascii=False, sort_keys=True)
+
+
+@dataclass
+class SocioRoleCohorts:
+    """Thread-safe store of one SocioRoleAgent result per cohort, with hit-rate stats."""
+
+    rules: CohortRules = field(default_factory=CohortRules)
+    hits: int = 0
+    misses: int = 0
+    _results: Dict[str, Dict[str, Any]] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._results.setdefault(key, copy.deepcopy(result))
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def render_report(self) -> str:
+        return (
+            f"[cohort] socio_role cohorts={len(self._results)} hits={self.hits} "
+            f"misses={self.misses} hit_rate={self.hit_rate:.1%}"
+        )
@@ -63,6 +63,37 @@ cmd_pipeline() {
     $skip_flag
 }
 
+cmd_pipeline_batch() {
+  local input="${1:?需要提供 JSONL 输入文件}"
+  local output="${2:-/tmp/insights_batch.jsonl}"
+  local workers="${3:-${WEBANK_BATCH_WORKERS:-4}}"
+  local skip_flag=""
+  if [[ "${WEBANK_SKIP_DB,,}" == "true" ]]; then
+    skip_flag="--skip-db"
+  fi
+  ensure_venv
+  activate_venv
+  export AGNO_MODEL_ID="${AGNO_MODEL_ID:-qwen-turbo-latest}"
+  export DASHSCOPE_BASE_URL="${DASHSCOPE_BASE_URL:-https://dashscope.aliyuncs.com/compatible-mode/v1}"
+  python -m agents.cli refresh-insights-batch \
+    --input "$input" \
+    --output "$output" \
+    --workers "$workers" \
+    $skip_flag
+}
+
+cmd_profile() {
+  local target="${1:-pipeline}"
+  local fixture="${2:-$DEFAULT_PIPELINE_INPUT}"
+  local iterations="${3:-5}"
+  ensure_venv
+  activate_venv
+  python -m agents.cli profile \
+    --target "$target" \
+    --fixture "$fixture" \
+    --iterations "$iterations"
+}
+
 cmd_backend() {
   ensure_venv
   activate_venv
@@ -88,6 +119,8 @@ usage() {
 用法:
   ./start.sh install          # 安装 Python 与前端依赖
   ./start.sh pipeline [input user_id output]
+  ./start.sh pipeline-batch input.jsonl [output.jsonl workers]  # 批量刷新，支持断点续跑
+  ./start.sh profile [target fixture iterations]  # 本地 span 瀑布图与 p50/p95，无需 LangSmith
   ./start.sh backend          # 启动 Flask 后端
   ./start.sh frontend         # 启动 Vite 前端
   ./start.sh all              # 打印多终端运行建议
@@ -100,6 +133,8 @@ main() {
   case "$cmd" in
     install)  cmd_install "$@";;
     pipeline) cmd_pipeline "$@";;
+    pipeline-batch) cmd_pipeline_batch "$@";;
+    profile)  cmd_profile "$@";;
     backend)  cmd_backend "$@";;
     frontend) cmd_frontend "$@";;
     all)      cmd_all;;
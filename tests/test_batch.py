@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict
+
+from agents.batch import BatchRefreshRunner, iter_batch_records, load_checkpoint, prune_output
+from agents.pipeline import WebankAgentPipeline
+
+
+@dataclass
+class _DummyAgent:
+    output: Any
+
+    def run(self, prompt: str) -> Any:
+        if "boom" in prompt:
+            raise RuntimeError("model unavailable")
+        return self.output
+
+
+def _pipeline_factory(observer) -> WebankAgentPipeline:
+    return WebankAgentPipeline(
+        socio_role_agent=_DummyAgent({"role_tags": ["白领"]}),
+        asset_agent=_DummyAgent({"risk_level": "中等"}),
+        behavior_agent=_DummyAgent({"intent_labels": ["follow_up"]}),
+        summary_agent=_DummyAgent({"summary": "保持定投"}),
+        stage_observer=observer,
+    )
+
+
+def test_batch_runner_checkpoints_and_resumes(
+    tmp_path: Path, pipeline_payload: Dict[str, Any]
+) -> None:
+    input_path = tmp_path / "users.jsonl"
+    broken = dict(pipeline_payload, asset={"note": "boom"})
+    lines = [
+        {"user_id": "U1", "payload": pipeline_payload},
+        {"user_id": "U2", "payload": broken},
+        {"user_id": "U3", "payload": pipeline_payload},
+    ]
+    input_path.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+    checkpoint_path = tmp_path / "out.ckpt"
+
+    output_path = tmp_path / "out.jsonl"
+    with output_path.open("a", encoding="utf-8") as output, checkpoint_path.open("a", encoding="utf-8") as checkpoint:
+        report = BatchRefreshRunner(_pipeline_factory, workers=2).run(
+            iter_batch_records(input_path), output, checkpoint
+        )
+
+    assert (report.succeeded, report.failed) == (2, 1)
+    assert len(report.stage_latencies["summary"]) == 2
+    assert "users/min" in report.render()
+    assert load_checkpoint(checkpoint_path) == {"U1", "U3"}
+
+    completed = load_checkpoint(checkpoint_path)
+    assert prune_output(output_path, completed) == 1
+    with output_path.open("a", encoding="utf-8") as output:
+        resumed = BatchRefreshRunner(_pipeline_factory, workers=2).run(
+            iter_batch_records(input_path), output, completed=completed
+        )
+
+    assert (resumed.skipped, resumed.failed, resumed.succeeded) == (2, 1, 0)
+    written = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert sorted(record["user_id"] for record in written) == ["U1", "U2", "U3"]
+
+
+def test_batch_runner_groups_users_for_micro_batching(
+    tmp_path: Path, pipeline_payload: Dict[str, Any]
+) -> None:
+    input_path = tmp_path / "users.jsonl"
+    broken = dict(pipeline_payload, asset={"note": "boom"})
+    lines = [
+        {"user_id": "U1", "payload": pipeline_payload},
+        {"user_id": "U1", "payload": broken},
+        {"user_id": "U2", "payload": broken},
+        {"user_id": "U3", "payload": pipeline_payload},
+    ]
+    input_path.write_text("\n".join(json.dumps(line) for line in lines), encoding="utf-8")
+    persisted = []
+
+    output = io.StringIO()
+    report = BatchRefreshRunner(
+        _pipeline_factory,
+        workers=1,
+        group_size=2,
+        persist=lambda user_id, result: persisted.append(user_id),
+    ).run(iter_batch_records(input_path), output)
+
+    assert (report.succeeded, report.failed, report.skipped) == (2, 1, 1)
+    assert sorted(persisted) == ["U1", "U3"]
+    written = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(record["user_id"] for record in written) == ["U1", "U2", "U3"]
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+import pytest
+
+from agents.behavior import signals
+from agents.behavior.builder import format_behavior_prompt
+from agents.behavior.compaction import MAX_PROMPT_CHARS, compact_behavior_payload
+from agents.behavior.signals import attach_ops_signals
+from agents.common.result_cache import fingerprint_stage_input
+from agents.pipeline import WebankAgentPipeline
+
+
+def _heavy_payload(n: int) -> Dict[str, Any]:
+    events = []
+    for idx in range(n):
+        events.append(
+            {
+                "type": "view_fund" if idx % 2 else "click_coupon",
+                "fundCode": f"{idx % 40:06d}",
+                "sessionId": f"s{idx // 50}",
+                "timestamp": f"2024-05-{1 + idx % 28:02d}T02:{idx % 60:02d}:00Z",
+            }
+        )
+    events.append({"type": "view_fund", "fundCode": "161725", "dwellSeconds": 95, "tab": "manager", "timestamp": "2024-04-01T00:00:00Z"})
+    events.append({"type": "search", "keyword": "高收益", "timestamp": "2024-04-02T00:00:00Z"})
+    events.append({"type": "enter_redemption", "fundCode": "161725", "timestamp": "2024-04-03T00:00:00Z"})
+    events.append({"type": "Search_Result", "timestamp": "2024-04-04T00:00:00Z"})
+    events.append({"type": "SEARCH", "keyword": "高收益", "timestamp": "2024-04-05T00:00:00Z"})
+    return {"events": events + events[:100], "market": {"index_change": -3.2}}
+
+
+def test_small_payload_is_left_untouched(pipeline_payload: Dict[str, Any]) -> None:
+    behavior = pipeline_payload["behavior"]
+
+    assert compact_behavior_payload(behavior) is behavior
+
+
+def test_heavy_history_is_compacted_and_bounded() -> None:
+    payload = _heavy_payload(5000)
+
+    compacted = compact_behavior_payload(payload)
+    summary = compacted["event_summary"]
+
+    assert summary["total_events"] == 5005
+    assert summary["by_type"]["search"] == 2 and "SEARCH" not in summary["by_type"]
+    assert summary["funds"][0] == {
+        "fundCode": "161725",
+        "views": 2,
+        "dwell_seconds": 95.0,
+        "max_dwell_seconds": 95.0,
+        "deep_tabs": ["manager"],
+        "last_at": "2024-04-03T00:00:00Z",
+    }
+    assert summary["search_keywords"] == [{"keyword": "高收益", "count": 2}]
+    assert {event["type"] for event in compacted["events"]} >= {"search", "Search_Result", "enter_redemption"}
+    assert compacted["market"] == {"index_change": -3.2}
+    assert compacted == compact_behavior_payload(payload)
+
+    prompt = format_behavior_prompt(payload)
+    assert len(prompt) < MAX_PROMPT_CHARS + 500
+    assert len(format_behavior_prompt(_heavy_payload(20000))) < MAX_PROMPT_CHARS + 500
+
+
+def test_ops_signals_thresholds_match_numpy_and_python_paths(monkeypatch: pytest.MonkeyPatch) -> None:
+    as_of = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    behaviors = [
+        # Daily user with one 40-minute session.
+        {"events": [
+            {"type": "view_fund", "sessionId": "a", "timestamp": "2024-05-31T10:00:00Z"},
+            {"type": "view_fund", "sessionId": "a", "timestamp": "2024-05-31T10:40:00Z"},
+        ]},
+        # Dormant user; the 2h gap splits two short sessions without session ids.
+        {"events": [
+            {"type": "view_fund", "timestamp": "2024-04-20T10:00:00Z"},
+            {"type": "view_fund", "timestamp": "2024-04-20T10:02:00Z"},
+            {"type": "view_fund", "timestamp": "2024-04-20T12:00:00Z"},
+        ]},
+        {"events": [], "last_login_at": "2024-01-01T00:00:00Z"},
+        {"events": []},
+    ]
+
+    result = signals.compute_ops_signals(behaviors, as_of=as_of)
+    monkeypatch.setattr(signals, "_NUMPY_AVAILABLE", False)
+    fallback = signals.compute_ops_signals(behaviors, as_of=as_of)
+
+    assert result == fallback
+    assert [item and (item["activeness"], item["session_length"], item["churn_risk"]) for item in result] == [
+        ("日活", "高频", "低"),
+        ("沉睡", "低频", "高"),
+        ("流失", "低频", "高"),
+        None,
+    ]
+    assert result[1]["avg_session_minutes"] == 1.0
+
+
+def test_pipeline_enforces_precomputed_ops_signals(pipeline_payload: Dict[str, Any]) -> None:
+    class _Agent:
+        def __init__(self, output: Dict[str, Any]) -> None:
+            self.output = output
+
+        def run(self, prompt: str) -> Dict[str, Any]:
+            self.last_prompt = prompt
+            return self.output
+
+    behavior = _Agent({"intents": [], "ops_signals": {"activeness": "日活", "risk_event": {"label": "避险"}}})
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_Agent({"role_tags": ["白领"]}),
+        asset_agent=_Agent({"risk_level": "中等"}),
+        behavior_agent=behavior,
+        summary_agent=_Agent({"summary": "保持定投"}),
+    )
+    (payload,) = attach_ops_signals([pipeline_payload])
+
+    result = pipeline.run(payload)
+
+    assert result["behavior"]["ops_signals"]["activeness"] == "流失"
+    assert result["behavior"]["ops_signals"]["risk_event"] == {"label": "避险"}
+    assert "precomputed_ops_signals" in behavior.last_prompt
+
+
+def test_precomputed_signals_keep_fingerprint_stable_across_runs(pipeline_payload: Dict[str, Any]) -> None:
+    as_of = datetime(2024, 6, 1, 9, tzinfo=timezone.utc)
+    (morning,) = attach_ops_signals([pipeline_payload], as_of=as_of)
+    (afternoon,) = attach_ops_signals([pipeline_payload], as_of=as_of + timedelta(hours=5))
+
+    assert set(morning["behavior"][signals.PRECOMPUTED_KEY]) == set(signals.PROMPT_SIGNAL_FIELDS)
+    assert fingerprint_stage_input(morning["behavior"]) == fingerprint_stage_input(afternoon["behavior"])
+    assert format_behavior_prompt(morning["behavior"]) == format_behavior_prompt(afternoon["behavior"])
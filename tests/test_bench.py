@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from agents.benchmarks import default_cases
+from agents.common.bench import BenchCase, compare, load_baseline, measure, save_baseline
+
+
+def test_compare_flags_regressions_against_saved_baseline(tmp_path: Path) -> None:
+    result = measure(BenchCase("noop", lambda: lambda: None), min_time=0.01, repeat=2)
+    baseline = tmp_path / "baseline.json"
+    save_baseline([result], baseline)
+    stored = load_baseline(baseline)
+
+    assert stored["noop"]["loops"] == result.loops
+    stored["noop"]["min_us"] = result.min_us / 2
+    (slower,) = compare([result], stored, threshold=0.15)
+    assert slower.regressed
+    stored["noop"]["min_us"] = result.min_us * 2
+    (faster,) = compare([result], stored, threshold=0.15)
+    assert not faster.regressed
+    (new,) = compare([result], {}, threshold=0.15)
+    assert new.ratio is None and not new.regressed
+
+
+def test_default_cases_run_on_small_payloads() -> None:
+    cases = [case for case in default_cases() if case.name.endswith("[small]")]
+
+    assert len({case.name for case in default_cases()}) == len(default_cases())
+    for case in cases:
+        case.setup()()
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import copy
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from agents.common import telemetry
+from agents.common.cascade import ModelCascade, check_stage_output
+from agents.common.microbatch import MicroBatchPolicy
+from agents.pipeline import WebankAgentPipeline
+
+
+@dataclass
+class _RecordingAgent:
+    output: Any
+    prompts: List[str] = field(default_factory=list)
+
+    def run(self, prompt: str, **kwargs: Any) -> Any:
+        self.prompts.append(prompt)
+        return self.output
+
+
+def test_check_stage_output_reports_schema_and_consistency_failures() -> None:
+    assert check_stage_output("behavior", {"ops_signals": {}}) == "missing_intents"
+    assert check_stage_output("asset", {"asset_level": "大众1", "risk_level": "R9"}) == (
+        "risk_level_out_of_range"
+    )
+    assert (
+        check_stage_output(
+            "behavior",
+            {"intents": [{"label": "产品研究", "score": 0.8}], "ops_signals": {}},
+        )
+        is None
+    )
+
+
+def test_pipeline_cascade_escalates_only_failing_stages(pipeline_payload: Dict[str, Any]) -> None:
+    heavy = {
+        "socio_role": _RecordingAgent({"role": {"occupation": "白领"}}),
+        "asset": _RecordingAgent({"asset_level": "中产1", "risk_level": "R3"}),
+        "behavior": _RecordingAgent({"intents": [], "ops_signals": {"churn_risk": "低"}}),
+        "summary": _RecordingAgent({"highlights": [], "recommendations": []}),
+    }
+    cheap = {
+        "socio_role": _RecordingAgent({"role": {"occupation": "学生"}}),
+        "asset": _RecordingAgent("not json at all"),
+        "behavior": _RecordingAgent({"ops_signals": {"churn_risk": "低"}}),
+        "summary": _RecordingAgent({"highlights": ["a"], "recommendations": []}),
+    }
+    cascade = ModelCascade()
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=heavy["socio_role"],
+        asset_agent=heavy["asset"],
+        behavior_agent=heavy["behavior"],
+        summary_agent=heavy["summary"],
+        cascade=cascade,
+        cascade_agents=cheap,
+    )
+
+    result = pipeline.run(pipeline_payload)
+
+    assert result["socio_role"]["role"]["occupation"] == "学生"
+    assert result["asset"]["risk_level"] == "R3"
+    assert result["behavior"]["intents"] == []
+    assert result["summary"]["highlights"] == ["a"]
+    assert [len(heavy[stage].prompts) for stage in heavy] == [0, 1, 1, 0]
+    assert cascade.escalation_rate("asset") == 1.0
+    assert cascade.escalation_rate("socio_role") == 0.0
+    assert cascade.reasons["behavior"] == {"missing_intents": 1}
+    assert "rate=100.0%" in cascade.render_report()
+
+
+class _BatchingAgent:
+    """Answers each ``### 用户 key`` section of a batched prompt via ``answer(key)``."""
+
+    def __init__(self, name: str, answer: Any) -> None:
+        self.name = name
+        self.answer = answer
+        self.prompts: List[str] = []
+
+    def run(self, prompt: str, **kwargs: Any) -> Any:
+        self.prompts.append(prompt)
+        keys = re.findall(r"### 用户 key: (u\d+)", prompt)
+        if not keys:
+            return self.answer(None)
+        return [{"key": key, "result": self.answer(key)} for key in keys]
+
+
+def test_run_many_batches_on_the_cheap_agent_and_escalates_per_user(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    def cheap_answer(key: Any) -> Dict[str, Any]:
+        return {"asset_level": "大众1", "risk_level": "R9" if key == "u1" else "R2"}
+
+    cheap = _BatchingAgent("CascadeCheapAsset", cheap_answer)
+    heavy = _BatchingAgent("CascadeBatchAsset", lambda key: {"asset_level": "中产1", "risk_level": "R3"})
+    cascade = ModelCascade(stages=("asset",))
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_BatchingAgent("S", lambda key: {"role": {}}),
+        asset_agent=heavy,
+        behavior_agent=_BatchingAgent("B", lambda key: {"intents": []}),
+        summary_agent=_BatchingAgent("Y", lambda key: {"highlights": []}),
+        micro_batch=MicroBatchPolicy(max_batch_size=4),
+        cascade=cascade,
+        cascade_agents={"asset": cheap},
+    )
+    payloads = {}
+    for index in range(3):
+        payload = copy.deepcopy(pipeline_payload)
+        payload["asset"]["note"] = f"user-{index}"
+        payloads[f"U{index}"] = payload
+
+    results = pipeline.run_many(payloads)
+
+    assert [results[user_id]["asset"]["risk_level"] for user_id in payloads] == ["R2", "R3", "R2"]
+    assert (len(cheap.prompts), len(heavy.prompts)) == (1, 1)
+    assert cascade.escalation_rate("asset") == 1 / 3
+    text = telemetry.render_metrics()
+    assert 'webank_stage_duration_seconds_count{agent="CascadeBatchAsset",model="",stage="asset.batch"} 1' in text
+    assert 'webank_stage_duration_seconds_count{agent="CascadeBatchAsset",model="",stage="asset"} 1' in text
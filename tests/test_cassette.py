@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from agno.agent import Agent
+from agno.models.dashscope import DashScope
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from agents.common.cassette import Cassette, CassetteClient, CassetteMiss
+from agents.models import ModelBackend, build_model_factory, open_cassette, set_model_backend
+
+
+class _FakeOpenAI:
+    def __init__(self) -> None:
+        self.calls: List[Any] = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs: Any) -> ChatCompletion:
+        self.calls.append(kwargs)
+        time.sleep(0.05)
+        return ChatCompletion.model_validate(
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": kwargs["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": '{"risk_level": "R3"}'},
+                    }
+                ],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17},
+            }
+        )
+
+
+@pytest.fixture(autouse=True)
+def _reset_backend() -> Any:
+    yield
+    set_model_backend(None)
+    open_cassette.cache_clear()
+
+
+def _agent() -> Agent:
+    return Agent(name="AssetAgent", model=build_model_factory("qwen-plus")(), instructions="系统提示")
+
+
+def test_record_then_replay_without_network(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fake = _FakeOpenAI()
+    monkeypatch.setattr(DashScope, "get_client", lambda self: fake)
+    cassette = tmp_path / "models.jsonl"
+
+    set_model_backend(ModelBackend(mode="record", cassette_path=str(cassette)))
+    recorded = _agent().run("资产分析")
+    assert len(fake.calls) == 1 and cassette.exists()
+
+    open_cassette.cache_clear()
+    set_model_backend(ModelBackend(mode="replay", cassette_path=str(cassette), latency_scale=1.0))
+    started = time.perf_counter()
+    replayed = _agent().run("资产分析")
+
+    assert len(fake.calls) == 1
+    assert replayed.content == recorded.content == '{"risk_level": "R3"}'
+    assert time.perf_counter() - started >= 0.05
+    assert replayed.metrics.input_tokens == 12
+
+
+def test_replay_miss_is_reported(tmp_path: Path) -> None:
+    set_model_backend(ModelBackend(mode="replay", cassette_path=str(tmp_path / "empty.jsonl")))
+    model = build_model_factory("qwen-plus")()
+
+    with pytest.raises(CassetteMiss):
+        model.get_client().chat.completions.create(
+            model="qwen-plus", messages=[{"role": "user", "content": "未录制"}]
+        )
+
+
+def _chunk(index: int) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "qwen-plus",
+            "choices": [{"index": 0, "delta": {"content": f"片段{index}"}, "finish_reason": None}],
+        }
+    )
+
+
+class _FakeStreamingOpenAI:
+    def __init__(self) -> None:
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs: Any) -> Any:
+        return iter([_chunk(index) for index in range(5)])
+
+
+class _FakeAsyncStreamingOpenAI(_FakeStreamingOpenAI):
+    async def create(self, **kwargs: Any) -> Any:
+        async def chunks() -> Any:
+            for index in range(5):
+                yield _chunk(index)
+
+        return chunks()
+
+
+def _contents(chunks: List[ChatCompletionChunk]) -> List[str]:
+    return [chunk.choices[0].delta.content or "" for chunk in chunks]
+
+
+def test_streams_stopped_early_are_still_recorded(tmp_path: Path) -> None:
+    request = {"model": "qwen-plus", "messages": [{"role": "user", "content": "流式"}], "stream": True}
+    path = tmp_path / "stream.jsonl"
+    recorder = CassetteClient(Cassette(path), "record", inner=_FakeStreamingOpenAI())
+    stream = recorder.chat.completions.create(**request)
+    received = [next(stream), next(stream)]
+    stream.close()
+
+    replayer = CassetteClient(Cassette(path), "replay")
+    assert _contents(list(replayer.chat.completions.create(**request))) == _contents(received) == ["片段0", "片段1"]
+
+    async def record_async() -> List[ChatCompletionChunk]:
+        arecorder = CassetteClient(Cassette(path), "record", inner=_FakeAsyncStreamingOpenAI(), is_async=True)
+        astream = await arecorder.chat.completions.create(**request)
+        areceived = []
+        async for chunk in astream:
+            areceived.append(chunk)
+            break
+        await astream.aclose()
+        return areceived
+
+    async def replay_async() -> List[ChatCompletionChunk]:
+        areplayer = CassetteClient(Cassette(path), "replay", is_async=True)
+        return [chunk async for chunk in await areplayer.chat.completions.create(**request)]
+
+    assert _contents(asyncio.run(record_async())) == ["片段0"]
+    assert len(Cassette(path)) == 2
+    assert _contents(asyncio.run(replay_async())) == ["片段0", "片段1"]
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-from typing import Dict, List
+import asyncio
+from typing import Any, Dict, List
 
+from agents.conversation import ConversationService, memory
 from agents.conversation.builder import format_conversation_prompt
 
 
@@ -25,3 +27,64 @@ def test_conversation_prompt_includes_sections(
     assert "## 历史对话" in prompt
     assert "## 用户洞察" in prompt
     assert "请帮我看看基金" in prompt
+
+
+class _AsyncReplyAgent:
+    name = "ConversationAgent"
+
+    async def arun(self, prompt: str) -> Dict[str, Any]:
+        self.last_prompt = prompt
+        return {"response": "建议分批定投。", "actions": []}
+
+
+def test_agenerate_reply_uses_async_agent_and_records_history(monkeypatch) -> None:
+    monkeypatch.setattr(memory, "_USE_MEMORY", True)
+    service = ConversationService.__new__(ConversationService)
+    service.history_limit = 10
+    service.agent = _AsyncReplyAgent()
+
+    result = asyncio.run(
+        service.agenerate_reply(user_id="UTSZ", message="要不要加仓？", session_id="sess-async")
+    )
+
+    assert result["response"] == "建议分批定投。"
+    history = service.fetch_history("sess-async")
+    assert [item["sender"] for item in history] == ["user", "assistant"]
+
+
+def test_refresh_user_insights_persists_only_changed_stages(
+    monkeypatch, pipeline_payload: Dict[str, Any]
+) -> None:
+    from agents.conversation import service as service_module
+    from agents.pipeline import WebankAgentPipeline, stage_fingerprints
+
+    class _Agent:
+        def __init__(self, output: Dict[str, Any]) -> None:
+            self.output = output
+
+        def run(self, prompt: str) -> Dict[str, Any]:
+            return self.output
+
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_Agent({"role_tags": ["白领"]}),
+        asset_agent=_Agent({"risk_level": "中等"}),
+        behavior_agent=_Agent({"intent_labels": ["follow_up"]}),
+        summary_agent=_Agent({"summary": "保持定投"}),
+    )
+    baseline = pipeline.run(pipeline_payload)
+    stored = {
+        stage: {"fingerprint": fingerprint, "result": baseline[stage]}
+        for stage, fingerprint in stage_fingerprints(pipeline_payload, baseline).items()
+    }
+    written: List[str] = []
+    monkeypatch.setattr(service_module, "fetch_stage_states", lambda user_id: stored)
+    monkeypatch.setattr(service_module, "persist_stage_states", lambda *args: None)
+    for name in ("persist_socio_role", "persist_asset_snapshot", "persist_behavior_insight", "persist_summary"):
+        monkeypatch.setattr(service_module, name, lambda user_id, payload, _n=name: written.append(_n))
+
+    service = ConversationService.__new__(ConversationService)
+    behavior_changed = dict(pipeline_payload, behavior={"events": []})
+    service.refresh_user_insights("UTSZ", behavior_changed, pipeline)
+
+    # Behavior's slice changed; its result did not, so summary is reused as well.
+    assert written == ["persist_behavior_insight"]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from agents import db
+from agents.common import telemetry
+
+
+class _FakeConnection:
+    def __init__(self) -> None:
+        self.alive = True
+        self.closed = False
+
+    def ping(self, reconnect: bool = False) -> None:
+        if not self.alive:
+            raise ConnectionError("gone")
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _pool(opened: List[_FakeConnection], **kwargs: Any) -> db.ConnectionPool:
+    def connect() -> _FakeConnection:
+        conn = _FakeConnection()
+        opened.append(conn)
+        return conn
+
+    return db.ConnectionPool(connect, name="test", **kwargs)
+
+
+def test_pool_reuses_bounds_and_replaces_connections() -> None:
+    opened: List[_FakeConnection] = []
+    pool = _pool(opened, min_size=0, max_size=2, ping_after=0.0, timeout=0.05)
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first and len(opened) == 1
+
+    second = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    # A waiter gets the connection as soon as it is released.
+    released = threading.Timer(0.01, pool.release, args=(second,))
+    pool.timeout = 1.0
+    released.start()
+    assert pool.acquire() is second
+
+    first.alive = False
+    pool.release(first)
+    replacement = pool.acquire()
+    assert replacement is not first and first.closed
+    assert pool.size == 2
+
+    pool.max_age = -1.0
+    pool.release(replacement)
+    assert replacement.closed and pool.size == 1
+
+    text = telemetry.render_metrics()
+    assert 'webank_db_pool_connections_total{event="opened",pool="test"}' in text
+    assert 'webank_db_pool_in_use{pool="test"} 1' in text
+    assert 'webank_db_pool_wait_seconds_count{pool="test"}' in text
+
+
+def test_db_session_shares_one_connection(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(tmp_path / "pool.sqlite3"))
+    monkeypatch.setenv("WEBANK_DB_POOL_MIN", "0")
+    connects: List[Any] = []
+    original = db._connect
+    monkeypatch.setattr(db, "_connect", lambda: connects.append(1) or original())
+    monkeypatch.setattr(db, "_POOLS", {})
+
+    with db.db_cursor() as (_, cursor):
+        cursor.execute("CREATE TABLE kv (k TEXT, v TEXT)")
+    with db.db_session():
+        for index in range(3):
+            with db.db_cursor() as (_, cursor):
+                cursor.execute("INSERT INTO kv VALUES (%s, %s)", (str(index), "x"))
+        with db.db_cursor() as (_, cursor):
+            cursor.execute("SELECT COUNT(*) AS n FROM kv")
+            assert cursor.fetchone() == {"n": 3}
+
+    assert len(connects) == 1
+    db.close_pools()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict
 
 from agents.fund_advice.service import FundAdviceService
@@ -23,3 +24,18 @@ def test_fund_advice_service_returns_normalized_content(sample_fund_payload: Dic
 
     assert "分散" in result
     assert "净值" in result
+
+
+class _AsyncStaticAgent(_StaticAgent):
+    async def arun(self, prompt: str) -> Any:
+        return self.run(prompt)
+
+
+def test_fund_advice_agenerate_advice(sample_fund_payload: Dict[str, Any]) -> None:
+    service = FundAdviceService.__new__(FundAdviceService)
+    service.agent = _AsyncStaticAgent({"content": "保持分散配置，关注净值波动。"})
+
+    result = asyncio.run(service.agenerate_advice(sample_fund_payload))
+
+    assert result == "保持分散配置，关注净值波动。"
+    assert service.agent.last_prompt
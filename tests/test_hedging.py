@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+import pytest
+
+from agents.common.hedging import (
+    HEDGE_ATTEMPT,
+    PRIMARY_ATTEMPT,
+    DeadlinePolicy,
+    StageTimeoutError,
+    acall_with_deadline,
+    call_with_deadline,
+)
+from agents.pipeline import PipelineStageError, WebankAgentPipeline
+
+
+class _FirstCallSlow:
+    """The first call stalls; later calls answer immediately."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            time.sleep(self.delay)
+        return {"call": call}
+
+
+def test_call_with_deadline_hedges_slow_primary() -> None:
+    attempt = _FirstCallSlow(delay=0.5)
+
+    result, winner = call_with_deadline(attempt, timeout=2.0, hedge_delay=0.05)
+
+    assert (result, winner) == ({"call": 2}, HEDGE_ATTEMPT)
+
+
+def test_call_with_deadline_raises_on_timeout() -> None:
+    with pytest.raises(StageTimeoutError):
+        call_with_deadline(lambda: time.sleep(0.5), timeout=0.05)
+
+
+def test_acall_with_deadline_prefers_fast_primary() -> None:
+    async def attempt() -> str:
+        return "ok"
+
+    assert asyncio.run(acall_with_deadline(attempt, timeout=1.0, hedge_delay=0.5)) == (
+        "ok",
+        PRIMARY_ATTEMPT,
+    )
+
+
+def test_policy_reserves_summary_share_of_budget() -> None:
+    policy = DeadlinePolicy(budget_seconds=10, stage_timeouts={"summary": 4, "asset": 8})
+    deadline = policy.start()
+
+    assert policy.stage_timeout("asset", deadline) == pytest.approx(6, abs=0.1)
+    assert policy.stage_timeout("summary", deadline) == pytest.approx(4, abs=0.1)
+    with pytest.raises(StageTimeoutError):
+        policy.stage_timeout("asset", time.monotonic())
+
+
+def test_pipeline_stage_hedges_after_latency_percentile(pipeline_payload: Dict[str, Any]) -> None:
+    class _Agent:
+        def __init__(self, output: Dict[str, Any], slow_first: bool = False) -> None:
+            self.output = output
+            self.calls = 0
+            self.slow = _FirstCallSlow(0.5) if slow_first else None
+
+        def run(self, prompt: str) -> Dict[str, Any]:
+            self.calls += 1
+            if self.slow is not None:
+                self.slow()
+            return self.output
+
+    policy = DeadlinePolicy(budget_seconds=5, hedge_percentile=95, min_samples=3)
+    for _ in range(3):
+        policy.record("asset", 0.01)
+    asset = _Agent({"risk_level": "中等"}, slow_first=True)
+    hedge = _Agent({"risk_level": "中等"})
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_Agent({"role_tags": ["白领"]}),
+        asset_agent=asset,
+        behavior_agent=_Agent({"intent_labels": ["follow_up"]}),
+        summary_agent=_Agent({"summary": "保持定投"}),
+        deadlines=policy,
+        hedge_agents={"asset": hedge},
+    )
+
+    started = time.perf_counter()
+    result = pipeline.run(pipeline_payload)
+
+    assert result["asset"] == {"risk_level": "中等"}
+    # The duplicate request went to its own agent instance.
+    assert (asset.calls, hedge.calls) == (1, 1)
+    assert time.perf_counter() - started < 0.4
+
+
+def test_policy_windows_are_per_model_and_timeouts_count_at_the_deadline(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    class _SlowAgent:
+        def run(self, prompt: str) -> Dict[str, Any]:
+            time.sleep(0.3)
+            return {"risk_level": "中等"}
+
+    policy = DeadlinePolicy(stage_timeouts={"asset": 0.05}, hedge_percentile=50, min_samples=1)
+    policy.record("asset", 0.01, "qwen-turbo")
+    assert policy.hedge_delay("asset", "qwen-turbo") == pytest.approx(0.01)
+    assert policy.hedge_delay("asset") is None
+
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_SlowAgent(),
+        asset_agent=_SlowAgent(),
+        behavior_agent=_SlowAgent(),
+        summary_agent=_SlowAgent(),
+        deadlines=policy,
+    )
+    with pytest.raises(PipelineStageError):
+        pipeline.run(pipeline_payload)
+
+    assert policy.hedge_delay("asset") == pytest.approx(0.05)
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from agents.common.json_repair import loads_repaired
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+        ("{'a': 'it\\'s', 'b': \"x\"}", {"a": "it's", "b": "x"}),
+        ('{"a": {"b": "cut off', {"a": {"b": "cut off"}}),
+        ('{"a": 1, "b": ', {"a": 1}),
+        ('{"a": [1, 2, {"c": tr', {"a": [1, 2, {}]}),
+        ('{"a": "line\nbreak"}} trailing', {"a": "line\nbreak"}),
+    ],
+)
+def test_loads_repaired_fixes_common_defects(raw: str, expected: Any) -> None:
+    assert loads_repaired(raw) == expected
+
+
+def test_loads_repaired_rejects_prose() -> None:
+    with pytest.raises(ValueError):
+        loads_repaired("抱歉，我无法完成该请求。")
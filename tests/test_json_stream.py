@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from agents.common.json_stream import IncrementalJSONParser
+
+
+def test_parser_emits_object_when_closing_brace_arrives() -> None:
+    parser = IncrementalJSONParser()
+    chunks = ["好的，结果如下：\n```json\n{\"agent\": \"Behav", "iorAgent\", \"ops\": {\"a\"", ": 1}}", "\n```\n以上。"]
+
+    emitted = [parser.feed(chunk) for chunk in chunks]
+
+    assert emitted[:2] == [None, None]
+    assert emitted[2] == {"agent": "BehaviorAgent", "ops": {"a": 1}}
+    assert parser.done
+    assert parser.text.endswith("}}")
+
+
+def test_parser_ignores_braces_inside_strings_and_prose() -> None:
+    parser = IncrementalJSONParser()
+
+    parser.feed('参考 {示例} 之后：{"tip": "点击 \\"}\\" 按钮", ')
+    result = parser.feed('"n": [1, {"x": 2}]} trailing {')
+
+    assert result == {"tip": '点击 "}" 按钮', "n": [1, {"x": 2}]}
+
+
+def test_parser_handles_one_character_chunks_and_prose_split_across_chunks() -> None:
+    text = '先看 {示例 {嵌套}} 再看：{"tip": "a{b}", "n": [1, {"x": 2}]} 结束'
+    parser = IncrementalJSONParser()
+
+    emitted = [parser.feed(char) for char in text]
+
+    assert emitted.count(None) == text.index("]}") + 1
+    assert parser.result == {"tip": "a{b}", "n": [1, {"x": 2}]}
+    assert parser.text == text[: text.index("]}") + 2]
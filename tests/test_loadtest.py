@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from agents.common.stub_llm import LatencyDistribution, StubChatServer
+from agents.conversation import memory
+from agents.loadtest import ConversationLoadTest, build_stub_service, init_sqlite_store
+
+
+def test_latency_distribution_parse_and_sample() -> None:
+    rng = random.Random(7)
+    uniform = LatencyDistribution.parse("uniform:0.2,0.4")
+
+    assert all(0.2 <= uniform.sample(rng) <= 0.4 for _ in range(100))
+    assert LatencyDistribution.parse("fixed:0.5").sample(rng) == 0.5
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("normal:1")
+
+
+def test_loadtest_against_stub_with_sqlite_store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    db_file = tmp_path / "loadtest.sqlite3"
+    monkeypatch.setattr(memory, "_USE_MEMORY", False)
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(db_file))
+
+    with StubChatServer(latency=LatencyDistribution.parse("fixed:0.01"), seed=1) as stub:
+        loadtest = ConversationLoadTest(service=build_stub_service(stub.base_url), users=3, turns=2, seed=1)
+        init_sqlite_store(db_file, loadtest.user_ids())
+        report = loadtest.run()
+
+    assert report.total_turns == 6
+    assert report.errors == report.degraded == 0
+    assert stub.requests == 6
+    with sqlite3.connect(str(db_file)) as conn:
+        (messages,) = conn.execute("SELECT COUNT(*) FROM ai_session_messages").fetchone()
+        (sessions,) = conn.execute("SELECT COUNT(*) FROM ai_sessions").fetchone()
+    assert (messages, sessions) == (12, 3)
+    assert "throughput=" in report.render()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import copy
+import re
+from typing import Any, Dict, List
+
+from agents.common.microbatch import MicroBatchPolicy, pack_batches, split_batch_output
+from agents.pipeline import WebankAgentPipeline
+
+_KEY_RE = re.compile(r"### 用户 key: (u\d+)")
+
+
+class _BatchAwareAgent:
+    """Answers multi-user prompts with a JSON array, optionally dropping keys."""
+
+    def __init__(self, output: Dict[str, Any], drop: int = 0) -> None:
+        self.output = output
+        self.drop = drop
+        self.prompts: List[str] = []
+
+    def run(self, prompt: str, **kwargs: Any) -> Any:
+        self.prompts.append(prompt)
+        keys = _KEY_RE.findall(prompt)
+        if not keys:
+            if "boom" in prompt:
+                raise RuntimeError("model unavailable")
+            return dict(self.output)
+        answered = keys[: len(keys) - self.drop]
+        return [{"key": key, "result": dict(self.output)} for key in answered]
+
+
+def test_pack_batches_respects_size_and_prompt_length() -> None:
+    prompts = [("u0", "a" * 10), ("u1", "b" * 10), ("u2", "c" * 10), ("u3", "d" * 50)]
+
+    batches = pack_batches(prompts, max_size=2, max_chars=40)
+
+    assert [[key for key, _ in batch] for batch in batches] == [["u0", "u1"], ["u2"], ["u3"]]
+
+
+def test_split_batch_output_drops_unknown_duplicate_and_empty_entries() -> None:
+    parsed = [
+        {"key": "u0", "result": {"ok": 1}},
+        {"key": "u1", "result": {"ok": 2}},
+        {"key": "u1", "result": {"ok": 3}},
+        {"key": "u2", "result": {}},
+        {"key": "zz", "result": {"ok": 4}},
+    ]
+
+    assert split_batch_output(parsed, ["u0", "u1", "u2"]) == {"u0": {"ok": 1}}
+
+
+def test_run_many_batches_stages_and_falls_back_per_user(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    asset_agent = _BatchAwareAgent({"risk_level": "中等"}, drop=1)
+    summary_agent = _BatchAwareAgent({"summary": "保持定投"})
+    policy = MicroBatchPolicy(max_batch_size=4)
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_BatchAwareAgent({"role_tags": ["白领"]}),
+        asset_agent=asset_agent,
+        behavior_agent=_BatchAwareAgent({"intent_labels": ["follow_up"]}),
+        summary_agent=summary_agent,
+        micro_batch=policy,
+    )
+    payloads = {}
+    for index in range(3):
+        payload = copy.deepcopy(pipeline_payload)
+        payload["asset"]["note"] = f"user-{index}"
+        payload["context"] = {"user": index}
+        payloads[f"U{index}"] = payload
+    payloads["U3"] = dict(copy.deepcopy(pipeline_payload), asset={"note": "boom"})
+
+    results = pipeline.run_many(payloads)
+
+    assert list(results) == ["U0", "U1", "U2", "U3"]
+    for user_id in ("U0", "U1", "U2"):
+        assert results[user_id]["asset"]["risk_level"] == "中等"
+        assert results[user_id]["summary"]["summary"] == "保持定投"
+    # The dropped user was retried alone, and that single call failed.
+    assert isinstance(results["U3"], RuntimeError)
+    assert len(asset_agent.prompts) == 2
+    assert len(summary_agent.prompts) == 1
+    assert policy.batch_size("asset") == 2
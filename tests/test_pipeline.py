@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 from dataclasses import dataclass
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
 
-from agents.pipeline import WebankAgentPipeline
+import pytest
+
+from agents.common import telemetry
+from agents.common.result_cache import StageResultCache
+from agents.pipeline import PipelineStageError, WebankAgentPipeline, stage_fingerprints
 
 
 @dataclass
 class _DummyAgent:
     output: Any
 
-    def run(self, prompt: str) -> Any:  # pragma: no cover - simple stub
+    def run(self, prompt: str, **kwargs: Any) -> Any:  # pragma: no cover - simple stub
         self.last_prompt = prompt
         return self.output
 
@@ -29,3 +36,233 @@ def test_pipeline_merges_agent_outputs(pipeline_payload: Dict[str, Any]) -> None
     assert result["asset"]["risk_level"] == "中等"
     assert result["behavior"]["intent_labels"] == ["follow_up"]
     assert result["summary"]["summary"] == "保持定投"
+
+
+@dataclass
+class _SlowAgent:
+    output: Any
+    barrier: threading.Barrier
+
+    def run(self, prompt: str) -> Any:
+        # Every upstream stage must be in flight at once to pass the barrier.
+        self.barrier.wait(timeout=5)
+        return self.output
+
+
+def test_pipeline_parallel_mode_runs_upstream_concurrently(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    barrier = threading.Barrier(3)
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_SlowAgent({"role_tags": ["白领"]}, barrier),
+        asset_agent=_SlowAgent('{"risk_level":"中等"}', barrier),
+        behavior_agent=_SlowAgent({"intent_labels": ["follow_up"]}, barrier),
+        summary_agent=_DummyAgent({"summary": "保持定投"}),
+        parallel=True,
+    )
+
+    result = pipeline.run(pipeline_payload)
+
+    assert result["asset"]["risk_level"] == "中等"
+    assert result["summary"]["summary"] == "保持定投"
+    assert '"risk_level": "中等"' in pipeline.summary_agent.last_prompt
+
+
+@pytest.mark.skipif(not telemetry._OTEL_AVAILABLE, reason="opentelemetry not installed")
+def test_parallel_stage_spans_are_children_of_the_pipeline_span(
+    pipeline_payload: Dict[str, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(telemetry.trace, "get_tracer", lambda *args, **kwargs: provider.get_tracer("test"))
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_DummyAgent({"role_tags": ["白领"]}),
+        asset_agent=_DummyAgent('{"risk_level":"中等"}'),
+        behavior_agent=_DummyAgent({"intent_labels": ["follow_up"]}),
+        summary_agent=_DummyAgent({"summary": "保持定投"}),
+        parallel=True,
+    )
+
+    pipeline.run(pipeline_payload)
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    root = spans["pipeline.run"]
+    assert root.parent is None
+    for stage in ("socio_role", "asset", "behavior", "summary"):
+        span = spans[f"agent.{stage}"]
+        assert span.context.trace_id == root.context.trace_id
+        assert span.parent.span_id == root.context.span_id
+
+
+@dataclass
+class _AsyncDummyAgent:
+    output: Any
+
+    async def arun(self, prompt: str) -> Any:
+        self.last_prompt = prompt
+        return self.output
+
+
+def test_pipeline_arun_gathers_upstream_stages(pipeline_payload: Dict[str, Any]) -> None:
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_AsyncDummyAgent({"role_tags": ["白领"]}),
+        asset_agent=_AsyncDummyAgent('{"risk_level":"中等"}'),
+        # Sync-only stubs are bridged through a worker thread.
+        behavior_agent=_DummyAgent({"intent_labels": ["follow_up"]}),
+        summary_agent=_AsyncDummyAgent({"summary": "保持定投"}),
+    )
+
+    result = asyncio.run(pipeline.arun(pipeline_payload))
+
+    assert result["socio_role"]["role_tags"] == ["白领"]
+    assert result["behavior"]["intent_labels"] == ["follow_up"]
+    assert result["summary"]["summary"] == "保持定投"
+
+
+@dataclass
+class _CountingAgent:
+    output: Any
+    calls: int = 0
+
+    def run(self, prompt: str) -> Any:
+        self.calls += 1
+        return self.output
+
+
+def test_pipeline_cache_skips_unchanged_stages(
+    tmp_path: Path, pipeline_payload: Dict[str, Any]
+) -> None:
+    agents = {
+        "socio_role_agent": _CountingAgent({"role_tags": ["白领"]}),
+        "asset_agent": _CountingAgent('{"risk_level":"中等"}'),
+        "behavior_agent": _CountingAgent({"intent_labels": ["follow_up"]}),
+        "summary_agent": _CountingAgent({"summary": "保持定投"}),
+    }
+    cache_path = tmp_path / "stage_cache.sqlite"
+    first = WebankAgentPipeline(**agents, cache=StageResultCache.from_path(cache_path))
+    first.run(pipeline_payload)
+
+    # A fresh process only shares the SQLite tier.
+    second = WebankAgentPipeline(**agents, cache=StageResultCache.from_path(cache_path))
+    changed = dict(pipeline_payload, asset={"total_assets": 1})
+    result = second.run(changed)
+
+    assert result["summary"]["summary"] == "保持定投"
+    assert agents["socio_role_agent"].calls == 1
+    assert agents["behavior_agent"].calls == 1
+    assert agents["asset_agent"].calls == 2
+    # Summary is served from cache too: its prompt is rendered from unchanged results.
+    assert agents["summary_agent"].calls == 1
+    assert (second.cache.hits, second.cache.misses) == (3, 1)
+
+
+def test_pipeline_reuses_previous_results_for_unchanged_slices(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    agents = {
+        "socio_role_agent": _CountingAgent({"role_tags": ["白领"]}),
+        "asset_agent": _CountingAgent({"risk_level": "中等"}),
+        "behavior_agent": _CountingAgent({"intent_labels": ["follow_up"]}),
+        "summary_agent": _CountingAgent({"summary": "保持定投"}),
+    }
+    pipeline = WebankAgentPipeline(**agents)
+    first = pipeline.run(pipeline_payload)
+    previous = {
+        stage: {"fingerprint": fingerprint, "result": first[stage]}
+        for stage, fingerprint in stage_fingerprints(pipeline_payload, first).items()
+    }
+
+    pipeline.run(pipeline_payload, previous=previous)
+    assert [agent.calls for agent in agents.values()] == [1, 1, 1, 1]
+
+    agents["asset_agent"].output = {"risk_level": "进取"}
+    changed = dict(pipeline_payload, asset={"total_assets": 1})
+    result = pipeline.run(changed, previous=previous)
+
+    assert result["asset"]["risk_level"] == "进取"
+    assert [agent.calls for agent in agents.values()] == [1, 2, 1, 2]
+
+
+@dataclass
+class _StreamingAgent:
+    chunks: List[str]
+    consumed: int = 0
+    closed: bool = False
+
+    def run(self, prompt: str, stream: bool = False) -> Any:
+        def _events() -> Iterator[str]:
+            try:
+                for chunk in self.chunks:
+                    self.consumed += 1
+                    yield chunk
+            finally:
+                self.closed = True
+
+        return _events()
+
+
+def test_pipeline_stream_mode_stops_after_json_closes(pipeline_payload: Dict[str, Any]) -> None:
+    behavior = _StreamingAgent(['```json\n{"intents": [', '"follow_up"]}', "\n```", "多余的解释"])
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_DummyAgent({"role_tags": ["白领"]}),
+        asset_agent=_DummyAgent('{"risk_level":"中等"}'),
+        behavior_agent=behavior,
+        summary_agent=_DummyAgent({"summary": "保持定投"}),
+        stream=True,
+    )
+
+    result = pipeline.run(pipeline_payload)
+
+    assert result["behavior"] == {"intents": ["follow_up"]}
+    assert behavior.consumed == 2
+    assert behavior.closed
+
+
+class _FlakyAgent:
+    """Returns unusable text for the first ``failures`` calls."""
+
+    def __init__(self, output: Dict[str, Any], failures: int) -> None:
+        self.output = output
+        self.failures = failures
+        self.calls = 0
+
+    def run(self, prompt: str, **kwargs: Any) -> Any:
+        self.calls += 1
+        if self.calls <= self.failures:
+            return "抱歉，输出中断"
+        return self.output
+
+
+def test_pipeline_retries_only_failing_stage_and_resumes_from_checkpoint(
+    pipeline_payload: Dict[str, Any],
+) -> None:
+    upstream = {
+        "socio_role": _CountingAgent({"role_tags": ["白领"]}),
+        "asset": _CountingAgent({"risk_level": "中等"}),
+        "behavior": _CountingAgent({"intent_labels": ["follow_up"]}),
+    }
+    summary = _FlakyAgent({"summary": "保持定投"}, failures=3)
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=upstream["socio_role"],
+        asset_agent=upstream["asset"],
+        behavior_agent=upstream["behavior"],
+        summary_agent=summary,
+        stage_retries=1,
+    )
+
+    with pytest.raises(PipelineStageError) as excinfo:
+        pipeline.run(pipeline_payload)
+    assert excinfo.value.stage == "summary"
+    assert summary.calls == 2
+    assert set(excinfo.value.checkpoint) == {"socio_role", "asset", "behavior"}
+
+    result = pipeline.run(pipeline_payload, previous=excinfo.value.checkpoint)
+
+    assert result["summary"] == {"summary": "保持定投"}
+    assert summary.calls == 4
+    assert [agent.calls for agent in upstream.values()] == [1, 1, 1]
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from agents.common.profiling import summarize_profiles
+
+
+class _Agent:
+    def __init__(self, output: Dict[str, Any]) -> None:
+        self.output = output
+
+    def run(self, prompt: str, **kwargs: Any) -> Dict[str, Any]:
+        return self.output
+
+
+def test_pipeline_run_writes_profiles_and_summary(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, pipeline_payload: Dict[str, Any]
+) -> None:
+    from agents.pipeline import WebankAgentPipeline
+
+    monkeypatch.setenv("WEBANK_PROFILE_DIR", str(tmp_path))
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_Agent({"role": {}}),
+        asset_agent=_Agent({"risk_level": "R3"}),
+        behavior_agent=_Agent({"intents": []}),
+        summary_agent=_Agent({"highlights": []}),
+    )
+
+    pipeline.run(pipeline_payload)
+    pipeline.run(pipeline_payload, profile=False)
+
+    assert len(list(tmp_path.rglob("pipeline.run-*.prof"))) == 1
+    assert len(list(tmp_path.rglob("pipeline.run-*.alloc.json"))) == 1
+    report = summarize_profiles(tmp_path, top=50)
+    assert "merged 1 runs" in report
+    assert "_execute_stage" in report
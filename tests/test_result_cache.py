@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from agents.common.result_cache import SQLiteTier, StageResultCache, stage_cache_key
+
+
+def test_stage_cache_key_covers_every_component() -> None:
+    base = stage_cache_key("AssetAgent", "qwen-max", "system", "prompt")
+
+    assert base == stage_cache_key("AssetAgent", "qwen-max", "system", "prompt")
+    assert base != stage_cache_key("AssetAgent", "qwen-plus", "system", "prompt")
+    assert base != stage_cache_key("AssetAgent", "qwen-max", "systemprompt", "")
+
+
+def test_sqlite_tier_expires_and_evicts(tmp_path: Path) -> None:
+    tier = SQLiteTier(tmp_path / "cache.sqlite", ttl_seconds=None, max_entries=2)
+    for key in ("a", "b"):
+        tier.put(key, {"v": key})
+        time.sleep(0.01)
+    tier.get("a")
+    time.sleep(0.01)
+    tier.put("c", {"v": "c"})
+
+    assert tier.get("b") is None
+    assert tier.get("a") == {"v": "a"}
+
+    expired = SQLiteTier(tmp_path / "cache.sqlite", ttl_seconds=-1)
+    assert expired.get("a") is None
+
+
+def test_sqlite_tier_reads_do_not_write_and_eviction_is_amortized(tmp_path: Path) -> None:
+    tier = SQLiteTier(tmp_path / "cache.sqlite", ttl_seconds=60, max_entries=10, evict_every=1000)
+    tier.put("hot", {"v": "hot"})
+    changes = tier._conn.total_changes
+    for _ in range(5):
+        assert tier.get("hot") == {"v": "hot"}
+    assert tier._conn.total_changes == changes
+
+    for index in range(30):
+        time.sleep(0.001)
+        tier.put(f"k{index}", {"v": index})
+        tier.get("hot")  # saved with the next put, so "hot" survives every eviction
+
+    (count,) = tier._conn.execute("SELECT COUNT(*) FROM stage_results").fetchone()
+    assert 9 <= count <= 10
+    assert tier.get("hot") == {"v": "hot"}
+    assert tier.get("k0") is None
+
+
+def test_stage_result_cache_returns_isolated_copies() -> None:
+    cache = StageResultCache()
+    cache.put("k", {"tags": ["白领"]})
+
+    first = cache.get("k")
+    first["tags"].append("mutated")
+
+    assert cache.get("k") == {"tags": ["白领"]}
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (2, 1)
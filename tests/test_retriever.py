@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, List
+
+import pymysql
+import pytest
+
+from agents import db
+from agents.common.result_cache import LRUTier, SQLiteTier
+from agents.conversation import insight_cache, memory, persistence, retention, retriever
+from agents.loadtest import init_sqlite_store
+
+
+@pytest.fixture
+def sqlite_store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "insights.sqlite3"
+    monkeypatch.setattr(memory, "_USE_MEMORY", False)
+    monkeypatch.setattr(db, "_POOLS", {})
+    monkeypatch.setattr(insight_cache, "_CACHES", {})
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(path))
+    init_sqlite_store(path, ["U1", "U2"])
+    with sqlite3.connect(str(path)) as conn:
+        conn.execute(
+            "INSERT INTO user_asset_snapshots (user_id, report_date, risk_level, asset_breakdown, "
+            "credit_capacity, raw_payload) VALUES ('U1', '2999-01-01', 'R5', '{\"fund\": 1}', '{}', '{}')"
+        )
+        conn.execute("DELETE FROM user_behavior_insights WHERE user_id = 'U2'")
+        conn.execute("DELETE FROM user_insight_latest WHERE user_id = 'U2' AND stage = 'behavior'")
+    retention.rebuild_latest_pointers()
+    return path
+
+
+def test_batched_insights_match_per_table_lookups(sqlite_store: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    expected = {
+        user_id: {
+            "asset": retriever.fetch_latest_asset(user_id),
+            "behavior": retriever.fetch_latest_behavior(user_id),
+            "socio_role": retriever.fetch_latest_socio_role(user_id),
+            "summary": retriever.fetch_latest_summary(user_id),
+        }
+        for user_id in ("U1", "U2", "U3")
+    }
+    queries: List[Any] = []
+    original = db._SQLiteCursor.execute
+    monkeypatch.setattr(
+        db._SQLiteCursor, "execute", lambda self, query, params=None: queries.append(query) or original(self, query, params)
+    )
+
+    batched = retriever.fetch_users_insights(["U1", "U2", "U3"])
+
+    # The pointer join runs alone; only U2/behavior and U3's four stages are seeked afterwards.
+    assert len(queries) == 2
+    assert "user_insight_latest" not in queries[1]
+    assert queries[1].count("UNION ALL") == 4
+    assert batched == expected
+    assert batched["U1"]["asset"]["risk_level"] == "R5"
+    assert batched["U2"]["behavior"] is None
+    assert batched["U3"] == {"asset": None, "behavior": None, "socio_role": None, "summary": None}
+    assert retriever.fetch_user_insights("U1") == expected["U1"]
+
+
+def test_unchanged_snapshot_is_skipped_and_pointer_tracks_new_rows(sqlite_store: Path) -> None:
+    payload = {"risk_level": "R2", "asset_breakdown": {"bond": 1}}
+    persistence.persist_asset_snapshot("U2", payload)
+    persistence.persist_asset_snapshot("U2", dict(payload))
+
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM user_asset_snapshots WHERE user_id = 'U2'").fetchone()[0]
+        pointer, newest = conn.execute(
+            "SELECT p.snapshot_id, MAX(t.id) FROM user_insight_latest p "
+            "JOIN user_asset_snapshots t ON t.user_id = p.user_id "
+            "WHERE p.user_id = 'U2' AND p.stage = 'asset'"
+        ).fetchone()
+    assert count == 2  # seed row + one write; the identical payload was skipped
+    assert pointer == newest
+    assert retriever.fetch_user_insights("U2")["asset"]["risk_level"] == "R2"
+
+
+def test_backdated_snapshot_does_not_move_the_pointer(sqlite_store: Path) -> None:
+    # U1's seeded R5 row is dated 2999-01-01, so today's snapshot is older by report_date.
+    persistence.persist_asset_snapshot("U1", {"risk_level": "R1"})
+
+    assert retriever.fetch_user_insights("U1")["asset"] == retriever.fetch_latest_asset("U1")
+    assert retriever.fetch_user_insights("U1")["asset"]["risk_level"] == "R5"
+
+
+def test_users_without_a_pointer_fall_back_per_user(sqlite_store: Path) -> None:
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        conn.execute("DELETE FROM user_insight_latest WHERE user_id = 'U1'")
+        conn.execute("UPDATE user_insight_latest SET snapshot_id = -1 WHERE user_id = 'U2' AND stage = 'asset'")
+
+    batched = retriever.fetch_users_insights(["U1", "U2"])
+
+    for user_id in ("U1", "U2"):
+        assert batched[user_id]["asset"] == retriever.fetch_latest_asset(user_id)
+        assert batched[user_id]["summary"] == retriever.fetch_latest_summary(user_id)
+    assert batched["U1"]["asset"]["risk_level"] == "R5"
+
+    # The next write backfills the pointer from the table instead of trusting the new row.
+    persistence.persist_asset_snapshot("U1", {"risk_level": "R1"})
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        risk = conn.execute(
+            "SELECT t.risk_level FROM user_insight_latest p JOIN user_asset_snapshots t ON t.id = p.snapshot_id "
+            "WHERE p.user_id = 'U1' AND p.stage = 'asset'"
+        ).fetchone()[0]
+    assert risk == "R5"
+
+
+def test_snapshots_persist_without_the_pointer_table(sqlite_store: Path) -> None:
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        conn.execute("DROP TABLE user_insight_latest")
+
+    persistence.persist_summary("U2", {"summary": "无指针表"})
+
+    assert retriever.fetch_user_insights("U2")["summary"]["summary_text"] == "无指针表"
+    assert db.is_missing_table(pymysql.err.ProgrammingError(1146, "Table 'Fin.user_insight_latest' doesn't exist"))
+    assert not db.is_missing_table(pymysql.err.OperationalError(2013, "Lost connection to MySQL server"))
+
+
+def test_concurrent_writers_leave_the_pointer_on_the_latest_row(sqlite_store: Path) -> None:
+    def write(offset: int) -> None:
+        for day in range(offset, 40, 4):
+            for user_id in ("U2", "U3"):
+                report_date = (datetime(2030, 1, 1) + timedelta(days=day)).date().isoformat()
+                persistence.persist_asset_snapshot(user_id, {"risk_level": f"R{day}", "report_date": report_date})
+
+    threads = [threading.Thread(target=write, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for user_id in ("U2", "U3"):
+        assert retriever.fetch_user_insights(user_id)["asset"] == retriever.fetch_latest_asset(user_id)
+        assert retriever.fetch_latest_asset(user_id)["risk_level"] == "R39"
+
+
+def test_compaction_keeps_daily_then_monthly_and_pointed_rows(sqlite_store: Path) -> None:
+    now = datetime(2024, 6, 30, 12, 0)
+    stamps = [now - timedelta(hours=h) for h in (1, 2)]  # same day
+    stamps += [now - timedelta(days=50, hours=h) for h in (1, 2, 30)]  # May 10/9, all in May
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        conn.execute("DELETE FROM user_insight_summary")
+        conn.executemany(
+            "INSERT INTO user_insight_summary (user_id, summary_text, recommendations, created_at) "
+            "VALUES ('U1', ?, '[]', ?)",
+            [(f"s{index}", stamp.isoformat()) for index, stamp in enumerate(stamps)],
+        )
+        oldest = conn.execute("SELECT MAX(id) FROM user_insight_summary").fetchone()[0]
+        conn.execute(
+            "UPDATE user_insight_latest SET snapshot_id = ? WHERE user_id = 'U1' AND stage = 'summary'",
+            (oldest,),
+        )
+
+    dry = {r.stage: r for r in retention.compact_snapshots(now=now, dry_run=True)}
+    assert dry["summary"].deleted == 2
+
+    retention.compact_snapshots(now=now)
+    with sqlite3.connect(str(sqlite_store)) as conn:
+        kept = [row[0] for row in conn.execute("SELECT summary_text FROM user_insight_summary ORDER BY id")]
+    # newest of today, newest of May, and the pointed-to (oldest) row survive
+    assert kept == ["s0", "s2", "s4"]
+
+
+def _count_queries(monkeypatch: pytest.MonkeyPatch) -> List[Any]:
+    queries: List[Any] = []
+    original = db._SQLiteCursor.execute
+    monkeypatch.setattr(
+        db._SQLiteCursor, "execute", lambda self, query, params=None: queries.append(query) or original(self, query, params)
+    )
+    return queries
+
+
+def test_insight_cache_serves_repeat_reads_until_a_write(sqlite_store: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    first = retriever.fetch_user_insights("U1")
+    queries = _count_queries(monkeypatch)
+
+    first["asset"]["risk_level"] = "mutated by caller"
+    assert retriever.fetch_user_insights("U1")["asset"]["risk_level"] == "R5"
+    assert queries == []
+
+    persistence.persist_asset_snapshot("U1", {"risk_level": "R1", "report_date": "3000-01-01"})
+    queries.clear()
+    assert retriever.fetch_user_insights("U1")["asset"]["risk_level"] == "R1"
+    assert len(queries) == 1
+
+
+def test_shared_tier_propagates_invalidation_between_processes(tmp_path: Path) -> None:
+    def worker() -> insight_cache.InsightCache:
+        return insight_cache.InsightCache(memory=LRUTier(16, 60), shared=SQLiteTier(tmp_path / "shared.sqlite3", 60))
+
+    reader, writer = worker(), worker()
+    _, version = reader.lookup("U1")
+    reader.store("U1", {"asset": {"risk_level": "R3"}}, version)
+    assert writer.lookup("U1")[0] == {"asset": {"risk_level": "R3"}}
+
+    # A read that started before the write must not re-cache its stale rows.
+    _, stale_version = reader.lookup("U9")
+    writer.invalidate("U1")
+    writer.invalidate("U9")
+    reader.store("U9", {"asset": None}, stale_version)
+
+    assert reader.lookup("U1")[0] is None
+    assert reader.lookup("U9")[0] is None
+
+
+def test_shared_lookups_are_read_only_and_versions_are_never_evicted(tmp_path: Path) -> None:
+    shared = SQLiteTier(tmp_path / "shared.sqlite3", 60, max_entries=2, track_access=False)
+    cache = insight_cache.InsightCache(memory=LRUTier(1, 60), shared=shared)
+    cache.invalidate("U1")
+    _, version = cache.lookup("U1")
+    cache.store("U1", {"asset": None}, version)
+
+    changes = (shared._conn.total_changes, cache._shared_versions._conn.total_changes)
+    for user_id in ("U1", "U2", "U1"):
+        cache.lookup(user_id)
+    assert (shared._conn.total_changes, cache._shared_versions._conn.total_changes) == changes
+
+    for index in range(10):
+        cache.store(f"X{index}", {"asset": None}, "")
+    assert cache.lookup("U1")[1] == version
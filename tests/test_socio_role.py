@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from agents.pipeline import WebankAgentPipeline
+from agents.socio_role.cohort import CohortRules, SocioRoleCohorts
+
+
+def test_cohort_rules_bucket_profile_fields() -> None:
+    rules = CohortRules()
+
+    profile = rules.profile({"age": 32, "profession": "高级产品经理", "familyStatus": "已婚", "city": "深圳市"})
+
+    assert profile == {"age_band": "30-34", "profession": "互联网", "city_tier": "一线", "familyStatus": "已婚"}
+    assert rules.age_band(16) == "<18"
+    assert rules.age_band(70) == "60+"
+    assert rules.city_tier("拉萨") == "其他"
+
+
+def test_pipeline_reuses_socio_role_result_across_cohort(pipeline_payload: Dict[str, Any]) -> None:
+    class _Agent:
+        def __init__(self, output: Dict[str, Any]) -> None:
+            self.output = output
+            self.prompts = []
+
+        def run(self, prompt: str) -> Dict[str, Any]:
+            self.prompts.append(prompt)
+            return self.output
+
+    socio = _Agent({"role": {"occupation": "互联网"}})
+    cohorts = SocioRoleCohorts()
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=socio,
+        asset_agent=_Agent({"risk_level": "中等"}),
+        behavior_agent=_Agent({"intent_labels": []}),
+        summary_agent=_Agent({"summary": "保持定投"}),
+        socio_cohorts=cohorts,
+    )
+    twin = dict(pipeline_payload, socio_role={"age": 34, "profession": "产品经理", "familyStatus": "已婚", "city": "北京"})
+    other = dict(pipeline_payload, socio_role={"age": 52, "profession": "教师", "familyStatus": "已婚", "city": "深圳"})
+
+    results = [pipeline.run(payload)["socio_role"] for payload in (pipeline_payload, twin, other)]
+
+    assert results[0] == results[1] == {"role": {"occupation": "互联网"}}
+    assert len(socio.prompts) == 2
+    assert "产品经理" not in socio.prompts[0]
+    assert (cohorts.hits, cohorts.misses) == (1, 2)
+    assert "hit_rate=33.3%" in cohorts.render_report()
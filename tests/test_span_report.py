@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from agents.common import telemetry
+from agents.common.span_report import group_traces, render_waterfall, self_times
+
+
+def _span(span_id: str, parent: Any, start: float, end: float, name: str = "") -> Dict[str, Any]:
+    return {
+        "name": name or span_id,
+        "trace_id": "t1",
+        "span_id": span_id,
+        "parent_id": parent,
+        "start": start,
+        "end": end,
+        "duration": end - start,
+        "attributes": {},
+    }
+
+
+def test_self_time_merges_overlapping_children() -> None:
+    trace = [
+        _span("root", None, 0.0, 1.0, "pipeline.run"),
+        _span("a", "root", 0.1, 0.5, "agent.asset"),
+        _span("b", "root", 0.2, 0.6, "agent.behavior"),
+        _span("s", "root", 0.7, 0.9, "agent.summary"),
+    ]
+
+    own = self_times(trace)
+
+    assert own["root"] == pytest.approx(1.0 - 0.5 - 0.2)
+    assert own["a"] == pytest.approx(0.4)
+    rendered = render_waterfall(trace)
+    assert rendered.splitlines()[1].endswith("pipeline.run")
+    assert "  agent.summary" in rendered
+
+
+@pytest.mark.skipif(not telemetry._OTEL_AVAILABLE, reason="opentelemetry not installed")
+def test_local_span_buffer_keeps_last_spans_and_appends_file(tmp_path: Path) -> None:
+    from opentelemetry.sdk.trace import TracerProvider
+
+    spans_file = tmp_path / "spans.jsonl"
+    buffer = telemetry.LocalSpanBuffer(capacity=2, path=spans_file)
+    provider = TracerProvider()
+    provider.add_span_processor(buffer)
+    tracer = provider.get_tracer("test")
+
+    with tracer.start_as_current_span("pipeline.run"):
+        with tracer.start_as_current_span("agent.asset"):
+            pass
+        with tracer.start_as_current_span("agent.summary"):
+            pass
+
+    kept = buffer.spans()
+    assert [span["name"] for span in kept] == ["agent.summary", "pipeline.run"]
+    assert kept[0]["parent_id"] == kept[1]["span_id"]
+    assert len(group_traces(kept)) == 1
+    assert len(spans_file.read_text(encoding="utf-8").splitlines()) == 3
+    assert json.loads(spans_file.read_text(encoding="utf-8").splitlines()[0])["name"] == "agent.asset"
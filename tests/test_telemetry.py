@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from agents.common import telemetry
+from agents.common.telemetry import build_sampler, set_payload_attribute, trace_agent_span
+
+
+class _RecordingSpan:
+    def __init__(self) -> None:
+        self.attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+def test_lazy_attributes_skipped_for_non_recording_spans() -> None:
+    def provider() -> str:
+        raise AssertionError("must not serialize for a non-recording span")
+
+    # No SDK provider is installed in tests, so every span is non-recording.
+    with trace_agent_span("agent.test", lazy_attributes={"agent.input.payload": provider}) as span:
+        assert span is None
+
+
+def test_set_payload_attribute_offloads_large_payloads(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("WEBANK_OTEL_BLOB_DIR", str(tmp_path))
+    span = _RecordingSpan()
+    payload = {"events": ["浏览基金详情"] * 500}
+
+    set_payload_attribute(span, "agent.input.payload", payload, limit=64)
+
+    digest = span.attributes["agent.input.payload.blob_sha256"]
+    blob = tmp_path / digest[:2] / f"{digest}.json"
+    assert hashlib.sha256(blob.read_bytes()).hexdigest() == digest
+    assert len(span.attributes["agent.input.payload"]) == 64
+
+
+def test_concurrent_offloads_of_one_payload_write_a_single_blob(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("WEBANK_OTEL_BLOB_DIR", str(tmp_path))
+    text = "浏览基金详情" * 50_000
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        digests = set(executor.map(lambda _: telemetry.offload_blob(text), range(32)))
+
+    (digest,) = digests
+    assert digest is not None
+    assert [path.name for path in tmp_path.rglob("*") if path.is_file()] == [f"{digest}.json"]
+    assert (tmp_path / digest[:2] / f"{digest}.json").read_text(encoding="utf-8") == text
+
+
+@pytest.mark.skipif(not telemetry._OTEL_AVAILABLE, reason="opentelemetry not installed")
+def test_build_sampler_applies_longest_prefix_ratio() -> None:
+    from opentelemetry.sdk.trace.sampling import Decision
+
+    sampler = build_sampler({"agent.": 0.0, "agent.conversation": 1.0}, default_ratio=1.0)
+
+    def decision(name: str) -> Any:
+        return sampler.should_sample(None, 0x1234, name).decision
+
+    assert decision("agent.asset") == Decision.DROP
+    assert decision("agent.conversation") == Decision.RECORD_AND_SAMPLE
+    assert decision("pipeline.run") == Decision.RECORD_AND_SAMPLE
+
+
+def test_pipeline_records_stage_metrics(pipeline_payload: Dict[str, Any]) -> None:
+    from agents.pipeline import WebankAgentPipeline
+
+    class _Output:
+        content = "{'risk_level': 'R3',}"
+        metrics = {"input_tokens": [120], "output_tokens": [30]}
+
+    class _Agent:
+        def __init__(self, name: str, output: Any) -> None:
+            self.name = name
+            self.output = output
+
+        def run(self, prompt: str, **kwargs: Any) -> Any:
+            return self.output
+
+    pipeline = WebankAgentPipeline(
+        socio_role_agent=_Agent("MetricsSocio", {"role": {}}),
+        asset_agent=_Agent("MetricsAsset", _Output()),
+        behavior_agent=_Agent("MetricsBehavior", {"intents": []}),
+        summary_agent=_Agent("MetricsSummary", {"highlights": []}),
+    )
+
+    pipeline.run(pipeline_payload)
+    text = telemetry.render_metrics()
+
+    assert (
+        'webank_stage_duration_seconds_count{agent="MetricsAsset",model="",stage="asset"} 1'
+        in text
+    )
+    assert 'webank_agent_tokens_total{agent="MetricsAsset",kind="prompt",model=""} 120' in text
+    assert 'webank_agent_in_flight{agent="MetricsAsset",model=""} 0' in text
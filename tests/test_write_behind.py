@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from agents import db
+from agents.common import telemetry
+from agents.common.write_behind import DROP, WriteBehindQueue
+from agents.conversation import memory
+from agents.loadtest import init_sqlite_store
+
+
+def test_batches_keep_per_key_order_and_close_drains() -> None:
+    batches: List[List[Any]] = []
+    queue = WriteBehindQueue(batches.append, batch_size=4, flush_interval=60)
+    for index in range(10):
+        queue.submit(f"s{index % 2}", index)
+
+    assert queue.close(timeout=5)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    written = [item for batch in batches for item in batch]
+    assert [row for key, row in written if key == "s0"] == [0, 2, 4, 6, 8]
+    assert queue.pending("s0") == (6, [])  # two epoch bumps per written batch
+
+
+def test_failed_batches_are_retried_in_order_and_overflow_drops() -> None:
+    written: List[Any] = []
+    failures = iter([RuntimeError("db down")])
+
+    def write(batch: List[Any]) -> None:
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        written.extend(row for _, row in batch)
+
+    queue = WriteBehindQueue(write, max_queue=2, batch_size=10, flush_interval=60, overflow=DROP)
+    assert queue.submit("s", 1)
+    assert queue.submit("s", 2)
+    assert not queue.submit("s", 3)
+    assert queue.pending("s")[1] == [1, 2]
+
+    assert queue.flush(timeout=5)
+    assert written == [1, 2]
+    assert queue.pending("s")[1] == []
+    queue.close()
+
+
+def test_reads_include_unflushed_messages(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "messages.sqlite3"
+    init_sqlite_store(path, [])
+    monkeypatch.setattr(memory, "_USE_MEMORY", False)
+    monkeypatch.setattr(memory, "_MESSAGE_WRITER", None)
+    monkeypatch.setattr(db, "_POOLS", {})
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(path))
+    monkeypatch.setenv("WEBANK_MESSAGE_WRITE_BEHIND", "true")
+    monkeypatch.setenv("WEBANK_MESSAGE_FLUSH_MS", "60000")
+
+    memory.append_message("S1", "user", "你好")
+    memory.append_message("S1", "assistant", "您好，有什么可以帮您？")
+    memory.append_message("S2", "user", "另一个会话")
+
+    assert [m["message"] for m in memory.fetch_messages("S1")] == ["你好", "您好，有什么可以帮您？"]
+    with sqlite3.connect(str(path)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM ai_session_messages").fetchone()[0] == 0
+
+    assert memory.close_message_writer(timeout=5)
+    with sqlite3.connect(str(path)) as conn:
+        rows = conn.execute("SELECT session_id, message FROM ai_session_messages ORDER BY id").fetchall()
+    assert rows == [("S1", "你好"), ("S1", "您好，有什么可以帮您？"), ("S2", "另一个会话")]
+    monkeypatch.setenv("WEBANK_MESSAGE_WRITE_BEHIND", "false")
+    assert [m["message"] for m in memory.fetch_messages("S1", limit=1)] == ["您好，有什么可以帮您？"]
+
+
+def test_a_permanently_failing_row_is_isolated_and_dropped() -> None:
+    written: List[Any] = []
+
+    def write(batch: List[Any]) -> None:
+        if any(row == "poison" for _, row in batch):
+            raise sqlite3.IntegrityError("NOT NULL constraint failed")
+        written.extend(row for _, row in batch)
+
+    queue = WriteBehindQueue(write, name="poison_test", batch_size=10, flush_interval=60, max_backoff=0, max_attempts=2)
+    for row in ("a", "b", "poison", "c", "d"):
+        queue.submit("s", row)
+
+    assert queue.flush(timeout=5)
+    assert written == ["a", "b", "c", "d"]
+    assert 'webank_write_behind_total{event="dead_lettered",queue="poison_test"} 1' in telemetry.render_metrics()
+    assert queue.pending("s")[1] == []
+    queue.submit("s", "e")
+    assert queue.close(timeout=5)
+    assert written[-1] == "e"
+
+
+def test_transient_errors_keep_the_whole_batch_until_the_database_recovers() -> None:
+    written: List[Any] = []
+    outage = iter([sqlite3.OperationalError("database is locked")] * 12)
+
+    def write(batch: List[Any]) -> None:
+        error = next(outage, None)
+        if error is not None:
+            raise error
+        written.append([row for _, row in batch])
+
+    queue = WriteBehindQueue(
+        write, name="outage_test", batch_size=10, flush_interval=60, max_backoff=0, max_attempts=2
+    )
+    for row in range(5):
+        queue.submit("s", row)
+
+    assert queue.flush(timeout=5)
+    # Retried whole, never split, and nothing dead-lettered.
+    assert written == [[0, 1, 2, 3, 4]]
+    assert 'event="dead_lettered",queue="outage_test"' not in telemetry.render_metrics()
+    assert 'webank_write_behind_total{event="failed",queue="outage_test"} 60' in telemetry.render_metrics()
+    assert queue.close(timeout=5)
+    assert not queue.submit("s", 5)
+
+
+def test_reads_retry_when_a_flush_lands_between_queue_and_table(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "messages.sqlite3"
+    init_sqlite_store(path, [])
+    monkeypatch.setattr(memory, "_USE_MEMORY", False)
+    monkeypatch.setattr(memory, "_MESSAGE_WRITER", None)
+    monkeypatch.setattr(db, "_POOLS", {})
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(path))
+    monkeypatch.setenv("WEBANK_MESSAGE_WRITE_BEHIND", "true")
+    monkeypatch.setenv("WEBANK_MESSAGE_FLUSH_MS", "60000")
+
+    memory.append_message("S1", "user", "你好")
+    writer = memory.get_message_writer()
+    select = memory._select_messages
+    flushed: List[bool] = []
+
+    def select_after_flush(session_id: str, limit: int) -> List[Any]:
+        if not flushed:
+            flushed.append(writer.flush(timeout=5))
+        return select(session_id, limit)
+
+    monkeypatch.setattr(memory, "_select_messages", select_after_flush)
+
+    assert [m["message"] for m in memory.fetch_messages("S1")] == ["你好"]
+    assert flushed == [True]
+    assert memory.close_message_writer(timeout=5)
+
+
+def test_reads_do_not_duplicate_rows_committed_but_still_pending(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "messages.sqlite3"
+    init_sqlite_store(path, [])
+    monkeypatch.setattr(memory, "_USE_MEMORY", False)
+    monkeypatch.setattr(memory, "_MESSAGE_WRITER", None)
+    monkeypatch.setattr(db, "_POOLS", {})
+    monkeypatch.setenv("WEBANK_DB_BACKEND", "sqlite")
+    monkeypatch.setenv("WEBANK_SQLITE_PATH", str(path))
+    monkeypatch.setenv("WEBANK_MESSAGE_WRITE_BEHIND", "true")
+    monkeypatch.setenv("WEBANK_MESSAGE_FLUSH_MS", "60000")
+    seen: List[List[str]] = []
+    insert = memory._insert_messages
+
+    def insert_then_read(batch: List[Any]) -> None:
+        # Read after the rows are committed but before the queue has released them.
+        insert(batch)
+        seen.append([m["message"] for m in memory.fetch_messages("S1")])
+
+    monkeypatch.setattr(memory, "_insert_messages", insert_then_read)
+    memory.append_message("S1", "user", "你好")
+    memory.append_message("S1", "assistant", "您好")
+
+    assert memory.close_message_writer(timeout=5)
+    assert seen == [["你好", "您好"]]